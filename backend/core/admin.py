@@ -1,6 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db import transaction
+from django.utils import timezone
 from .models import Business, User, Product, ChatMessage
+from .search import search_products
+from .signals import products_bulk_changed
 
 @admin.register(Business)
 class BusinessAdmin(admin.ModelAdmin):
@@ -22,8 +26,20 @@ class ProductAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
     actions = ['approve_products']
     
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of icontains scans over descriptions
+        if not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        return search_products(queryset, search_term), False
+    
+    @transaction.atomic
     def approve_products(self, request, queryset):
-        queryset.update(status=Product.APPROVED)
+        # Locked while read so the facet delta matches the rows updated
+        rows = queryset.select_for_update().values_list('id', 'status', 'business_id', 'price')
+        previous = {pk: row for pk, *row in rows}
+        Product.objects.filter(id__in=previous).update(status=Product.APPROVED, updated_at=timezone.now())
+        products_bulk_changed.send(sender=Product, product_ids=list(previous), previous=previous,
+                                   current={pk: (Product.APPROVED, *row[1:]) for pk, row in previous.items()})
     approve_products.short_description = "Approve selected products"
 
 @admin.register(ChatMessage)
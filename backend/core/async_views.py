@@ -0,0 +1,253 @@
+"""
+Async views served through ASGI (marketplace/asgi.py).
+
+These are plain Django async views rather than DRF views, because DRF's
+request handling is synchronous. Under WSGI they still work but buffer the
+whole stream in one worker.
+"""
+import asyncio
+import json
+import logging
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from .authentication import CachedJWTAuthentication, StreamTicket
+from .catalog import get_catalog
+from .changes import is_expired, latest_token, read_changes, serialize_changes
+from .chat_buffer import save_chat_message
+from .chatbot import engine, build_llm_messages
+from .events import broker
+from .llm import get_api_key, get_async_client
+from .metrics import CHATBOT_ANSWERS, LLM_LATENCY, LLM_REQUESTS
+from .models import Product, ProductChange
+from .response_cache import response_cache
+from .serializers import ChatMessageSerializer
+
+logger = logging.getLogger(__name__)
+
+def _sse(event, data, event_id=None):
+    prefix = f"id: {event_id}\n" if event_id is not None else ''
+    return f"{prefix}event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+async def _authenticate(request, ticket=False):
+    """
+    Return the JWT-authenticated user, None for anonymous requests. With
+    `ticket`, a `?ticket=` stream ticket is accepted when there is no
+    Authorization header, since browsers' EventSource cannot send headers.
+    Access tokens are never read from the URL, where access logs keep them.
+    """
+    authentication = CachedJWTAuthentication()
+    raw_ticket = request.GET.get('ticket') if ticket and 'HTTP_AUTHORIZATION' not in request.META else None
+    if raw_ticket:
+        try:
+            validated = StreamTicket(raw_ticket)
+        except TokenError as error:
+            raise InvalidToken(str(error))
+        return await sync_to_async(authentication.get_user)(validated)
+    result = await sync_to_async(authentication.authenticate)(request)
+    return result[0] if result else None
+
+async def _stream_completion(api_key, messages, deadline):
+    """Yield completion text deltas, raising TimeoutError once `deadline` (loop time) passes"""
+    loop = asyncio.get_running_loop()
+    client = get_async_client(api_key)
+    stream = await asyncio.wait_for(
+        client.chat.completions.create(model=settings.CHATBOT_LLM_MODEL, messages=messages, stream=True),
+        deadline - loop.time()
+    )
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(stream.__anext__(), max(deadline - loop.time(), 0))
+            except StopAsyncIteration:
+                break
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        await stream.response.aclose()
+
+async def chatbot_stream_view(request):
+    """
+    Stream a chatbot answer as Server-Sent Events.
+    
+    Emits `token` events carrying text deltas, then one `done` event with the
+    saved chat message. Cached answers are sent as a single token. If the
+    language model is not configured, fails, or misses the CHATBOT_LLM_TIMEOUT
+    deadline, the answer comes from the local intent engine instead. When that
+    happens after some text was streamed, the local answer follows it, `done`
+    has `truncated: true`, and only the local answer is saved, so clients
+    should show `done.ai_response` in place of the streamed text.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    
+    try:
+        user = await _authenticate(request)
+    except AuthenticationFailed as error:
+        return JsonResponse({'detail': str(error.detail)}, status=error.status_code)
+    
+    try:
+        data = json.loads(request.body) if request.content_type == 'application/json' else request.POST
+        user_message = str(data.get('message', ''))
+        # Anonymous visitors group their messages by a client-generated session id
+        session = '' if user else str(data.get('session') or '')
+    except (ValueError, AttributeError):
+        user_message = session = ''
+    if not user_message.strip():
+        return JsonResponse({'error': 'Message cannot be empty'}, status=400)
+    if len(session) > 64:
+        return JsonResponse({'session': 'Session must be at most 64 characters'}, status=400)
+    
+    deadline = asyncio.get_running_loop().time() + settings.CHATBOT_LLM_TIMEOUT
+    api_key = get_api_key()
+    products = await sync_to_async(get_catalog)()
+    
+    cache_key = response_cache.key(user_message, products.version, settings.CHATBOT_LLM_MODEL) if api_key else None
+    cached_response = response_cache.get(cache_key) if api_key else None
+    
+    async def events():
+        parts = []
+        source = 'llm'
+        truncated = False
+        if cached_response is not None:
+            source = 'cache'
+            parts.append(cached_response)
+            yield _sse('token', {'delta': cached_response})
+        elif api_key:
+            started = time.perf_counter()
+            try:
+                async for delta in _stream_completion(api_key, build_llm_messages(user_message, products), deadline):
+                    parts.append(delta)
+                    yield _sse('token', {'delta': delta})
+                if parts:
+                    response_cache.set(cache_key, ''.join(parts))
+                LLM_REQUESTS.inc(mode='stream', outcome='ok')
+            except asyncio.TimeoutError:
+                LLM_REQUESTS.inc(mode='stream', outcome='timeout')
+                logger.warning("OpenAI API error: deadline exceeded")
+                truncated = bool(parts)
+            except Exception as openai_error:
+                LLM_REQUESTS.inc(mode='stream', outcome='error')
+                logger.warning("OpenAI API error: %s", openai_error)
+                truncated = bool(parts)
+            LLM_LATENCY.observe(time.perf_counter() - started, mode='stream')
+        
+        if truncated:
+            # A cut-off reply is not kept as if the model had finished it
+            parts.clear()
+        if not parts:
+            source = 'local'
+            intent, ai_response = await sync_to_async(engine.respond)(user_message, products)
+            parts.append(ai_response)
+            yield _sse('token', {'delta': ai_response})
+        
+        CHATBOT_ANSWERS.inc(endpoint='stream', source=source)
+        chat_message = await sync_to_async(save_chat_message)(
+            user=user,
+            user_message=user_message,
+            ai_response=''.join(parts),
+            session=session
+        )
+        yield _sse('done', {**ChatMessageSerializer(chat_message).data, 'source': source, 'truncated': truncated})
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# The endpoint authenticates with JWT bearer tokens rather than session cookies
+chatbot_stream_view.csrf_exempt = True
+
+def _replay_changes(since, business_id):
+    """Rendered changes after `since`, or None when the client has to resync"""
+    if is_expired(since):
+        return None
+    feed = ProductChange.objects.all()
+    products = Product.objects.all()
+    if business_id is not None:
+        feed = feed.filter(business_id=business_id)
+        products = products.filter(business_id=business_id)
+    # No commit delay: anything committed after this read arrives through the subscription
+    entries, has_more = read_changes(feed, since, settings.PRODUCT_CHANGES_PAGE_SIZE, delay=0)
+    return None if has_more else serialize_changes(entries, products)
+
+async def product_events_view(request):
+    """
+    Stream product creates, updates, approvals and deletes as Server-Sent Events.
+    
+    Browsers authenticate with `?ticket=`, a stream ticket from
+    /api/products/events/ticket/; other clients can send an Authorization header.
+    Each `product` event is a change feed entry (see /api/products/changes/)
+    whose SSE id is its feed token. Users see the products they can list:
+    admins and approvers every business, others their own. Reconnecting with
+    Last-Event-ID (or `?since=`) replays what was missed from the change log;
+    a `resync` event means the client should reload its lists, and its id is
+    the token to continue from. Streams end after PRODUCT_EVENTS_MAX_AGE
+    seconds and EventSource reconnects, so abandoned connections are reclaimed
+    (Django 4.2 does not report client disconnects to streaming responses).
+    Under WSGI only the replay is sent before the stream closes.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    
+    try:
+        user = await _authenticate(request, ticket=True)
+    except AuthenticationFailed as error:
+        return JsonResponse({'detail': str(error.detail)}, status=error.status_code)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    # Same visibility as ProductViewSet.get_queryset
+    privileged = user.role in ['admin', 'approver']
+    if not privileged and user.business_id is None:
+        return JsonResponse({'detail': 'You do not belong to a business.'}, status=403)
+    business_id = None if privileged else user.business_id
+    
+    since = request.headers.get('Last-Event-ID') or request.GET.get('since')
+    if since is not None and not since.isdigit():
+        return JsonResponse({'since': 'Expected an event id from this stream'}, status=400)
+    
+    live = isinstance(request, ASGIRequest)
+    # Subscribe before reading the log, so nothing falls between the replay and live events
+    subscription = broker.subscribe(business_id) if live else None
+    
+    async def events():
+        try:
+            replayed = set()
+            if since is None:
+                # An id-only block sets the client's Last-Event-ID for its next reconnect
+                yield f"retry: 3000\nid: {await sync_to_async(latest_token)()}\n\n"
+            else:
+                changes = await sync_to_async(_replay_changes)(int(since), business_id)
+                if changes is None:
+                    yield _sse('resync', {'reason': 'too_far_behind'}, await sync_to_async(latest_token)())
+                    return
+                for change in changes:
+                    replayed.add(change['id'])
+                    yield _sse('product', change, change['id'])
+            if not live:
+                return
+            
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + settings.PRODUCT_EVENTS_MAX_AGE
+            while (remaining := deadline - loop.time()) > 0:
+                change = await subscription.get(min(settings.PRODUCT_EVENTS_HEARTBEAT, remaining))
+                if subscription.overflowed:
+                    yield _sse('resync', {'reason': 'overflow'}, await sync_to_async(latest_token)())
+                    return
+                if change is None:
+                    yield ": keep-alive\n\n"
+                elif change['id'] not in replayed:
+                    yield _sse('product', change, change['id'])
+        finally:
+            if subscription is not None:
+                broker.unsubscribe(subscription)
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
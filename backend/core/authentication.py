@@ -0,0 +1,122 @@
+"""
+Authentication classes.
+
+CachedJWTAuthentication replaces simplejwt's JWTAuthentication for the API.
+Tokens issued by `tokens_for_user` carry the user's `role` and `business_id`
+as claims, and the user (with its business name) is served from the cache
+for AUTH_USER_CACHE_TTL seconds, so most authenticated requests need no user
+query. Only the fields requests use are cached, never the password hash; the
+rest are deferred on the rebuilt user and load on access. Cached users are dropped whenever a user or business is saved or
+deleted (core/signals.py). A token whose claims no longer match the user,
+e.g. after a role change, is rejected so the client logs in again.
+
+StreamTicket is a separate, short-lived token type for the product event
+stream (see core/async_views.py), which browsers can only authenticate in the
+URL.
+"""
+import hmac
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import router
+from rest_framework.authentication import BaseAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from .models import Business, User
+
+# Cached per user; everything else (password, last_login, ...) stays deferred
+USER_CACHE_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'role', 'business_id', 'is_active', 'is_staff', 'is_superuser',
+)
+
+def user_cache_key(user_id):
+    return f'core:auth-user-fields:{user_id}'
+
+def cached_user_fields(user):
+    fields = {name: getattr(user, name) for name in USER_CACHE_FIELDS}
+    fields['business_name'] = user.business.name if user.business_id is not None else None
+    return fields
+
+def user_from_cache(fields):
+    """A User as loaded from the database with only the cached fields (saving it writes only those)"""
+    db = router.db_for_read(User)
+    # from_db() takes the values in model field order
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in USER_CACHE_FIELDS]
+    user = User.from_db(db, names, [fields[name] for name in names])
+    if user.business_id is not None:
+        user.business = Business.from_db(db, ('id', 'name'), (user.business_id, fields['business_name']))
+    return user
+
+def invalidate_cached_users(user_ids):
+    cache.delete_many([user_cache_key(user_id) for user_id in user_ids])
+
+def tokens_for_user(user):
+    """Refresh token (with its access token) carrying the role and business claims"""
+    refresh = RefreshToken.for_user(user)
+    refresh['role'] = user.role
+    refresh['business_id'] = user.business_id
+    return refresh
+
+class StreamTicket(AccessToken):
+    """
+    Token that only opens the product event stream, for PRODUCT_EVENTS_TICKET_LIFETIME seconds.
+    
+    It travels in the query string, where proxy and server access logs can
+    record it, so it is short-lived and its token type is rejected wherever
+    an access token is expected.
+    """
+    token_type = 'stream'
+    
+    @property
+    def lifetime(self):
+        return timedelta(seconds=settings.PRODUCT_EVENTS_TICKET_LIFETIME)
+
+def stream_ticket_for_user(user):
+    """Stream ticket carrying the same role and business claims as the user's access tokens"""
+    ticket = StreamTicket.for_user(user)
+    ticket['role'] = user.role
+    ticket['business_id'] = user.business_id
+    return ticket
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+        
+        key = user_cache_key(user_id)
+        fields = cache.get(key) if settings.AUTH_USER_CACHE_TTL > 0 else None
+        if fields is not None:
+            user = user_from_cache(fields)
+        else:
+            try:
+                user = User.objects.select_related('business').get(pk=user_id)
+            except User.DoesNotExist:
+                raise AuthenticationFailed('User not found', code='user_not_found')
+            if settings.AUTH_USER_CACHE_TTL > 0:
+                cache.set(key, cached_user_fields(user), settings.AUTH_USER_CACHE_TTL)
+        
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        # Tokens issued before claims were added have neither claim
+        for claim, value in (('role', user.role), ('business_id', user.business_id)):
+            if claim in validated_token and validated_token[claim] != value:
+                raise AuthenticationFailed('User role or business changed; please log in again', code='claims_changed')
+        return user
+
+class MetricsTokenAuthentication(BaseAuthentication):
+    """Accept `Authorization: Bearer <METRICS_TOKEN>` so scrapers need no user account"""
+    
+    def authenticate(self, request):
+        token = settings.METRICS_TOKEN
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if token and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+            return AnonymousUser(), 'metrics'
+        return None
+    
+    def authenticate_header(self, request):
+        return 'Bearer realm="api"'
@@ -0,0 +1,194 @@
+"""
+Latency benchmarks for the core API.
+
+Each scenario issues one kind of request repeatedly, either through the DRF
+test client (in-process, with SQL query counts) or over HTTP against a running
+server, and reports p50/p95/p99 latency, mean queries per request and
+throughput. Results can be saved as a JSON baseline and later runs compared
+against it, so CI fails when an endpoint gets slower or issues more queries.
+"""
+import itertools
+import json
+import math
+import time
+import urllib.error
+import urllib.request
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from .models import User
+
+CHATBOT_MESSAGES = [
+    'What products are available?', 'Anything under $50?', 'Tell me about the lamp',
+    'What is the cheapest product?', 'Most expensive item?', 'Which businesses sell here?', 'Hello!',
+]
+
+def percentile(samples, fraction):
+    """Linear-interpolated percentile of a non-empty list"""
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * fraction
+    lower, upper = math.floor(position), math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def summarize(latencies, queries, elapsed):
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'requests_per_sec': round(len(latencies) / elapsed, 1) if elapsed else None,
+    }
+
+class TestClientTransport:
+    """Send requests through the DRF test client, counting SQL queries"""
+    
+    counts_queries = True
+    
+    def __init__(self):
+        self.client = APIClient()
+    
+    def request(self, method, path, data=None, token=None):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        with CaptureQueriesContext(connection) as captured:
+            response = getattr(self.client, method)(path, data, format='json', **headers)
+        return response.status_code, response, len(captured)
+    
+    def json(self, response):
+        return response.json()
+
+class HTTPTransport:
+    """Send requests to a running server with urllib"""
+    
+    counts_queries = False
+    
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+    
+    def request(self, method, path, data=None, token=None):
+        body = json.dumps(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method.upper())
+        request.add_header('Content-Type', 'application/json')
+        if token:
+            request.add_header('Authorization', f'Bearer {token}')
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.read(), None
+        except urllib.error.HTTPError as error:
+            return error.code, error.read(), None
+    
+    def json(self, response):
+        return json.loads(response)
+
+class BenchmarkRunner:
+    """
+    Run scenarios as an editor (and, for product_approve, an approver).
+    
+    product_approve approves products it creates as pending beforehand, as
+    the editor and through the API, so the ids exist on the benchmarked
+    server; they are deleted again afterwards.
+    """
+    
+    def __init__(self, transport, username, password, approver_username=None, approver_password=None):
+        self.transport = transport
+        self.credentials = {'username': username, 'password': password}
+        self.approver_credentials = {'username': approver_username, 'password': approver_password}
+        self.pending = []
+    
+    def login(self, credentials):
+        status_code, response, queries = self.transport.request('post', '/api/login/', credentials)
+        if status_code != 200:
+            raise RuntimeError(f"Login as {credentials['username']} failed with HTTP {status_code}")
+        return self.transport.json(response)['access']
+    
+    def scenarios(self, names):
+        """Map each of `names` -> callable issuing one request and returning (status, response, queries)"""
+        self.token = token = self.login(self.credentials)
+        request = self.transport.request
+        messages = itertools.cycle(CHATBOT_MESSAGES)
+        scenarios = {
+            'login': lambda: request('post', '/api/login/', self.credentials),
+            'me': lambda: request('get', '/api/me/', token=token),
+            'product_list': lambda: request('get', '/api/products/', token=token),
+            'product_public': lambda: request('get', '/api/products/public/'),
+            'chatbot': lambda: request('post', '/api/chatbot/', {'message': next(messages)}),
+        }
+        if 'product_approve' in names:
+            approver_token = self.login(self.approver_credentials)
+            scenarios['product_approve'] = lambda: request(
+                'post', f'/api/products/{self.pending.pop()}/approve/', token=approver_token
+            )
+        return {name: scenarios[name] for name in names}
+    
+    def create_pending_products(self, count, batch_size=1000):
+        """Create `count` pending products as the editor, returning their ids"""
+        ids = []
+        while len(ids) < count:
+            items = [
+                {'name': f'Benchmark product {len(ids) + i}', 'description': 'Created by bench_api',
+                 'price': '9.99', 'status': 'pending_approval'}
+                for i in range(min(batch_size, count - len(ids)))
+            ]
+            status_code, response, queries = self.transport.request('post', '/api/products/bulk/', items, token=self.token)
+            if status_code != 201:
+                raise RuntimeError(f"Creating products to approve failed with HTTP {status_code}")
+            ids.extend(result['id'] for result in self.transport.json(response)['results'])
+        return ids
+    
+    def delete_products(self, ids):
+        for pk in ids:
+            self.transport.request('delete', f'/api/products/{pk}/', token=self.token)
+    
+    def run(self, iterations, names, warmup=2):
+        """Run the scenarios in `names`, returning {name: summary}"""
+        results = {}
+        for name, send in self.scenarios(names).items():
+            count = iterations.get(name, iterations['default'])
+            created = []
+            if name == 'product_approve':
+                created = self.create_pending_products(count + warmup)
+                self.pending = list(created)
+            try:
+                for _ in range(warmup):
+                    send()
+                latencies, queries = [], []
+                started = time.perf_counter()
+                for _ in range(count):
+                    request_started = time.perf_counter()
+                    status_code, response, query_count = send()
+                    latencies.append(time.perf_counter() - request_started)
+                    if status_code >= 400:
+                        raise RuntimeError(f"{name} failed with HTTP {status_code}")
+                    if query_count is not None:
+                        queries.append(query_count)
+                results[name] = summarize(latencies, queries, time.perf_counter() - started)
+            finally:
+                self.delete_products(created)
+        return results
+
+def compare(results, baseline, tolerance):
+    """
+    Compare `results` against `baseline` and return (regressions, warnings).
+    Query counts are deterministic, so a higher count is a regression;
+    latency depends on the machine, so a slower p95 is only a warning.
+    """
+    regressions, warnings = [], []
+    for name, expected in baseline.get('scenarios', {}).items():
+        actual = results.get(name)
+        if actual is None:
+            continue
+        limit = expected['p95_ms'] * (1 + tolerance)
+        if actual['p95_ms'] > limit:
+            warnings.append(f"{name}: p95 {actual['p95_ms']:.2f} ms exceeds baseline {expected['p95_ms']:.2f} ms (+{tolerance:.0%})")
+        if (
+            actual['queries_per_request'] is not None and expected.get('queries_per_request') is not None
+            and actual['queries_per_request'] > expected['queries_per_request']
+        ):
+            regressions.append(
+                f"{name}: {actual['queries_per_request']} queries per request, baseline {expected['queries_per_request']}"
+            )
+    return regressions, warnings
+
+def create_bench_user(username, password, role, business):
+    """Create a benchmark user; only ever called in the throwaway database"""
+    return User.objects.create_user(username=username, password=password, role=role, business=business)
@@ -0,0 +1,172 @@
+"""
+In-process snapshot of the approved product catalog.
+
+The chatbot reads products on every message, so instead of querying the
+database each time it works from an immutable snapshot that is built once and
+rebuilt only after the catalog changes. Changes are tracked with a version
+token stored in Django's cache: with a shared cache backend (Redis,
+memcached) a save in one worker invalidates the snapshot in all of them, with
+the default local-memory cache each process only sees its own saves. The
+token also expires after CHATBOT_CATALOG_MAX_AGE seconds, which bounds how
+long a worker can serve a snapshot missing changes made by other processes
+(other workers, import_products, seed_load).
+
+Once a snapshot exists, readers never wait for a rebuild: when the version
+moves, one thread rebuilds the snapshot while every other thread keeps being
+served the previous one.
+
+The text index used to match product names is expensive to build, so single
+product saves and deletes are applied to it in place rather than rebuilding it.
+Each snapshot is published together with the index that was in sync with it.
+"""
+import threading
+import time
+from collections import namedtuple
+from functools import cached_property
+from django.conf import settings
+from django.core.cache import cache
+from .models import Product
+from .price_index import PriceIndex
+from .text_index import InvertedIndex
+
+CATALOG_VERSION_KEY = 'core:catalog-version'
+
+class CatalogProduct(namedtuple('CatalogProduct', [
+    'id', 'name', 'description', 'price', 'business_name'
+])):
+    __slots__ = ()
+    
+    def summary(self):
+        return f"{self.name}: {self.description} - ${self.price} (by {self.business_name})"
+
+class CatalogSnapshot:
+    """Immutable view of the approved products at a given catalog version"""
+    
+    def __init__(self, version, products, index=None):
+        self.version = version
+        self.products = tuple(products)
+        self.by_id = {p.id: p for p in self.products}
+        self.business_names = tuple(sorted({p.business_name for p in self.products}))
+        # The shared text index at publication time; see search()
+        self.index = index
+    
+    def __len__(self):
+        return len(self.products)
+    
+    def __bool__(self):
+        return bool(self.products)
+    
+    def __iter__(self):
+        return iter(self.products)
+    
+    @cached_property
+    def prices(self):
+        return PriceIndex(self.products)
+    
+    @cached_property
+    def own_index(self):
+        """Text index over this snapshot alone, for when the shared one has moved on"""
+        return build_index(self)
+    
+    def search(self, text, limit=5):
+        """Return the products best matching `text`, best first, ranked on this snapshot's text"""
+        index = self.index
+        if index is not None and index.version == self.version:
+            matches = index.search(text, limit)
+            # Local saves patch the shared index in place; if one landed mid-search, rank privately
+            if index.version == self.version:
+                return self.resolve(matches)
+        return self.resolve(self.own_index.search(text, limit))
+    
+    def resolve(self, matches):
+        return [self.by_id[doc_id] for doc_id, score in matches if doc_id in self.by_id]
+    
+    @classmethod
+    def build(cls, version):
+        rows = (
+            Product.objects.filter(status=Product.APPROVED)
+            .order_by('id')
+            .values_list('id', 'name', 'description', 'price', 'business__name')
+        )
+        return cls(version, [CatalogProduct(*row) for row in rows])
+
+_lock = threading.RLock()
+_snapshot = None
+_index = None
+
+def version_timeout():
+    return settings.CHATBOT_CATALOG_MAX_AGE or None
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), version_timeout())
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+def invalidate_catalog(saved=None, deleted_id=None, index_unaffected=False):
+    """
+    Mark the catalog as changed so the next reader rebuilds the snapshot.
+    
+    Pass the saved product or the id of a deleted one (or index_unaffected for
+    changes that do not touch product text) to keep the text index current
+    without a rebuild. It is only patched if it was in sync before the change.
+    """
+    with _lock:
+        index = _index
+        in_sync = index is not None and index.version == cache.get(CATALOG_VERSION_KEY)
+        version = time.time_ns()
+        cache.set(CATALOG_VERSION_KEY, version, version_timeout())
+        if not in_sync or (saved is None and deleted_id is None and not index_unaffected):
+            return
+        # Snapshot searches compare the version before and after, so mark the index as changing first
+        index.version = None
+        if saved is not None:
+            if saved.status == Product.APPROVED:
+                index.add(saved.pk, saved.name, saved.description)
+            else:
+                index.remove(saved.pk)
+        elif deleted_id is not None:
+            index.remove(deleted_id)
+        index.version = version
+
+def build_index(snapshot):
+    index = InvertedIndex()
+    for product in snapshot:
+        index.add(product.id, product.name, product.description)
+    index.version = snapshot.version
+    return index
+
+def get_catalog():
+    """
+    Return the current catalog snapshot, rebuilding it if the version moved.
+    
+    Only the first caller waits for a build; while a snapshot is being
+    refreshed, other threads get the previous one.
+    """
+    global _snapshot, _index
+    version = get_catalog_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    if not _lock.acquire(blocking=snapshot is None):
+        return snapshot
+    try:
+        if _snapshot is None or _snapshot.version != version:
+            snapshot = CatalogSnapshot.build(version)
+            # The index survives local saves (patched in place), so usually only the rows are reread
+            if _index is None or _index.version != version:
+                _index = build_index(snapshot)
+            snapshot.index = _index
+            _snapshot = snapshot
+        return _snapshot
+    finally:
+        _lock.release()
+
+def get_product_index():
+    """Return the text index published with the current catalog snapshot"""
+    return get_catalog().index
+
+def find_products(text, limit=5):
+    """Return the approved products best matching `text`, best first"""
+    return get_catalog().search(text, limit)
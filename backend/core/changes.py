@@ -0,0 +1,123 @@
+"""
+Append-only product change log behind /api/products/changes/.
+
+Every product create, update, approval and delete appends a ProductChange
+row; bulk paths append one row per product with a single insert. Consumers
+keep the id of the last entry they applied as their `since` token and fetch
+only the entries after it, so syncing costs O(changes) rather than O(catalog).
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Product, ProductChange
+from .serializers import ProductListSerializer, ProductRowSerializer
+
+def change_action(before_status, after_status, created=False):
+    if created:
+        return ProductChange.CREATED
+    if after_status == Product.APPROVED and before_status != Product.APPROVED:
+        return ProductChange.APPROVED
+    return ProductChange.UPDATED
+
+def record_change(product, action):
+    return ProductChange.objects.create(
+        product_id=product.pk, business_id=product.business_id, action=action, status=product.status
+    )
+
+def record_bulk_changes(product_ids, previous=None, current=None):
+    """
+    Log products changed in bulk. `previous` and `current` map product id to
+    its (status, business_id, price) before and after the change, as sent
+    with products_bulk_changed; ids missing from `previous` were created.
+    Without `current` the products are read back.
+    """
+    product_ids = list(product_ids)
+    if current is None:
+        current = {}
+        for start in range(0, len(product_ids), 1000):
+            rows = Product.objects.filter(id__in=product_ids[start:start + 1000])
+            current.update((pk, row) for pk, *row in rows.values_list('id', 'status', 'business_id', 'price'))
+    entries = []
+    for pk in product_ids:
+        if pk not in current:
+            continue
+        status, business_id = current[pk][:2]
+        if previous is None:
+            action = ProductChange.UPDATED
+        elif pk in previous:
+            action = change_action(previous[pk][0], status)
+        else:
+            action = ProductChange.CREATED
+        entries.append(ProductChange(product_id=pk, business_id=business_id, action=action, status=status))
+    return ProductChange.objects.bulk_create(entries, batch_size=1000)
+
+def latest_token():
+    return ProductChange.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+def is_expired(since):
+    """True when entries after `since` may already have been pruned"""
+    oldest = ProductChange.objects.order_by('id').values_list('id', flat=True).first()
+    return oldest is not None and since < oldest - 1
+
+ENTRY_FIELDS = ('id', 'product_id', 'business_id', 'action', 'status', 'timestamp')
+
+def read_changes(feed, since, limit, delay=None):
+    """
+    Return (entries after `since` in id order, has_more). Entries younger than
+    `delay` seconds (default PRODUCT_CHANGES_DELAY) are held back, so an entry
+    whose transaction commits after a later id has been read is not skipped.
+    """
+    delay = settings.PRODUCT_CHANGES_DELAY if delay is None else delay
+    feed = feed.filter(id__gt=since)
+    if delay > 0:
+        feed = feed.filter(timestamp__lte=timezone.now() - timedelta(seconds=delay))
+    rows = list(feed.order_by('id').values(*ENTRY_FIELDS)[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+def serialize_changes(entries, products):
+    """
+    Render change entries (values() rows or ProductChange instances) with the
+    current compact fields of their product, looked up in the `products`
+    queryset with one query; `data` is None for products no longer there.
+    """
+    entries = [entry if isinstance(entry, dict) else {name: getattr(entry, name) for name in ENTRY_FIELDS}
+               for entry in entries]
+    serializer = ProductRowSerializer(ProductListSerializer.Meta.fields)
+    found = {}
+    live = {entry['product_id'] for entry in entries if entry['action'] != ProductChange.DELETED}
+    if live:
+        rows = products.order_by().filter(id__in=live).values(*serializer.lookups())
+        found = {item['id']: item for item in serializer.serialize(rows)}
+    format_datetime = serializer.formatters()['created_at']
+    return [{
+        'id': entry['id'],
+        'product': entry['product_id'],
+        'business': entry['business_id'],
+        'action': entry['action'],
+        'status': entry['status'],
+        'timestamp': format_datetime(entry['timestamp']),
+        'data': found.get(entry['product_id']),
+    } for entry in entries]
+
+def prunable_changes(before):
+    """
+    Entries older than `before`, except the newest entry: it is kept as the
+    high-water mark, so is_expired() still rejects tokens from before the
+    pruned range once every other entry is gone (and SQLite does not reuse ids).
+    """
+    return ProductChange.objects.filter(timestamp__lt=before).exclude(id=latest_token())
+
+def prune_changes(before, batch_size=1000, pause=0):
+    """Delete prunable entries, `batch_size` rows per statement. Returns the number deleted."""
+    old = prunable_changes(before)
+    deleted = 0
+    while True:
+        ids = list(old.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += ProductChange.objects.filter(id__in=ids).delete()[0]
+        if pause and len(ids) == batch_size:
+            time.sleep(pause)
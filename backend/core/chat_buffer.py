@@ -0,0 +1,94 @@
+"""
+Persistence of chatbot messages.
+
+With CHAT_PERSISTENCE = 'sync' (the default) every message is inserted on the
+request path. With 'write_behind' messages are queued in memory and written
+with one bulk_create when CHAT_WRITE_BEHIND_BATCH_SIZE messages are waiting or
+CHAT_WRITE_BEHIND_FLUSH_INTERVAL seconds have passed, and on interpreter exit.
+This trades durability for latency: messages still queued when a worker is
+killed outright are lost, and stored timestamps are the flush time (at most
+one interval late).
+"""
+import atexit
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+class ChatMessageBuffer:
+    def __init__(self):
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+    
+    def __len__(self):
+        return len(self._pending)
+    
+    def add(self, message):
+        with self._lock:
+            self._pending.append(message)
+            full = len(self._pending) >= settings.CHAT_WRITE_BEHIND_BATCH_SIZE
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='chat-write-behind', daemon=True)
+                self._thread.start()
+        if full:
+            self.flush()
+        return message
+    
+    def flush(self):
+        """Write all queued messages, returning how many were written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                ChatMessage.objects.bulk_create(batch, batch_size=settings.CHAT_WRITE_BEHIND_BATCH_SIZE)
+            except Exception as error:
+                logger.exception("Error saving %d chat messages: %s", len(batch), error)
+                return 0
+            return len(batch)
+    
+    def _run(self):
+        while True:
+            time.sleep(settings.CHAT_WRITE_BEHIND_FLUSH_INTERVAL)
+            close_old_connections()
+            self.flush()
+
+chat_buffer = ChatMessageBuffer()
+atexit.register(chat_buffer.flush)
+
+def delete_chat_messages(queryset, batch_size=None, pause=0, before_delete=None):
+    """
+    Delete the messages in `queryset` CHAT_DELETE_BATCH_SIZE rows at a time,
+    each batch in its own short statement, optionally sleeping `pause` seconds
+    between batches and calling `before_delete(ids)` ahead of each one.
+    Returns the number of deleted messages.
+    """
+    batch_size = batch_size or settings.CHAT_DELETE_BATCH_SIZE
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        if before_delete is not None:
+            before_delete(ids)
+        deleted += ChatMessage.objects.filter(id__in=ids).delete()[0]
+        if pause and len(ids) == batch_size:
+            time.sleep(pause)
+
+def save_chat_message(user, user_message, ai_response, session=''):
+    """Persist a chat exchange according to CHAT_PERSISTENCE and return the message"""
+    message = ChatMessage(user=user, session=session, user_message=user_message, ai_response=ai_response)
+    if settings.CHAT_PERSISTENCE == 'write_behind':
+        # Not saved yet: it has no id, and the timestamp is set for the response
+        message.timestamp = timezone.now()
+        return chat_buffer.add(message)
+    message.save()
+    return message
@@ -0,0 +1,141 @@
+"""
+Chatbot answers and prompts.
+
+Local answers are used when the language model is unavailable. Each intent
+handler receives the lowercased user message and the current catalog
+snapshot and returns the reply text.
+"""
+import logging
+import re
+import time
+from django.conf import settings
+from .intents import IntentEngine
+from .llm import get_client
+from .llm_context import build_product_context
+from .metrics import CHATBOT_INTENTS, LLM_LATENCY, LLM_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+PRICE_RE = re.compile(r'\$?(\d+(?:\.\d+)?)')
+
+engine = IntentEngine(counter=CHATBOT_INTENTS)
+
+def build_llm_messages(user_message, products):
+    """Chat completion messages for the language model, with the relevant part of the catalog as context"""
+    context = build_product_context(user_message, products)
+    return [
+        {"role": "system", "content": f"You are a helpful assistant for a product marketplace. {context}. Be friendly and helpful in answering questions about products."},
+        {"role": "user", "content": user_message}
+    ]
+
+def bounded_product_list(products, total):
+    """Bullet list of `products`, noting how many of `total` matches were left out"""
+    product_list = "\n".join([f"• {p.summary()}" for p in products])
+    if total > len(products):
+        product_list += f"\n\n...and {total - len(products)} more. Ask about a specific product or a lower price for details."
+    return product_list
+
+@engine.intent('catalog', ["what products", "available", "show me", "list"])
+def answer_catalog(message, products):
+    if products:
+        product_list = bounded_product_list(products.products[:settings.CHATBOT_MAX_LISTED_PRODUCTS], len(products))
+        return f"Hi! I'm Zuri, your AI shopping assistant. Here are all our available products:\n\n{product_list}"
+    return "Hi! I'm Zuri, your AI shopping assistant. Currently, there are no products available in our marketplace."
+
+@engine.intent('under_price', ["under", "less than", "below", "cheaper"])
+def answer_under_price(message, products):
+    # Extract price if mentioned, defaulting to $50 when only "under" is used
+    price_match = PRICE_RE.search(message)
+    max_price = float(price_match.group(1)) if price_match else 50
+    affordable_products, total = products.prices.at_most(max_price, settings.CHATBOT_MAX_LISTED_PRODUCTS)
+    if affordable_products:
+        product_list = bounded_product_list(affordable_products, total)
+        return f"Here are products under ${max_price}:\n\n{product_list}"
+    return f"Sorry, we don't have any products under ${max_price} at the moment."
+
+@engine.intent('product_info', ["tell me about", "about", "describe", "details", "info"])
+def answer_product_info(message, products):
+    # Rank products by how well their name and description match the question
+    matches = products.search(message, limit=1)
+    if matches:
+        product = matches[0]
+        return f"I'm Zuri! Here's what I know about {product.name}:\n\n{product.description}\n\nPrice: ${product.price}\nSold by: {product.business_name}"
+    # Show a few products if no specific one mentioned
+    if products:
+        product_list = "\n".join([f"• {p.summary()}" for p in products.products[:3]])
+        return f"I'm Zuri, your AI assistant! Here are some of our products:\n\n{product_list}\n\nWhich specific product would you like to know more about?"
+    return "I'm Zuri! Currently, there are no products available to describe."
+
+@engine.intent('most_expensive', ["expensive", "most expensive", "highest price", "priciest"])
+def answer_most_expensive(message, products):
+    if products:
+        product_list = "\n".join([f"• {p.summary()}" for p in products.prices.most_expensive(3)])
+        return f"Here are our most expensive products:\n\n{product_list}"
+    return "Currently, there are no products available."
+
+@engine.intent('cheapest', ["cheap", "cheapest", "lowest price", "affordable"])
+def answer_cheapest(message, products):
+    if products:
+        product_list = "\n".join([f"• {p.summary()}" for p in products.prices.cheapest(3)])
+        return f"Here are our most affordable products:\n\n{product_list}"
+    return "Currently, there are no products available."
+
+@engine.intent('businesses', ["business", "seller", "company", "store"])
+def answer_businesses(message, products):
+    if products:
+        business_list = "\n".join([f"• {business}" for business in products.business_names])
+        return f"Here are the businesses selling on our marketplace:\n\n{business_list}"
+    return "Currently, there are no businesses with products on our marketplace."
+
+@engine.default
+def answer_greeting(message, products):
+    # Generic helpful response
+    if products:
+        product_list = "\n".join([f"• {p.name} - ${p.price}" for p in products.products[:2]])
+        return f"Hello! I'm Zuri, your AI shopping assistant. I'd be happy to help! We have {len(products)} products available. Here are a couple:\n\n{product_list}\n\nYou can ask me about:\n- What products are available?\n- Which products are under $X?\n- Tell me about [product name]\n- What's the cheapest/most expensive product?"
+    return "Hello! I'm Zuri, your AI shopping assistant. Welcome to our marketplace! Currently, there are no products available, but feel free to check back later."
+
+def answer_demo(products):
+    """Reply used when no language model API key is configured"""
+    if products:
+        product_list = "\n".join([f"• {p.summary()}" for p in products.products[:5]])
+        return f"Hello! I'm the marketplace assistant. Here are some of our featured products:\n\n{product_list}\n\nNote: AI features are currently limited. Please contact support for more assistance."
+    return "Hello! Welcome to our marketplace. Currently, there are no products available, but feel free to check back later or contact our support team for assistance."
+
+def answer_llm_unavailable(products):
+    """Reply used when the language model fails for reasons other than quota"""
+    if products:
+        product_list = "\n".join([f"• {p.summary()}" for p in products.products[:3]])
+        return f"Hello! Here are some of our products:\n\n{product_list}\n\nFor more detailed assistance, please contact our support team."
+    return "Hello! Welcome to our marketplace. Please contact our support team for assistance."
+
+def answer(user_message, products, api_key):
+    """
+    Answer a message, returning (reply, source).
+    
+    source is 'demo' without an API key, 'llm' for model answers, 'local' for
+    intent engine answers after a quota/billing error and 'unavailable' for
+    the generic reply after any other model error.
+    """
+    if not api_key:
+        return answer_demo(products), 'demo'
+    started = time.perf_counter()
+    try:
+        response = get_client(api_key).chat.completions.create(
+            model=settings.CHATBOT_LLM_MODEL,
+            messages=build_llm_messages(user_message, products)
+        )
+        LLM_REQUESTS.inc(mode='sync', outcome='ok')
+        return response.choices[0].message.content, 'llm'
+    except Exception as openai_error:
+        # Handle OpenAI API errors (quota exceeded, invalid key, etc.)
+        logger.warning("OpenAI API error: %s", openai_error)
+        if "quota" in str(openai_error).lower() or "billing" in str(openai_error).lower():
+            LLM_REQUESTS.inc(mode='sync', outcome='quota')
+            # Intelligent responses based on question type
+            intent, reply = engine.respond(user_message, products)
+            return reply, 'local'
+        LLM_REQUESTS.inc(mode='sync', outcome='error')
+        return answer_llm_unavailable(products), 'unavailable'
+    finally:
+        LLM_LATENCY.observe(time.perf_counter() - started, mode='sync')
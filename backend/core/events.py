@@ -0,0 +1,142 @@
+"""
+Product change events pushed to Server-Sent Events clients.
+
+Every entry appended to the product change log (core/changes.py) is
+published once its transaction commits. Subscribers are async streams, each
+with a bounded queue and a business scope; publishers are ordinary sync code,
+so events are handed to each subscriber's event loop thread-safely.
+
+Delivery is in-process by default, which only reaches clients connected to
+the worker that made the change. Set PRODUCT_EVENTS_REDIS_URL to fan events
+out to every worker through a Redis (or compatible) pub/sub channel instead.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from functools import partial
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from .changes import serialize_changes
+from .models import Product
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_CHANNEL = 'core:product-events'
+
+class Subscription:
+    """One stream's queue of events, filtered to a business (None for every business)"""
+    
+    def __init__(self, business_id, loop, size):
+        self.business_id = business_id
+        self.loop = loop
+        self.queue = asyncio.Queue(size)
+        self.overflowed = False
+    
+    def matches(self, event):
+        return self.business_id is None or event['business'] == self.business_id
+    
+    def put(self, event):
+        # Runs on the subscriber's loop. A client that cannot keep up is told
+        # to resync rather than holding an unbounded backlog.
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+    
+    async def get(self, timeout):
+        """Next event, or None if none arrives within `timeout` seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+class ProductEventBroker:
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._listener = None
+    
+    @property
+    def redis_url(self):
+        return settings.PRODUCT_EVENTS_REDIS_URL if redis is not None else ''
+    
+    @property
+    def active(self):
+        """Whether anyone can receive events: local subscribers, or other workers through Redis"""
+        return bool(self._subscribers) or bool(self.redis_url)
+    
+    def subscribe(self, business_id=None):
+        """Register a stream on the running event loop; pair with unsubscribe()"""
+        subscription = Subscription(business_id, asyncio.get_running_loop(), settings.PRODUCT_EVENTS_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscription)
+            if self.redis_url and self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='product-events', daemon=True)
+                self._listener.start()
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+    
+    def publish(self, events):
+        """Send rendered events (dicts with a 'business' key) to every subscriber"""
+        if not events:
+            return
+        if self.redis_url:
+            try:
+                if self._redis is None:
+                    self._redis = redis.Redis.from_url(self.redis_url)
+                self._redis.publish(REDIS_CHANNEL, json.dumps(events, cls=DjangoJSONEncoder))
+                return
+            except redis.RedisError as error:
+                logger.warning("Product events: Redis publish failed, delivering locally: %s", error)
+        self.dispatch(events)
+    
+    def dispatch(self, events):
+        """Hand events to this process's subscribers"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            for event in events:
+                if subscription.matches(event):
+                    try:
+                        subscription.loop.call_soon_threadsafe(subscription.put, event)
+                    except RuntimeError:
+                        # The stream's loop has closed without unsubscribing
+                        self.unsubscribe(subscription)
+                        break
+    
+    def _listen(self):
+        while True:
+            try:
+                pubsub = redis.Redis.from_url(self.redis_url).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(REDIS_CHANNEL)
+                for message in pubsub.listen():
+                    self.dispatch(json.loads(message['data']))
+            except Exception as error:
+                logger.warning("Product events: Redis subscription lost, retrying: %s", error)
+                time.sleep(1)
+
+broker = ProductEventBroker()
+
+def publish_changes(entries):
+    """Publish change log entries once the current transaction commits (nothing is sent if it rolls back)"""
+    if entries and broker.active:
+        transaction.on_commit(partial(_publish_entries, list(entries)))
+
+def _publish_entries(entries):
+    try:
+        broker.publish(serialize_changes(entries, Product.objects.all()))
+    except Exception:
+        # Events are best effort; clients catch up from the change feed on reconnect
+        logger.exception("Product events: publishing failed")
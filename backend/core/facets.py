@@ -0,0 +1,148 @@
+"""
+Storefront facets: approved product counts per business and price range.
+
+Counts live in the ProductFacet summary table, one row per (business, price
+bucket), and are adjusted as products change instead of being recomputed with
+GROUP BY over the product table on each request. Single saves and deletes
+apply a +1/-1 delta; bulk changes group their rows into one delta per bucket.
+Deltas are taken from the stored rows, read FOR UPDATE in the writing
+transaction, so concurrent writers to one product cannot count it twice.
+`rebuild_facets` recomputes the table from scratch (or for some businesses)
+when deltas are unavailable or the price bounds change.
+"""
+from bisect import bisect_right
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+
+from .models import Product, ProductFacet
+
+def price_bounds():
+    return tuple(Decimal(bound) for bound in settings.PRODUCT_FACET_PRICE_BOUNDS)
+
+def price_bucket(price, bounds=None):
+    return bisect_right(bounds or price_bounds(), Decimal(str(price)))
+
+def facet_key(status, business_id, price, bounds=None):
+    """(business_id, price bucket) counted for a product, or None if it is not approved"""
+    if status != Product.APPROVED:
+        return None
+    return business_id, price_bucket(price, bounds)
+
+def count_keys(rows):
+    """Counter of facet keys for (status, business_id, price) rows"""
+    bounds = price_bounds()
+    keys = (facet_key(status, business_id, price, bounds) for status, business_id, price in rows)
+    return Counter(key for key in keys if key is not None)
+
+def apply_facet_delta(delta):
+    """Add a {(business_id, bucket): change} mapping to the summary table"""
+    for (business_id, bucket), change in sorted(delta.items()):
+        if not change:
+            continue
+        rows = ProductFacet.objects.filter(business_id=business_id, price_bucket=bucket)
+        if not rows.update(count=F('count') + change) and change > 0:
+            facet, created = ProductFacet.objects.get_or_create(
+                business_id=business_id, price_bucket=bucket, defaults={'count': change}
+            )
+            if not created:
+                rows.update(count=F('count') + change)
+
+def apply_product_change(before, after):
+    """Move one product between facet keys (either may be None)"""
+    if before == after:
+        return
+    delta = Counter()
+    if before is not None:
+        delta[before] -= 1
+    if after is not None:
+        delta[after] += 1
+    apply_facet_delta(delta)
+
+def facet_fields(product):
+    return product.status, product.business_id, product.price
+
+def apply_bulk_change(product_ids, previous=None, current=None):
+    """
+    Update the summary after products were changed in bulk. `previous` and
+    `current` map product id to its (status, business_id, price) before and
+    after the change, with new products left out of `previous`. Without
+    `previous` the affected businesses are rebuilt; without `current` the
+    products are read back.
+    """
+    product_ids = list(product_ids)
+    if previous is None:
+        business_ids = set()
+        for start in range(0, len(product_ids), 1000):
+            chunk = product_ids[start:start + 1000]
+            business_ids.update(Product.objects.filter(id__in=chunk).values_list('business_id', flat=True).distinct())
+        rebuild_facets(business_ids)
+        return
+    delta = Counter()
+    if current is not None:
+        delta.update(count_keys(current.values()))
+    else:
+        for start in range(0, len(product_ids), 1000):
+            chunk = product_ids[start:start + 1000]
+            delta.update(count_keys(Product.objects.filter(id__in=chunk).values_list('status', 'business_id', 'price')))
+    delta.subtract(count_keys(previous.values()))
+    apply_facet_delta(delta)
+
+def bucket_expression(bounds=None):
+    bounds = bounds or price_bounds()
+    return Case(
+        *[When(price__lt=bound, then=Value(index)) for index, bound in enumerate(bounds)],
+        default=Value(len(bounds)),
+        output_field=IntegerField(),
+    )
+
+def rebuild_facets(business_ids=None):
+    """Recompute the summary from the product table, for all businesses or the given ones"""
+    products = Product.objects.filter(status=Product.APPROVED)
+    facets = ProductFacet.objects.all()
+    if business_ids is not None:
+        products = products.filter(business_id__in=business_ids)
+        facets = facets.filter(business_id__in=business_ids)
+    rows = (
+        products.order_by()
+        .annotate(bucket=bucket_expression())
+        .values('business_id', 'bucket')
+        .annotate(total=Count('id'))
+    )
+    with transaction.atomic():
+        facets.delete()
+        ProductFacet.objects.bulk_create([
+            ProductFacet(business_id=row['business_id'], price_bucket=row['bucket'], count=row['total'])
+            for row in rows
+        ], batch_size=1000)
+
+def price_range_label(bound):
+    return f'{bound:.2f}' if bound is not None else None
+
+def get_facets(business_id=None):
+    """
+    Facet counts for approved products: every business with its product count,
+    and the price ranges with their counts (for one business when given).
+    """
+    bounds = price_bounds()
+    businesses = {}
+    buckets = [0] * (len(bounds) + 1)
+    rows = ProductFacet.objects.filter(count__gt=0).values_list('business_id', 'business__name', 'price_bucket', 'count')
+    for pk, name, bucket, count in rows:
+        entry = businesses.setdefault(pk, {'id': pk, 'name': name, 'count': 0})
+        entry['count'] += count
+        if (business_id is None or pk == business_id) and bucket < len(buckets):
+            buckets[bucket] += count
+    lower = (None,) + bounds
+    upper = bounds + (None,)
+    return {
+        'total': sum(buckets),
+        'businesses': sorted(businesses.values(), key=lambda entry: (-entry['count'], entry['name'], entry['id'])),
+        'price_ranges': [
+            {'min': price_range_label(low), 'max': price_range_label(high), 'count': count}
+            for low, high, count in zip(lower, upper, buckets)
+        ],
+    }
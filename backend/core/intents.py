@@ -0,0 +1,68 @@
+"""
+Keyword intent classification for the chatbot.
+
+Intents are registered in priority order, each with the keywords that trigger
+it. All keywords are compiled into one regular expression, so a message is
+classified in a single scan instead of one `word in message` test per keyword.
+Keywords match anywhere in the message (as plain substring checks would), and
+when keywords of several intents appear the earliest registered intent wins.
+"""
+import re
+from collections import namedtuple
+
+Intent = namedtuple('Intent', ['name', 'keywords', 'handler'])
+
+class IntentEngine:
+    def __init__(self, counter=None):
+        # Optional metrics Counter incremented with intent=<name> per response
+        self.counter = counter
+        self._intents = []
+        self._default = None
+        self._pattern = None
+    
+    @property
+    def intents(self):
+        return tuple(self._intents)
+    
+    def intent(self, name, keywords):
+        """Decorator registering a handler(message, catalog) for the given keywords"""
+        def register(handler):
+            self._intents.append(Intent(name, tuple(keywords), handler))
+            self._pattern = None
+            return handler
+        return register
+    
+    def default(self, handler):
+        """Decorator registering the handler used when no keyword matches"""
+        self._default = Intent('default', (), handler)
+        return handler
+    
+    def _compile(self):
+        # A lookahead at every position finds keywords that overlap each other,
+        # and alternatives are tried in priority order at each position.
+        alternatives = '|'.join(
+            f"(?P<i{position}>{'|'.join(re.escape(keyword) for keyword in intent.keywords)})"
+            for position, intent in enumerate(self._intents)
+        )
+        return re.compile(f'(?=(?:{alternatives}))')
+    
+    def classify(self, message):
+        """Return the highest priority Intent whose keywords appear in the lowercased message"""
+        if self._pattern is None:
+            self._pattern = self._compile()
+        best = None
+        for match in self._pattern.finditer(message):
+            position = int(match.lastgroup[1:])
+            if best is None or position < best:
+                best = position
+                if best == 0:
+                    break
+        return self._intents[best] if best is not None else self._default
+    
+    def respond(self, message, catalog):
+        """Classify the message and return (intent name, handler response)"""
+        message = message.lower()
+        intent = self.classify(message)
+        if self.counter is not None:
+            self.counter.inc(intent=intent.name)
+        return intent.name, intent.handler(message, catalog)
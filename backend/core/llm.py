@@ -0,0 +1,74 @@
+"""
+Shared OpenAI clients for the chatbot.
+
+Clients are created once and reused so requests share pooled HTTP connections
+instead of paying a new TLS handshake per message. Every client carries the
+CHATBOT_LLM_TIMEOUT deadline.
+"""
+import asyncio
+import os
+import threading
+import weakref
+import httpx
+from django.conf import settings
+
+PLACEHOLDER_API_KEYS = ('your_openai_api_key_here', 'demo_mode')
+
+_lock = threading.Lock()
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+
+def get_api_key():
+    """Return the configured OpenAI API key, or None when running in demo mode"""
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key or api_key in PLACEHOLDER_API_KEYS:
+        return None
+    return api_key
+
+def _client_options(api_key):
+    return {
+        'api_key': api_key,
+        'base_url': settings.OPENAI_BASE_URL or None,
+        'timeout': settings.CHATBOT_LLM_TIMEOUT,
+    }
+
+def get_client(api_key):
+    """
+    Return the process-wide synchronous client for `api_key`. Retries are
+    disabled so a failing call stays within CHATBOT_LLM_TIMEOUT and the
+    chatbot falls back to its local answers.
+    """
+    key = (api_key, settings.OPENAI_BASE_URL, settings.CHATBOT_LLM_TIMEOUT)
+    client = _clients.get(key)
+    if client is None:
+        from openai import OpenAI
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = OpenAI(
+                    http_client=httpx.Client(timeout=settings.CHATBOT_LLM_TIMEOUT),
+                    max_retries=0,
+                    **_client_options(api_key)
+                )
+                _clients[key] = client
+    return client
+
+def get_async_client(api_key):
+    """
+    Return the asynchronous client for `api_key` on the running event loop.
+    
+    Connection pools cannot be shared between event loops, so there is one
+    client per loop (in practice, one per ASGI worker). Retries are disabled
+    because the caller enforces its own deadline and falls back locally.
+    """
+    from openai import AsyncOpenAI
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    key = (api_key, settings.OPENAI_BASE_URL, settings.CHATBOT_LLM_TIMEOUT)
+    if key not in clients:
+        clients[key] = AsyncOpenAI(
+            http_client=httpx.AsyncClient(timeout=settings.CHATBOT_LLM_TIMEOUT),
+            max_retries=0,
+            **_client_options(api_key)
+        )
+    return clients[key]
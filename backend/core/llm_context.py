@@ -0,0 +1,70 @@
+"""
+Catalog context for language model prompts.
+
+Rather than pasting every approved product into the system prompt, the
+products most relevant to the message are picked from the snapshot's text
+index and added until CHATBOT_CONTEXT_MAX_PRODUCTS or
+CHATBOT_CONTEXT_TOKEN_BUDGET is reached, so prompt size stays flat as the
+catalog grows. Contexts are cached
+per catalog version and query terms, since many users ask the same things.
+"""
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from .text_index import tokenize
+
+CACHE_SIZE = 512
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English text)"""
+    return len(text) // 4 + 1
+
+def select_products(message, snapshot):
+    """Return the products to describe to the model, most relevant first, within budget"""
+    max_products = settings.CHATBOT_CONTEXT_MAX_PRODUCTS
+    budget = settings.CHATBOT_CONTEXT_TOKEN_BUDGET
+    # Relevant products first, then the rest of the catalog in listing order as filler.
+    # Both come from the same snapshot, since the result is cached under its version.
+    candidates = snapshot.search(message, limit=max_products) + list(snapshot.products[:max_products])
+    selected = []
+    seen = set()
+    for product in candidates:
+        if len(selected) == max_products:
+            break
+        if product.id in seen:
+            continue
+        cost = estimate_tokens(product.summary())
+        if cost > budget:
+            continue
+        seen.add(product.id)
+        selected.append(product)
+        budget -= cost
+    return selected
+
+def build_product_context(message, snapshot):
+    """Catalog excerpt for the system prompt, cached per catalog version and query terms"""
+    key = (
+        snapshot.version, frozenset(tokenize(message)),
+        settings.CHATBOT_CONTEXT_MAX_PRODUCTS, settings.CHATBOT_CONTEXT_TOKEN_BUDGET,
+    )
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    
+    if not snapshot:
+        context = "No products are currently available."
+    else:
+        products = select_products(message, snapshot)
+        context = "Available products:\n" + "\n".join(p.summary() for p in products)
+        if len(products) < len(snapshot):
+            context += f"\n(Showing {len(products)} of {len(snapshot)} products, the most relevant to the question first.)"
+    
+    with _lock:
+        _cache[key] = context
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return context
@@ -0,0 +1,22 @@
+"""Shared helpers for the import_products and export_products commands"""
+import sys
+from contextlib import contextmanager
+
+FORMATS = ('csv', 'ndjson')
+EXPORT_FIELDS = ['id', 'name', 'description', 'price', 'status', 'business', 'created_by', 'created_at', 'updated_at']
+
+def detect_format(path, requested):
+    if requested:
+        return requested
+    if path.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return 'csv'
+
+@contextmanager
+def open_stream(path, mode):
+    """Open `path` as text, with '-' meaning stdin/stdout"""
+    if path == '-':
+        yield sys.stdin if 'r' in mode else sys.stdout
+    else:
+        with open(path, mode, newline='', encoding='utf-8') as stream:
+            yield stream
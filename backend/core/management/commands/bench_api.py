@@ -0,0 +1,134 @@
+import json
+import os
+import platform
+from unittest import mock
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from core.benchmarks import BenchmarkRunner, HTTPTransport, TestClientTransport, compare, create_bench_user
+from core.models import Business, User
+
+SCENARIOS = ['login', 'me', 'product_list', 'product_public', 'product_approve', 'chatbot']
+# product_approve creates, approves and deletes products; chatbot saves chat messages
+WRITE_SCENARIOS = ['product_approve', 'chatbot']
+# Only used for the users created in the throwaway database
+BENCH_PASSWORD = 'bench-password-123'
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the core API endpoints and optionally compare against a JSON baseline. '
+        'By default runs in a throwaway test database seeded with seed_load. Against the configured '
+        'database or a running server it logs in as existing users and, unless --allow-writes is '
+        'given, runs only the read-only scenarios.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='Requests per scenario')
+        parser.add_argument('--login-iterations', type=int, default=10, help='Requests for the (slow, password hashing) login scenario')
+        parser.add_argument('--only', action='append', choices=SCENARIOS, help='Run only this scenario (repeatable)')
+        parser.add_argument('--products', type=int, default=2000, help='Products seeded into the throwaway database')
+        parser.add_argument('--use-current-db', action='store_true', help='Benchmark the configured database instead of a throwaway one')
+        parser.add_argument('--base-url', help='Benchmark a running server over HTTP (e.g. http://localhost:8000); implies --use-current-db')
+        parser.add_argument('--allow-writes', action='store_true',
+                            help=f"Also run {' and '.join(WRITE_SCENARIOS)} against the configured database or server")
+        parser.add_argument('--username', help='Existing editor to log in as (not with the throwaway database)')
+        parser.add_argument('--password', default=os.getenv('BENCH_PASSWORD'), help='Its password (default: $BENCH_PASSWORD)')
+        parser.add_argument('--approver-username', help='Existing approver for product_approve')
+        parser.add_argument('--approver-password', default=os.getenv('BENCH_APPROVER_PASSWORD'),
+                            help='Its password (default: $BENCH_APPROVER_PASSWORD)')
+        parser.add_argument('--with-llm', action='store_true', help='Let the chatbot call the configured language model')
+        parser.add_argument('--baseline', help='Baseline JSON file to compare against (or write with --write-baseline)')
+        parser.add_argument('--write-baseline', action='store_true', help='Save the results as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=0.5, help='p95 slowdown versus the baseline before a warning is printed (0.5 = 50%%)')
+        parser.add_argument('--output', help='Also write the results to this JSON file')
+    
+    def handle(self, *args, **options):
+        if options['write_baseline'] and not options['baseline']:
+            raise CommandError('--write-baseline needs --baseline PATH')
+        throwaway = not (options['use_current_db'] or options['base_url'])
+        names = [name for name in SCENARIOS if not options['only'] or name in options['only']]
+        if not throwaway:
+            names = self.check_real_run(names, options)
+        old_name = None
+        if throwaway:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            call_command('seed_load', products=options['products'], chat_messages=options['products'] // 10, stdout=open(os.devnull, 'w'))
+        try:
+            results = self.run_benchmarks(options, names, throwaway)
+        finally:
+            if throwaway:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        
+        self.report(results)
+        report = {
+            'environment': {'python': platform.python_version(), 'database': connection.vendor, 'products': options['products'] if throwaway else None},
+            'scenarios': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as stream:
+                json.dump(report, stream, indent=2)
+        if options['baseline'] and options['write_baseline']:
+            with open(options['baseline'], 'w') as stream:
+                json.dump(report, stream, indent=2)
+                stream.write('\n')
+            self.stdout.write(f"Baseline written to {options['baseline']}")
+        elif options['baseline']:
+            with open(options['baseline']) as stream:
+                regressions, warnings = compare(results, json.load(stream), options['tolerance'])
+            for warning in warnings:
+                self.stdout.write(self.style.WARNING(f'Slower than the baseline (advisory): {warning}'))
+            if regressions:
+                raise CommandError('Query count regressions:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+    
+    def check_real_run(self, names, options):
+        """Scenarios that may run against a real database or server, checking the credentials they need"""
+        if not options['allow_writes']:
+            writes = [name for name in names if name in WRITE_SCENARIOS]
+            if options['only'] and writes:
+                raise CommandError(f"{', '.join(writes)} write to the database; pass --allow-writes to run them against it")
+            names = [name for name in names if name not in WRITE_SCENARIOS]
+        if not (options['username'] and options['password']):
+            raise CommandError('Benchmarking an existing database or server needs --username and --password of an existing editor')
+        if 'product_approve' in names and not (options['approver_username'] and options['approver_password']):
+            raise CommandError('product_approve needs --approver-username and --approver-password of an existing approver')
+        return names
+    
+    def run_benchmarks(self, options, names, throwaway):
+        if throwaway:
+            business = Business.objects.order_by('id').first() or Business.objects.create(name='bench business')
+            create_bench_user('bench-editor', BENCH_PASSWORD, User.EDITOR, business)
+            create_bench_user('bench-approver', BENCH_PASSWORD, User.APPROVER, business)
+            credentials = ('bench-editor', BENCH_PASSWORD, 'bench-approver', BENCH_PASSWORD)
+        else:
+            credentials = (options['username'], options['password'], options['approver_username'], options['approver_password'])
+        if options['base_url']:
+            return self.run_runner(HTTPTransport(options['base_url']), credentials, names, options)
+        # The test client talks to "testserver", which the test environment allows
+        setup_test_environment()
+        try:
+            # Every request comes from one client IP, so login throttling would trip
+            with override_settings(LOGIN_THROTTLE_IP_RATE='', LOGIN_THROTTLE_USERNAME_RATE=''):
+                return self.run_runner(TestClientTransport(), credentials, names, options)
+        finally:
+            teardown_test_environment()
+    
+    def run_runner(self, transport, credentials, names, options):
+        runner = BenchmarkRunner(transport, *credentials)
+        iterations = {'default': options['iterations'], 'login': options['login_iterations']}
+        if options['with_llm']:
+            return runner.run(iterations, names)
+        # Keep the chatbot on its local answers so benchmarks never call a paid API
+        with mock.patch.dict('os.environ', {'OPENAI_API_KEY': 'demo_mode'}):
+            return runner.run(iterations, names)
+    
+    def report(self, results):
+        self.stdout.write(f"{'scenario':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}{'req/s':>10}")
+        for name, summary in results.items():
+            queries = summary['queries_per_request']
+            self.stdout.write(
+                f"{name:<16}{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}"
+                f"{'-' if queries is None else queries:>10}{summary['requests_per_sec']:>10}"
+            )
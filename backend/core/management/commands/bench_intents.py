@@ -0,0 +1,44 @@
+import random
+import time
+from django.core.management.base import BaseCommand, CommandError
+from core.chatbot import engine
+
+SAMPLE_MESSAGES = [
+    "What products are available?",
+    "Show me everything you sell",
+    "Which products are under $50?",
+    "anything less than 19.99 dollars",
+    "Tell me about the gaming laptop",
+    "Can you describe the desk lamp in more detail?",
+    "What's the most expensive thing here?",
+    "cheapest product please",
+    "Which businesses sell on this marketplace?",
+    "Hello there!",
+    "I'm looking for a gift for my sister who likes hiking and photography, any ideas?",
+]
+
+class Command(BaseCommand):
+    help = 'Measure chatbot intent classification throughput'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=10000, help='Number of messages to classify')
+        parser.add_argument('--min-rate', type=float, default=0, help='Fail if fewer messages/sec are classified')
+        parser.add_argument('--seed', type=int, default=0)
+    
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        messages = [rng.choice(SAMPLE_MESSAGES).lower() for _ in range(options['messages'])]
+        engine.classify(messages[0])  # compile the pattern outside the timed loop
+        
+        started = time.perf_counter()
+        for message in messages:
+            engine.classify(message)
+        elapsed = time.perf_counter() - started
+        
+        rate = len(messages) / elapsed
+        self.stdout.write(
+            f"Classified {len(messages)} messages in {elapsed * 1000:.1f} ms: "
+            f"{rate:,.0f} messages/sec, {elapsed / len(messages) * 1e6:.2f} µs/message"
+        )
+        if rate < options['min_rate']:
+            raise CommandError(f"Classification rate {rate:,.0f}/sec is below the required {options['min_rate']:,.0f}/sec")
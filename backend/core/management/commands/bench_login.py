@@ -0,0 +1,49 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from core.hashers import TunedArgon2PasswordHasher, TunedBCryptSHA256PasswordHasher, TunedPBKDF2PasswordHasher
+
+HASHERS = {
+    'pbkdf2': (TunedPBKDF2PasswordHasher, 'PASSWORD_PBKDF2_ITERATIONS'),
+    'argon2': (TunedArgon2PasswordHasher, 'PASSWORD_ARGON2_TIME_COST'),
+    'bcrypt': (TunedBCryptSHA256PasswordHasher, 'PASSWORD_BCRYPT_ROUNDS'),
+}
+
+class Command(BaseCommand):
+    help = (
+        'Measure password verifications per second on one core - the CPU bound on '
+        'logins/sec per core - for the configured hasher or several candidates. '
+        'Use `bench_api --only login` for the full login request.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--hasher', action='append', choices=sorted(HASHERS),
+                            help='Hasher to measure (repeatable, default: PASSWORD_HASHER)')
+        parser.add_argument('--cost', type=int, action='append',
+                            help='Cost to try instead of the configured one: PBKDF2 iterations, Argon2 time cost or bcrypt rounds (repeatable)')
+        parser.add_argument('--duration', type=float, default=2.0, help='Seconds to measure each configuration')
+    
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'hasher':<10}{'cost':>10}{'ms/login':>12}{'logins/s/core':>16}")
+        for name in options['hasher'] or [settings.PASSWORD_HASHER]:
+            hasher_class, setting = HASHERS[name]
+            for cost in options['cost'] or [getattr(settings, setting)]:
+                with override_settings(**{setting: cost}):
+                    try:
+                        rate = self.measure(hasher_class(), options['duration'])
+                    except ValueError as error:
+                        # Raised by Django when argon2-cffi or bcrypt is not installed
+                        raise CommandError(str(error))
+                self.stdout.write(f"{name:<10}{cost:>10}{1000 / rate:>12.2f}{rate:>16.1f}")
+    
+    def measure(self, hasher, duration):
+        encoded = hasher.encode('benchmark-password', hasher.salt())
+        count = 0
+        started = time.perf_counter()
+        while True:
+            hasher.verify('benchmark-password', encoded)
+            count += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= duration:
+                return count / elapsed
@@ -0,0 +1,95 @@
+import io
+import os
+import time
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from core.models import Product
+from core.renderers import ORJSONParser, ORJSONRenderer, orjson
+from core.serializers import ProductListSerializer, ProductRowSerializer, ProductSerializer
+
+SPARSE_FIELDS = ['id', 'name', 'price']
+
+class Command(BaseCommand):
+    help = (
+        'Compare product list serialization strategies, reporting query and serialization '
+        'time per 1,000 products, then JSON renderers on the full list payload. Runs in a '
+        'throwaway test database seeded with seed_load.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per strategy; the fastest is reported')
+    
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            call_command('seed_load', products=options['products'], chat_messages=0, stdout=open(os.devnull, 'w'))
+            results = self.run_strategies(options['repeat'])
+            payload = ProductSerializer(Product.objects.select_related('business', 'created_by'), many=True).data
+            render_results = self.run_renderers(payload, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        
+        scale = 1000 / options['products']
+        baseline = results[0][2]
+        self.stdout.write(f"{'strategy':<32}{'query ms':>10}{'serialize ms':>14}{'total ms':>10}{'speedup':>9}   per 1,000 products")
+        for name, query_time, serialize_time in results:
+            self.stdout.write(
+                f"{name:<32}{query_time * scale * 1000:>10.2f}{serialize_time * scale * 1000:>14.2f}"
+                f"{(query_time + serialize_time) * scale * 1000:>10.2f}{baseline / serialize_time:>8.1f}x"
+            )
+        
+        self.stdout.write('')
+        self.stdout.write(f"{'renderer':<32}{'render ms':>10}{'parse ms':>14}{'KB':>10}   per 1,000 products")
+        if orjson is None:
+            self.stdout.write('(orjson is not installed: ORJSONRenderer falls back to the stdlib encoder)')
+        for name, render_time, parse_time, size in render_results:
+            self.stdout.write(
+                f"{name:<32}{render_time * scale * 1000:>10.2f}{parse_time * scale * 1000:>14.2f}{size * scale / 1024:>10.1f}"
+            )
+    
+    def run_strategies(self, repeat):
+        products = Product.objects.select_related('business', 'created_by').order_by('-created_at', '-id')
+        full = ProductRowSerializer(ProductSerializer.Meta.fields)
+        compact = ProductRowSerializer(ProductListSerializer.Meta.fields)
+        sparse = ProductRowSerializer(SPARSE_FIELDS)
+        strategies = [
+            ('ProductSerializer', lambda: list(products.all()), lambda page: ProductSerializer(page, many=True).data),
+            ('ProductListSerializer', lambda: list(products.all()), lambda page: ProductListSerializer(page, many=True).data),
+            ('ProductSerializer ?fields=', lambda: list(products.all()), lambda page: ProductSerializer(page, many=True, fields=SPARSE_FIELDS).data),
+            ('values() all fields', lambda: list(products.values(*full.lookups())), full.serialize),
+            ('values() compact', lambda: list(products.values(*compact.lookups())), compact.serialize),
+            ('values() ?fields=', lambda: list(products.values(*sparse.lookups())), sparse.serialize),
+        ]
+        results = []
+        for name, fetch, serialize in strategies:
+            best_query = best_serialize = float('inf')
+            for _ in range(repeat):
+                started = time.perf_counter()
+                page = fetch()
+                fetched = time.perf_counter()
+                serialize(page)
+                best_query = min(best_query, fetched - started)
+                best_serialize = min(best_serialize, time.perf_counter() - fetched)
+            results.append((name, best_query, best_serialize))
+        return results
+    
+    def run_renderers(self, payload, repeat):
+        results = []
+        for name, renderer, parser in [
+            ('JSONRenderer / JSONParser', JSONRenderer(), JSONParser()),
+            ('ORJSONRenderer / ORJSONParser', ORJSONRenderer(), ORJSONParser()),
+        ]:
+            best_render = best_parse = float('inf')
+            for _ in range(repeat):
+                started = time.perf_counter()
+                content = renderer.render(payload)
+                rendered = time.perf_counter()
+                parser.parse(io.BytesIO(content), parser_context={'encoding': 'utf-8'})
+                best_render = min(best_render, rendered - started)
+                best_parse = min(best_parse, time.perf_counter() - rendered)
+            results.append((name, best_render, best_parse, len(content)))
+        return results
@@ -0,0 +1,70 @@
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Q
+from django.utils import timezone
+from core.chat_buffer import delete_chat_messages
+from core.models import ChatMessage
+
+ARCHIVE_FIELDS = ['id', 'user', 'session', 'user_message', 'ai_response', 'timestamp']
+
+class Command(BaseCommand):
+    help = (
+        'Delete (optionally archiving) chat messages older than the retention period, and '
+        'trim users beyond a per-user cap, in small batches so the table is never locked for long'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CHAT_RETENTION_DAYS,
+                            help='Delete messages older than this many days (default CHAT_RETENTION_DAYS; 0 disables)')
+        parser.add_argument('--max-per-user', type=int, default=0, help='Keep only the newest N messages of each user (0 disables)')
+        parser.add_argument('--batch-size', type=int, default=settings.CHAT_DELETE_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+        parser.add_argument('--archive', help='Append deleted messages to this NDJSON file first')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many messages would be deleted')
+    
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['max_per_user'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--days and --max-per-user must not be negative, --batch-size must be positive')
+        targets = []
+        if options['days']:
+            cutoff = timezone.now() - timedelta(days=options['days'])
+            targets.append((f"older than {options['days']} days", [ChatMessage.objects.filter(timestamp__lt=cutoff)]))
+        if options['max_per_user']:
+            targets.append((f"beyond {options['max_per_user']} per user", self.over_cap(options['max_per_user'])))
+        
+        archive = open(options['archive'], 'a', encoding='utf-8') if options['archive'] and not options['dry_run'] else None
+        try:
+            for label, querysets in targets:
+                if options['dry_run']:
+                    self.stdout.write(f'Would delete {sum(messages.count() for messages in querysets)} messages {label}')
+                    continue
+                deleted = 0
+                for messages in querysets:
+                    deleted += delete_chat_messages(
+                        messages, options['batch_size'], options['pause'],
+                        before_delete=(lambda ids: self.write_archive(archive, ids)) if archive else None
+                    )
+                self.stdout.write(f'Deleted {deleted} messages {label}')
+        finally:
+            if archive:
+                archive.close()
+    
+    def over_cap(self, limit):
+        """Yield, per user with more than `limit` messages, the messages older than their newest `limit`"""
+        crowded = (ChatMessage.objects.exclude(user=None).values('user')
+                   .annotate(total=Count('id')).filter(total__gt=limit).values_list('user', flat=True))
+        for user_id in list(crowded):
+            # The newest message that no longer fits, found through the (user, -timestamp, -id) index
+            timestamp, message_id = (ChatMessage.objects.filter(user_id=user_id)
+                                     .order_by('-timestamp', '-id').values_list('timestamp', 'id')[limit])
+            yield ChatMessage.objects.filter(user_id=user_id).filter(
+                Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lte=message_id)
+            )
+    
+    def write_archive(self, archive, ids):
+        for row in ChatMessage.objects.filter(id__in=ids).order_by('id').values(*ARCHIVE_FIELDS):
+            archive.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+        archive.flush()
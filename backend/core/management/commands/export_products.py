@@ -0,0 +1,43 @@
+import csv
+import json
+import time
+from django.core.management.base import BaseCommand
+from core.models import Product
+from ._catalog_io import EXPORT_FIELDS, FORMATS, detect_format, open_stream
+
+class Command(BaseCommand):
+    help = 'Stream products to a CSV or NDJSON file with constant memory'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file, or '-' for stdout")
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension (csv unless .ndjson/.jsonl)')
+        parser.add_argument('--status', choices=[choice for choice, label in Product.STATUS_CHOICES])
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched from the database at a time')
+    
+    def handle(self, *args, **options):
+        products = Product.objects.order_by('id')
+        if options['status']:
+            products = products.filter(status=options['status'])
+        rows = products.values_list(
+            'id', 'name', 'description', 'price', 'status', 'business_id', 'created_by_id', 'created_at', 'updated_at'
+        ).iterator(chunk_size=options['chunk_size'])
+        
+        started = time.perf_counter()
+        count = 0
+        output_format = detect_format(options['path'], options['format'])
+        with open_stream(options['path'], 'w') as stream:
+            writer = csv.writer(stream) if output_format == 'csv' else None
+            if writer:
+                writer.writerow(EXPORT_FIELDS)
+            for row in rows:
+                values = [str(value) if column == 'price' else value for column, value in zip(EXPORT_FIELDS, row)]
+                values[-2:] = [timestamp.isoformat() for timestamp in values[-2:]]
+                if writer:
+                    writer.writerow(values)
+                else:
+                    stream.write(json.dumps(dict(zip(EXPORT_FIELDS, values))) + '\n')
+                count += 1
+        
+        elapsed = time.perf_counter() - started
+        # Progress goes to stderr so the data can be piped from stdout
+        self.stderr.write(f"Exported {count} products in {elapsed:.2f}s ({count / elapsed if elapsed else 0:,.0f} rows/sec)")
@@ -0,0 +1,155 @@
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from core.facets import facet_fields
+from core.models import Business, Product, User
+from core.signals import products_bulk_changed
+from ._catalog_io import FORMATS, detect_format, open_stream
+
+STATUSES = {choice for choice, label in Product.STATUS_CHOICES}
+
+class Command(BaseCommand):
+    help = (
+        'Stream products from a CSV or NDJSON file into the database in batches. '
+        'Rows need name, description and price; status, business (id) and created_by (user id) '
+        'are optional when --business and --user are given.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' for stdin")
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension (csv unless .ndjson/.jsonl)')
+        parser.add_argument('--business', type=int, help='Business id for rows without one')
+        parser.add_argument('--user', help='Username recorded as creator for rows without created_by')
+        parser.add_argument('--status', choices=sorted(STATUSES), default=Product.DRAFT, help='Status for rows without one')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--max-errors', type=int, default=100, help='Abort after this many invalid rows')
+    
+    def handle(self, *args, **options):
+        self.default_business = options['business']
+        self.default_user = None
+        if options['user']:
+            try:
+                self.default_user = User.objects.values_list('id', flat=True).get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+        self.default_status = options['status']
+        self.known_businesses = set()
+        self.known_users = set()
+        
+        started = time.perf_counter()
+        imported = errors = 0
+        batch = []
+        with open_stream(options['path'], 'r') as stream:
+            for line, row in self.read_rows(stream, detect_format(options['path'], options['format'])):
+                batch.append((line, row))
+                if len(batch) >= options['batch_size']:
+                    created, failed = self.import_batch(batch)
+                    imported += created
+                    errors += failed
+                    batch = []
+                    if errors > options['max_errors']:
+                        raise CommandError(f"Aborted after {errors} invalid rows ({imported} imported)")
+            if batch:
+                created, failed = self.import_batch(batch)
+                imported += created
+                errors += failed
+        
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Imported {imported} products ({errors} invalid rows skipped) in {elapsed:.2f}s "
+            f"({imported / elapsed if elapsed else 0:,.0f} rows/sec)"
+        )
+    
+    def read_rows(self, stream, input_format):
+        """Yield (line number, row dict) pairs without loading the file"""
+        if input_format == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line, text in enumerate(stream, start=1):
+                if text.strip():
+                    try:
+                        yield line, json.loads(text)
+                    except ValueError:
+                        yield line, None
+    
+    def import_batch(self, batch):
+        """Validate a batch of rows and insert the valid ones, returning (created, failed)"""
+        candidates = []
+        failed = 0
+        for line, row in batch:
+            product, error = self.build_product(row)
+            if error:
+                failed += 1
+                self.stderr.write(f"Line {line}: {error}")
+            else:
+                candidates.append((line, product))
+        
+        # Check foreign keys for the whole batch with one query per table
+        missing_businesses = self.missing_ids(Business, {p.business_id for line, p in candidates}, self.known_businesses)
+        missing_users = self.missing_ids(User, {p.created_by_id for line, p in candidates}, self.known_users)
+        products = []
+        for line, product in candidates:
+            if product.business_id in missing_businesses:
+                failed += 1
+                self.stderr.write(f"Line {line}: business {product.business_id} does not exist")
+            elif product.created_by_id in missing_users:
+                failed += 1
+                self.stderr.write(f"Line {line}: user {product.created_by_id} does not exist")
+            else:
+                products.append(product)
+        
+        # The batch commits together with its facet counts and change log entries
+        with transaction.atomic():
+            created = Product.objects.bulk_create(products)
+            if created:
+                products_bulk_changed.send(sender=Product, product_ids=[p.id for p in created],
+                                           previous={}, current={p.id: facet_fields(p) for p in created})
+        return len(created), failed
+    
+    def missing_ids(self, model, ids, known):
+        unknown = ids - known
+        if unknown:
+            known.update(model.objects.filter(id__in=unknown).values_list('id', flat=True))
+        return ids - known
+    
+    def build_product(self, row):
+        """Return (unsaved Product, None) or (None, error message)"""
+        if not isinstance(row, dict):
+            return None, 'not a valid row'
+        name = row.get('name') or ''
+        description = row.get('description') or ''
+        if not isinstance(name, str) or not isinstance(description, str):
+            return None, 'name and description must be text'
+        name = name.strip()
+        if not name or len(name) > 255:
+            return None, 'name is required and must be at most 255 characters'
+        word_count = len(description.strip().split())
+        if word_count > 100:
+            return None, f'Description must not exceed 100 words. Current count: {word_count}'
+        try:
+            price = Decimal(str(row.get('price'))).quantize(Decimal('0.01'))
+        except (InvalidOperation, ValueError):
+            return None, f"invalid price {row.get('price')!r}"
+        if price.is_nan() or price < 0 or price.adjusted() >= 8:
+            return None, f"invalid price {row.get('price')!r}"
+        product_status = row.get('status') or self.default_status
+        if not isinstance(product_status, str) or product_status not in STATUSES:
+            return None, f"invalid status {product_status!r}"
+        try:
+            business_id = int(row.get('business') or self.default_business)
+            created_by_id = int(row.get('created_by') or self.default_user)
+        except (TypeError, ValueError):
+            return None, 'business and created_by must be ids (or pass --business and --user)'
+        return Product(
+            name=name,
+            description=description,
+            price=price,
+            status=product_status,
+            business_id=business_id,
+            created_by_id=created_by_id,
+        ), None
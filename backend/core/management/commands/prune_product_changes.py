@@ -0,0 +1,33 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.changes import prunable_changes, prune_changes
+
+class Command(BaseCommand):
+    help = (
+        'Delete product change feed entries older than the retention period in small batches '
+        '(the newest entry is always kept). '
+        'Consumers whose token predates the oldest kept entry get 410 Gone and resync.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.PRODUCT_CHANGE_RETENTION_DAYS,
+                            help='Delete entries older than this many days (default PRODUCT_CHANGE_RETENTION_DAYS; 0 disables)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many entries would be deleted')
+    
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--days must not be negative, --batch-size must be positive')
+        if not options['days']:
+            self.stdout.write('Retention is disabled (--days 0); nothing to do')
+            return
+        before = timezone.now() - timedelta(days=options['days'])
+        if options['dry_run']:
+            count = prunable_changes(before).count()
+            self.stdout.write(f'{count} change entries would be deleted')
+            return
+        deleted = prune_changes(before, batch_size=options['batch_size'], pause=options['pause'])
+        self.stdout.write(f'Deleted {deleted} change entries')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from core.facets import rebuild_facets
+from core.models import ProductFacet
+
+class Command(BaseCommand):
+    help = 'Recompute the storefront facet counts (ProductFacet) from the product table'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--business', type=int, action='append', dest='businesses',
+                            help='Only rebuild this business id (repeatable)')
+    
+    def handle(self, *args, **options):
+        rebuild_facets(options['businesses'])
+        rows = ProductFacet.objects.all()
+        if options['businesses']:
+            rows = rows.filter(business_id__in=options['businesses'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows.count()} facet rows"))
@@ -0,0 +1,105 @@
+import random
+import time
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from core.facets import facet_fields
+from core.models import Business, ChatMessage, Product, User
+from core.signals import products_bulk_changed
+
+WORDS = (
+    'wireless compact ergonomic premium portable classic smart organic handmade durable lightweight '
+    'vintage modern stainless bamboo leather ceramic cotton wooden rechargeable waterproof'
+).split()
+NOUNS = (
+    'lamp mug chair desk laptop headphones backpack bottle speaker keyboard mouse notebook pen '
+    'jacket sneakers watch camera blender kettle plant'
+).split()
+QUESTIONS = [
+    'What products are available?', 'Anything under $50?', 'Tell me about the {noun}',
+    'What is the cheapest product?', 'Most expensive item?', 'Which businesses sell here?', 'Hello!',
+]
+
+class Command(BaseCommand):
+    help = 'Generate synthetic businesses, users, products and chat messages for load testing'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--businesses', type=int, default=10)
+        parser.add_argument('--users-per-business', type=int, default=4, help='Users per business, cycling through the roles')
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--approved-ratio', type=float, default=0.7, help='Share of products created approved')
+        parser.add_argument('--chat-messages', type=int, default=1000)
+        parser.add_argument('--password', default='loadtest123', help='Password for every generated user')
+        parser.add_argument('--prefix', default='load', help='Prefix for generated business and user names')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+    
+    def handle(self, *args, **options):
+        if options['businesses'] < 1 or options['users_per_business'] < 1:
+            raise CommandError('At least one business and one user per business are needed')
+        rng = random.Random(options['seed'])
+        prefix = options['prefix']
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+        
+        with transaction.atomic():
+            businesses = Business.objects.bulk_create([
+                Business(name=f'{prefix} business {i}') for i in range(options['businesses'])
+            ])
+            # Hash once: every user shares the password, and hashing dominates user creation
+            password = make_password(options['password'])
+            roles = [User.ADMIN, User.EDITOR, User.APPROVER, User.VIEWER]
+            users = User.objects.bulk_create([
+                User(
+                    username=f'{prefix}-{business.id}-{roles[i % len(roles)]}-{i}',
+                    password=password,
+                    business=business,
+                    role=roles[i % len(roles)],
+                )
+                for business in businesses
+                for i in range(options['users_per_business'])
+            ], batch_size=batch_size)
+        creators = {}
+        for user in users:
+            if user.can_create_product():
+                creators.setdefault(user.business_id, []).append(user)
+        
+        product_count = 0
+        while product_count < options['products']:
+            batch = []
+            for _ in range(min(batch_size, options['products'] - product_count)):
+                business = rng.choice(businesses)
+                noun = rng.choice(NOUNS)
+                batch.append(Product(
+                    name=f'{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {noun.title()}',
+                    description=' '.join(rng.choices(WORDS + NOUNS, k=rng.randint(10, 60))),
+                    price=f'{rng.uniform(1, 2000):.2f}',
+                    status=Product.APPROVED if rng.random() < options['approved_ratio'] else rng.choice([Product.DRAFT, Product.PENDING_APPROVAL]),
+                    business=business,
+                    created_by=rng.choice(creators[business.id]),
+                ))
+            # Each batch commits with its facet counts and change log entries
+            with transaction.atomic():
+                created = Product.objects.bulk_create(batch)
+                products_bulk_changed.send(sender=Product, product_ids=[p.id for p in created],
+                                           previous={}, current={p.id: facet_fields(p) for p in created})
+            product_count += len(batch)
+        
+        message_count = 0
+        while message_count < options['chat_messages']:
+            batch = [
+                ChatMessage(
+                    user=rng.choice(users + [None]),
+                    user_message=rng.choice(QUESTIONS).format(noun=rng.choice(NOUNS)),
+                    ai_response='Synthetic answer for load testing.',
+                )
+                for _ in range(min(batch_size, options['chat_messages'] - message_count))
+            ]
+            ChatMessage.objects.bulk_create(batch)
+            message_count += len(batch)
+        
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Created {len(businesses)} businesses, {len(users)} users, {product_count} products "
+            f"and {message_count} chat messages in {elapsed:.2f}s"
+        )
@@ -0,0 +1,168 @@
+"""
+In-process metrics registry rendered in the Prometheus text format.
+
+Updates are lock-free: every thread writes to its own shard (a plain dict
+reached through threading.local), so gunicorn threads never contend on the
+hot path. The registry lock is only taken when a thread writes its first
+sample and when /api/metrics/ sums the shards. Values are per process;
+Prometheus aggregates them across workers.
+"""
+import bisect
+import math
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = None
+    
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self._local = threading.local()
+            self._shards = []
+    
+    def _shard(self):
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append(values)
+            return values
+    
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+    
+    def _snapshot_shards(self):
+        with self._lock:
+            shards = list(self._shards)
+        # Copying a dict is atomic under the GIL, so writers never need the lock
+        return [list(shard.items()) for shard in shards]
+
+class Counter(Metric):
+    kind = 'counter'
+    
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+    
+    def collect(self):
+        """Return {label values: total}"""
+        totals = {}
+        for items in self._snapshot_shards():
+            for key, value in items:
+                totals[key] = totals.get(key, 0) + value
+        return totals
+    
+    def render(self):
+        return [f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}'
+                for key, value in sorted(self.collect().items())]
+
+class Histogram(Metric):
+    kind = 'histogram'
+    
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labels)
+    
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        state = shard.get(key)
+        if state is None:
+            # Per-bucket counts, the +Inf bucket, then the sum
+            state = shard[key] = [0] * (len(self.buckets) + 2)
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+    
+    def collect(self):
+        """Return {label values: (cumulative bucket counts incl. +Inf, sum, count)}"""
+        merged = {}
+        for items in self._snapshot_shards():
+            for key, state in items:
+                total = merged.setdefault(key, [0] * len(state))
+                for index, value in enumerate(list(state)):
+                    total[index] += value
+        collected = {}
+        for key, state in merged.items():
+            cumulative, running = [], 0
+            for count in state[:-1]:
+                running += count
+                cumulative.append(running)
+            collected[key] = (cumulative, state[-1], running)
+        return collected
+    
+    def render(self):
+        lines = []
+        bounds = self.buckets + (math.inf,)
+        for key, (cumulative, total, count) in sorted(self.collect().items()):
+            for bound, value in zip(bounds, cumulative):
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, [("le", _format_value(bound))])} {value}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {count}')
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+    
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f'Metric {metric.name} is already registered')
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+    
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+    
+    def reset(self):
+        for metric in self._metrics.values():
+            metric.reset()
+    
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+CHATBOT_INTENTS = registry.counter(
+    'chatbot_intents_total', 'Messages answered by the local intent engine, by intent', ['intent'])
+CHATBOT_ANSWERS = registry.counter(
+    'chatbot_answers_total', 'Chatbot answers by endpoint and source (llm, cache, demo, local, unavailable, error)',
+    ['endpoint', 'source'])
+LLM_REQUESTS = registry.counter(
+    'chatbot_llm_requests_total', 'Language model calls by outcome (ok, quota, timeout, error)', ['mode', 'outcome'])
+LLM_LATENCY = registry.histogram(
+    'chatbot_llm_request_duration_seconds', 'Language model call latency', ['mode'],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30))
+CACHE_REQUESTS = registry.counter(
+    'cache_requests_total', 'Application cache lookups by cache and result (hit, miss)', ['cache', 'result'])
@@ -0,0 +1,70 @@
+import json
+import logging
+import time
+from django.conf import settings
+from .request_metrics import RequestMetrics, current_request, install_query_wrappers, request_stats
+
+logger = logging.getLogger('core.requests')
+
+class RequestMetricsMiddleware:
+    """
+    Measure each request's total latency, database queries and time, and
+    response rendering (serialization) time.
+    
+    Every request is aggregated into per-view counters and histograms in the
+    metrics registry (core/metrics.py), served by /api/metrics/. With
+    REQUEST_METRICS_ENABLED it also adds a Server-Timing header and logs one
+    JSON line per request to the `core.requests` logger. Place it first in
+    MIDDLEWARE so the latency covers the other middleware too.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_query_wrappers()
+    
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.finish(request, response, metrics)
+        return response
+    
+    def process_template_response(self, request, response):
+        # DRF serializes to JSON when the response is rendered, after the view returns
+        metrics = current_request.get()
+        if metrics is not None:
+            metrics.render_started = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: self.rendered(metrics))
+        return response
+    
+    def rendered(self, metrics):
+        metrics.render_time = time.perf_counter() - metrics.render_started
+    
+    def finish(self, request, response, metrics):
+        latency = metrics.elapsed()
+        match = request.resolver_match
+        view = match.view_name if match else '<unmatched>'
+        
+        request_stats.record(request.method, view, response.status_code, latency,
+                             metrics.db_queries, metrics.db_time, metrics.render_time)
+        if not settings.REQUEST_METRICS_ENABLED:
+            return
+        if settings.REQUEST_METRICS_SERVER_TIMING:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.db_queries} queries"',
+                f'render;dur={metrics.render_time * 1000:.2f}',
+                f'total;dur={latency * 1000:.2f}',
+            ])
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'duration_ms': round(latency * 1000, 2),
+            'db_queries': metrics.db_queries,
+            'db_ms': round(metrics.db_time * 1000, 2),
+            'render_ms': round(metrics.render_time * 1000, 2),
+        }))
@@ -0,0 +1,68 @@
+from django.db import migrations
+
+# Postgres: GIN expression index over the weighted document queried by
+# core.search.search_vector(). SQLite: an external-content FTS5 table over
+# core_product, kept in sync by triggers. Other databases get neither and
+# search falls back to icontains.
+
+FTS_SQL = [
+    "CREATE VIRTUAL TABLE core_product_fts USING fts5("
+    "name, description, content='core_product', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER core_product_fts_insert AFTER INSERT ON core_product BEGIN "
+    "INSERT INTO core_product_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER core_product_fts_delete AFTER DELETE ON core_product BEGIN "
+    "INSERT INTO core_product_fts(core_product_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER core_product_fts_update AFTER UPDATE OF name, description ON core_product BEGIN "
+    "INSERT INTO core_product_fts(core_product_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO core_product_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    "INSERT INTO core_product_fts(core_product_fts) VALUES ('rebuild')",
+]
+
+FTS_DROP_SQL = [
+    "DROP TRIGGER IF EXISTS core_product_fts_insert",
+    "DROP TRIGGER IF EXISTS core_product_fts_delete",
+    "DROP TRIGGER IF EXISTS core_product_fts_update",
+    "DROP TABLE IF EXISTS core_product_fts",
+]
+
+def search_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+    return GinIndex(
+        SearchVector('name', weight='A', config='english') + SearchVector('description', weight='B', config='english'),
+        name='product_search_idx',
+    )
+
+def sqlite_has_fts5(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any(option == 'ENABLE_FTS5' for option, in cursor.fetchall())
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('core', 'Product'), search_index())
+    elif vendor == 'sqlite' and sqlite_has_fts5(schema_editor):
+        for sql in FTS_SQL:
+            schema_editor.execute(sql)
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('core', 'Product'), search_index())
+    elif vendor == 'sqlite':
+        for sql in FTS_DROP_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_chat_history_scoping'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+
+
+def build_facets(apps, schema_editor):
+    # Same grouping as core.facets.rebuild_facets, against the historical models
+    Product = apps.get_model('core', 'Product')
+    ProductFacet = apps.get_model('core', 'ProductFacet')
+    bounds = [Decimal(bound) for bound in settings.PRODUCT_FACET_PRICE_BOUNDS]
+    bucket = models.Case(
+        *[models.When(price__lt=bound, then=models.Value(index)) for index, bound in enumerate(bounds)],
+        default=models.Value(len(bounds)),
+        output_field=models.IntegerField(),
+    )
+    rows = (
+        Product.objects.filter(status='approved').order_by()
+        .annotate(bucket=bucket).values('business_id', 'bucket').annotate(total=models.Count('id'))
+    )
+    ProductFacet.objects.bulk_create([
+        ProductFacet(business_id=row['business_id'], price_bucket=row['bucket'], count=row['total'])
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_bucket', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_facets', to='core.business')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='productfacet',
+            constraint=models.UniqueConstraint(fields=('business', 'price_bucket'), name='product_facet_unique'),
+        ),
+        migrations.RunPython(build_facets, migrations.RunPython.noop),
+    ]
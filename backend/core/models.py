@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 
@@ -39,6 +39,13 @@ class User(AbstractUser):
     
     def can_manage_users(self):
         return self.role == self.ADMIN
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Saves compare against it to tell whether product payloads (created_by_name) changed
+        instance._stored_username = instance.__dict__.get('username')
+        return instance
 
 class Product(models.Model):
     DRAFT = 'draft'
@@ -60,14 +67,95 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Public listing and status filters, newest first (matches the cursor ordering)
+            models.Index(fields=['status', '-created_at', '-id'], name='product_status_created_idx'),
+            # Unfiltered listing for admins and approvers
+            models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+            # Per-business listing for editors and viewers
+            models.Index(fields=['business', '-created_at', '-id'], name='product_business_created_idx'),
+            # Price range and cheapest/most expensive lookups over approved products
+            models.Index(fields=['status', 'price'], name='product_status_price_idx'),
+        ]
+    
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        # The stored row is read FOR UPDATE before saving (core/signals.py), so
+        # the facet delta is taken from committed state, not this instance's copy
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+    
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            self._deleted_fields = self.locked_fields(using)
+            return super().delete(using=using, keep_parents=keep_parents)
+    
+    def locked_fields(self, using=None):
+        """The stored (status, business_id, price), locked until the transaction ends; None if there is no row"""
+        rows = type(self)._default_manager.db_manager(using).select_for_update().filter(pk=self.pk)
+        return rows.values_list('status', 'business_id', 'price').first()
+
+class ProductFacet(models.Model):
+    """Number of approved products per business and price bucket, kept current by core/facets.py"""
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='product_facets')
+    # Index into settings.PRODUCT_FACET_PRICE_BOUNDS (0 is below the first bound)
+    price_bucket = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['business', 'price_bucket'], name='product_facet_unique'),
+        ]
+
+class ProductChange(models.Model):
+    """Append-only log of product changes, read in id order by /api/products/changes/"""
+    CREATED = 'created'
+    UPDATED = 'updated'
+    APPROVED = 'approved'
+    DELETED = 'deleted'
+    
+    ACTION_CHOICES = [
+        (CREATED, 'Created'),
+        (UPDATED, 'Updated'),
+        (APPROVED, 'Approved'),
+        (DELETED, 'Deleted'),
+    ]
+    
+    # Plain ids rather than foreign keys, so entries outlive deleted products
+    product_id = models.BigIntegerField()
+    business_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    # Product status after the change
+    status = models.CharField(max_length=20, choices=Product.STATUS_CHOICES)
+    timestamp = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            # Feed pages for one business, in log order
+            models.Index(fields=['business_id', 'id'], name='product_change_business_idx'),
+            # Retention sweeps by age
+            models.Index(fields=['timestamp'], name='product_change_timestamp_idx'),
+        ]
 
 class ChatMessage(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_messages', null=True, blank=True)
+    # Client-generated id grouping an anonymous visitor's messages
+    session = models.CharField(max_length=64, blank=True, default='')
     user_message = models.TextField()
     ai_response = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # History pages for a user or an anonymous session, newest first
+            models.Index(fields=['user', '-timestamp', '-id'], name='chat_user_timestamp_idx'),
+            models.Index(fields=['session', '-timestamp', '-id'], name='chat_session_timestamp_idx'),
+            # Retention sweeps by age
+            models.Index(fields=['timestamp'], name='chat_timestamp_idx'),
+        ]
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+class ProductCursorPagination(CursorPagination):
+    """
+    Keyset pagination for product listings.
+    
+    Pages are addressed by an opaque cursor on (created_at, id) instead of an
+    offset, so fetching page 2,000 costs the same as fetching page 1.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    
+    def get_page_size(self, request):
+        self.page_size = settings.PRODUCT_PAGE_SIZE
+        self.max_page_size = settings.PRODUCT_MAX_PAGE_SIZE
+        return super().get_page_size(request)
+
+class ChatHistoryCursorPagination(CursorPagination):
+    """Keyset pagination for a user's or session's chat history, newest first"""
+    
+    ordering = ('-timestamp', '-id')
+    page_size_query_param = 'page_size'
+    
+    def get_page_size(self, request):
+        self.page_size = settings.CHAT_HISTORY_PAGE_SIZE
+        self.max_page_size = settings.CHAT_HISTORY_MAX_PAGE_SIZE
+        return super().get_page_size(request)
+
+class ProductSearchPagination(BasePagination):
+    """
+    Page-number pagination for ranked search results.
+    
+    Results are ordered by relevance, which has no stable keyset, so pages are
+    offsets. No total is counted: one extra row is fetched to tell whether a
+    next page exists, and pages stop at PRODUCT_SEARCH_MAX_PAGES.
+    """
+    page_query_param = 'page'
+    page_size_query_param = 'page_size'
+    
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.PRODUCT_SEARCH_PAGE_SIZE
+        return min(max(size, 1), settings.PRODUCT_SEARCH_MAX_PAGE_SIZE)
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        try:
+            self.page = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            raise NotFound('Invalid page.')
+        if not 1 <= self.page <= settings.PRODUCT_SEARCH_MAX_PAGES:
+            raise NotFound('Invalid page.')
+        offset = (self.page - 1) * self.page_size
+        rows = list(queryset[offset:offset + self.page_size + 1])
+        self.has_next = len(rows) > self.page_size and self.page < settings.PRODUCT_SEARCH_MAX_PAGES
+        return rows[:self.page_size]
+    
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.page + 1)
+    
+    def get_previous_link(self):
+        if self.page == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page - 1)
+    
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
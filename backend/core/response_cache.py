@@ -0,0 +1,105 @@
+"""
+Cache of chatbot answers.
+
+Answers are keyed by the normalized question, the catalog version and the
+answer mode (language model or demo), so a repeated question is served
+without re-running intent matching or paying for another completion, and any
+catalog change makes old answers unreachable. Entries live in a per-process
+LRU by default; set CHATBOT_RESPONSE_CACHE_ALIAS to a Django cache alias to
+share them between workers. CHATBOT_RESPONSE_CACHE_TTL=0 disables caching.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from .metrics import CACHE_REQUESTS
+
+NORMALIZE_RE = re.compile(r"[^\w$.']+")
+
+def normalize_message(message):
+    """Lowercase, collapse punctuation and whitespace: "What's  available?!" -> "what's available" """
+    return NORMALIZE_RE.sub(' ', message.lower()).strip(" .'")
+
+class LRUCache:
+    """Thread-safe LRU with per-entry expiry"""
+    
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class ResponseCache:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._local = None
+    
+    def _backend(self):
+        if settings.CHATBOT_RESPONSE_CACHE_ALIAS:
+            return caches[settings.CHATBOT_RESPONSE_CACHE_ALIAS]
+        if self._local is None or self._local.max_entries != settings.CHATBOT_RESPONSE_CACHE_SIZE:
+            self._local = LRUCache(settings.CHATBOT_RESPONSE_CACHE_SIZE)
+        return self._local
+    
+    @staticmethod
+    def key(message, catalog_version, mode):
+        digest = hashlib.sha1(normalize_message(message).encode()).hexdigest()
+        return f'core:chatbot-answer:{catalog_version}:{mode}:{digest}'
+    
+    def get(self, key):
+        if settings.CHATBOT_RESPONSE_CACHE_TTL <= 0:
+            return None
+        value = self._backend().get(key)
+        # Plain increments: a lost update under contention only skews the metric
+        if value is None:
+            self.misses += 1
+            CACHE_REQUESTS.inc(cache='chatbot_response', result='miss')
+        else:
+            self.hits += 1
+            CACHE_REQUESTS.inc(cache='chatbot_response', result='hit')
+        return value
+    
+    def set(self, key, value):
+        if settings.CHATBOT_RESPONSE_CACHE_TTL > 0:
+            self._backend().set(key, value, settings.CHATBOT_RESPONSE_CACHE_TTL)
+    
+    def clear(self):
+        self.hits = self.misses = 0
+        if self._local is not None:
+            self._local.clear()
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+response_cache = ResponseCache()
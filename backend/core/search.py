@@ -0,0 +1,85 @@
+"""
+Database full-text search over product names and descriptions.
+
+PostgreSQL matches against a weighted tsvector (name 'A', description 'B')
+served by the product_search_idx GIN expression index and ranks with
+ts_rank. SQLite uses the core_product_fts FTS5 table, kept in sync with
+core_product by triggers, and ranks with bm25(). Both are created by
+migration 0004. Other databases, or SQLite builds without FTS5, fall back to
+unranked icontains matching.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Q, Value, FloatField
+from django.db.models.expressions import RawSQL
+
+# Letters and digits in any script, so accented words stay whole
+TOKEN_RE = re.compile(r'[^\W_]+')
+
+# Function words that carry no meaning in a product search
+STOPWORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it', 'its',
+    'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'with',
+])
+
+SEARCH_CONFIG = 'english'
+
+FTS_TABLE = 'core_product_fts'
+
+# bm25() column weights for (name, description)
+FTS_WEIGHTS = (3.0, 1.0)
+
+def tokenize(query):
+    return [term for term in TOKEN_RE.findall(query.lower()) if term not in STOPWORDS]
+
+def search_vector():
+    """The weighted document; must match the index built in migration 0004"""
+    from django.contrib.postgres.search import SearchVector
+    return (SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='B', config=SEARCH_CONFIG))
+
+def fts_query(query):
+    """FTS5 MATCH expression requiring every term, each quoted so user input is never parsed as syntax"""
+    return ' '.join(f'"{term}"' for term in tokenize(query))
+
+def has_fts_table(connection):
+    name = connection.settings_dict['NAME']
+    checked = getattr(connection, '_product_fts', None)
+    if checked is None or checked[0] != name:
+        checked = (name, FTS_TABLE in connection.introspection.table_names())
+        connection._product_fts = checked
+    return checked[1]
+
+def search_products(queryset, query):
+    """
+    Filter `queryset` to products matching `query`, annotated with `rank`
+    (higher is better). Returns an empty queryset when the query has no
+    searchable terms.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return queryset.none().annotate(rank=Value(0.0, output_field=FloatField()))
+    connection = connections[queryset.db]
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        vector = search_vector()
+        search = SearchQuery(' '.join(terms), search_type='plain', config=SEARCH_CONFIG)
+        return queryset.annotate(search=vector).filter(search=search).annotate(rank=SearchRank(vector, search))
+
+    if connection.vendor == 'sqlite' and has_fts_table(connection):
+        # Join the FTS table once so bm25() is computed in the MATCH scan
+        # itself; a correlated subquery per product runs one FTS query per row.
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        table = queryset.model._meta.db_table
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = "{table}"."id"', f'{FTS_TABLE} MATCH %s'],
+            params=[fts_query(query)],
+        ).annotate(rank=RawSQL(f'-bm25({FTS_TABLE}, {weights})', [], output_field=FloatField()))
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(name__icontains=term) | Q(description__icontains=term)
+    return queryset.filter(condition).annotate(rank=Value(0.0, output_field=FloatField()))
@@ -1,4 +1,7 @@
-from rest_framework import serializers
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 from .models import Business, User, Product, ChatMessage
 
 class BusinessSerializer(serializers.ModelSerializer):
@@ -18,7 +21,16 @@ class UserSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         return user
 
-class ProductSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """Accept a `fields` argument listing the fields to keep, in the serializer's order"""
+    
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     created_by_name = serializers.CharField(source='created_by.username', read_only=True)
     business_name = serializers.CharField(source='business.name', read_only=True)
     
@@ -35,6 +47,90 @@ class ProductSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(f'Description must not exceed 100 words. Current count: {word_count}')
         return value
 
+class ProductBulkSerializer(ProductSerializer):
+    """
+    Item serializer for the bulk endpoints; the business always comes from the
+    requesting user, and only users who may approve products can set them
+    approved (pass the request in the serializer context).
+    """
+    
+    class Meta(ProductSerializer.Meta):
+        read_only_fields = ProductSerializer.Meta.read_only_fields + ['business']
+    
+    def validate_status(self, value):
+        if value == Product.APPROVED and not self.context['request'].user.can_approve_product():
+            raise serializers.ValidationError('Only approvers can approve products.')
+        return value
+
+class ProductListSerializer(ProductSerializer):
+    """Compact product summary for list views (`?view=compact`)"""
+    
+    class Meta(ProductSerializer.Meta):
+        fields = ['id', 'name', 'price', 'status', 'business', 'business_name', 'created_at']
+
+class ProductRowSerializer:
+    """
+    Serialize products straight from `queryset.values()` rows.
+    
+    Produces the same output as ProductSerializer for the chosen fields, but
+    skips model instances and DRF's per-field attribute lookups. Prices are
+    formatted by their DRF field; ISO 8601 timestamps are formatted inline,
+    since DRF looks up the current timezone for every value.
+    """
+    
+    # Output field -> values() lookup
+    SOURCES = {
+        'id': 'id',
+        'name': 'name',
+        'description': 'description',
+        'price': 'price',
+        'status': 'status',
+        'business': 'business_id',
+        'created_by': 'created_by_id',
+        'created_by_name': 'created_by__username',
+        'business_name': 'business__name',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+    # Always fetched: cursor pagination reads created_at and id, Last-Modified reads updated_at
+    REQUIRED = ('id', 'created_at', 'updated_at')
+    
+    def __init__(self, fields):
+        self.fields = fields
+    
+    def formatters(self):
+        drf_fields = ProductSerializer().fields
+        formatters = {'price': drf_fields['price'].to_representation}
+        for name in ('created_at', 'updated_at'):
+            if settings.USE_TZ and api_settings.DATETIME_FORMAT == ISO_8601:
+                formatters[name] = self.format_datetime(timezone.get_current_timezone())
+            else:
+                formatters[name] = drf_fields[name].to_representation
+        return formatters
+    
+    @staticmethod
+    def format_datetime(tz):
+        def format_datetime(value):
+            # Same output as DRF's DateTimeField for aware datetimes
+            value = value.astimezone(tz).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return format_datetime
+    
+    def lookups(self):
+        return list(dict.fromkeys([self.SOURCES[name] for name in self.fields] + list(self.REQUIRED)))
+    
+    def serialize(self, rows):
+        formatters = self.formatters()
+        columns = [(name, self.SOURCES[name], formatters.get(name)) for name in self.fields]
+        data = []
+        for row in rows:
+            item = {}
+            for name, source, formatter in columns:
+                value = row[source]
+                item[name] = formatter(value) if formatter is not None and value is not None else value
+            data.append(item)
+        return data
+
 class ChatMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
@@ -0,0 +1,99 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import Signal, receiver
+from .models import Business, Product, ProductChange, User
+from .authentication import invalidate_cached_users
+from .catalog import invalidate_catalog
+from .changes import change_action, record_bulk_changes, record_change
+from .events import publish_changes
+from .facets import apply_bulk_change, apply_product_change, facet_fields, facet_key
+
+# Sent by code paths that change products without saving them one by one
+# (queryset.update(), bulk_create). Pass sender=Product and product_ids=[...].
+# Facet counts are adjusted rather than rebuilt when the sender also passes
+# previous={id: (status, business_id, price)} from before the change (empty
+# for new products), and current={...} from after it saves reading the rows.
+products_bulk_changed = Signal()
+
+def invalidate_catalog_on_commit(**kwargs):
+    # Receivers run inside the writing transaction (Product.save() is atomic).
+    # Moving the catalog version before commit would let readers cache rows
+    # from before the change under the new version, and a rollback would
+    # leave the patched text index out of step with the database.
+    transaction.on_commit(partial(invalidate_catalog, **kwargs))
+
+@receiver(post_save, sender=Product)
+def invalidate_catalog_on_product_save(sender, instance, **kwargs):
+    invalidate_catalog_on_commit(saved=instance)
+
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_on_product_delete(sender, instance, **kwargs):
+    invalidate_catalog_on_commit(deleted_id=instance.pk)
+
+@receiver(pre_save, sender=Product)
+def remember_stored_product(sender, instance, using=None, **kwargs):
+    # Locked until Product.save() commits, so concurrent saves of the same
+    # product (two approvals of one draft) cannot both apply the same delta
+    instance._stored_fields = instance.locked_fields(using) if instance.pk is not None else None
+
+@receiver(post_save, sender=Product)
+def update_facets_on_product_save(sender, instance, **kwargs):
+    stored = getattr(instance, '_stored_fields', None)
+    after = facet_key(instance.status, instance.business_id, instance.price)
+    apply_product_change(facet_key(*stored) if stored else None, after)
+
+@receiver(post_delete, sender=Product)
+def update_facets_on_product_delete(sender, instance, **kwargs):
+    # Product.delete() locks and reads the stored row; cascades and queryset
+    # deletes fetch their instances in the deleting transaction
+    stored = instance.__dict__.pop('_deleted_fields', facet_fields(instance))
+    apply_product_change(facet_key(*stored) if stored else None, None)
+
+# Change log entries are also pushed to /api/products/events/ streams (core/events.py)
+@receiver(post_save, sender=Product)
+def log_product_save(sender, instance, created, **kwargs):
+    stored = getattr(instance, '_stored_fields', None)
+    action = change_action(stored[0] if stored else None, instance.status, created=created)
+    publish_changes([record_change(instance, action)])
+
+@receiver(post_delete, sender=Product)
+def log_product_delete(sender, instance, **kwargs):
+    publish_changes([record_change(instance, ProductChange.DELETED)])
+
+@receiver(post_save, sender=Business)
+@receiver(post_delete, sender=Business)
+def invalidate_catalog_on_business_change(sender, **kwargs):
+    # Business names are not indexed; deleted businesses cascade to product deletes
+    invalidate_catalog_on_commit(index_unaffected=True)
+
+@receiver(post_save, sender=User)
+def invalidate_catalog_on_username_change(sender, instance, created, update_fields=None, **kwargs):
+    # Product payloads (and the public list's ETag) include created_by_name
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    if not created and getattr(instance, '_stored_username', None) != instance.username:
+        invalidate_catalog_on_commit(index_unaffected=True)
+    instance._stored_username = instance.username
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_cached_users([instance.pk])
+
+@receiver(post_save, sender=Business)
+def invalidate_cached_business_users(sender, instance, **kwargs):
+    # Cached users carry their business
+    invalidate_cached_users(instance.users.values_list('id', flat=True))
+
+@receiver(products_bulk_changed)
+def invalidate_catalog_on_bulk_change(sender, **kwargs):
+    invalidate_catalog_on_commit()
+
+@receiver(products_bulk_changed)
+def update_facets_on_bulk_change(sender, product_ids=(), previous=None, current=None, **kwargs):
+    apply_bulk_change(product_ids, previous, current)
+
+@receiver(products_bulk_changed)
+def log_bulk_change(sender, product_ids=(), previous=None, current=None, **kwargs):
+    publish_changes(record_bulk_changes(product_ids, previous, current))
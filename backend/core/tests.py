@@ -1,7 +1,50 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from asgiref.sync import async_to_sync, sync_to_async
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from decimal import Decimal
+from unittest import mock
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.test import AsyncClient, TestCase, override_settings
 from rest_framework.test import APIClient
 from rest_framework import status
-from core.models import Business, User, Product
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import AccessToken
+from core.admin import ProductAdmin
+from core.authentication import stream_ticket_for_user, user_cache_key, user_from_cache
+from core.benchmarks import BenchmarkRunner, TestClientTransport, compare, create_bench_user, percentile
+from core.chat_buffer import chat_buffer
+from core.chatbot import engine
+from core.catalog import (
+    CatalogProduct, CatalogSnapshot, get_catalog, get_product_index, find_products, invalidate_catalog
+)
+from core.events import Subscription, broker
+from core.facets import rebuild_facets
+from core.search import search_products
+from core.models import Business, User, Product, ProductChange, ProductFacet, ChatMessage
+from core.intents import IntentEngine
+from core.metrics import CHATBOT_ANSWERS, CHATBOT_INTENTS, LLM_LATENCY, LLM_REQUESTS, Registry
+from core.llm_context import build_product_context, select_products
+from core.price_index import PriceIndex
+from core.renderers import ORJSONParser, ORJSONRenderer, orjson
+from core.request_metrics import request_stats
+from core.response_cache import normalize_message, response_cache
+from core.text_index import InvertedIndex
 
 class ProductMarketplaceTests(TestCase):
     def setUp(self):
@@ -82,25 +125,1725 @@ class ProductMarketplaceTests(TestCase):
         self.assertEqual(product.status, 'approved')
     
     def test_public_products_only_shows_approved(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(
+                name='Approved Product',
+                description='Test',
+                price=99.99,
+                business=self.business,
+                created_by=self.admin,
+                status='approved'
+            )
+            
+            Product.objects.create(
+                name='Draft Product',
+                description='Test',
+                price=99.99,
+                business=self.business,
+                created_by=self.admin,
+                status='draft'
+            )
+        
+        response = self.client.get('/api/products/public/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['name'], 'Approved Product')
+
+class ProductListingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.business = Business.objects.create(name="Listing Business")
+        self.admin = User.objects.create_user(
+            username="lister",
+            password="lister123",
+            business=self.business,
+            role="admin"
+        )
+        for i in range(5):
+            Product.objects.create(
+                name=f'Product {i}',
+                description='Test',
+                price=10 + i,
+                business=self.business,
+                created_by=self.admin,
+                status='approved'
+            )
+    
+    def test_public_products_cursor_pagination(self):
+        response = self.client.get('/api/products/public/?page_size=2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['name'] for p in response.data['results']], ['Product 4', 'Product 3'])
+        
+        seen = [p['name'] for p in response.data['results']]
+        next_url = response.data['next']
+        while next_url:
+            response = self.client.get(next_url)
+            seen.extend(p['name'] for p in response.data['results'])
+            next_url = response.data['next']
+        self.assertEqual(seen, [f'Product {i}' for i in range(4, -1, -1)])
+    
+    def test_product_list_query_count_is_constant(self):
+        self.client.force_authenticate(user=self.admin)
+        # One query for the page, regardless of how many products it holds
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products/')
+        self.assertEqual(len(response.data['results']), 5)
+        
+        self.client.force_authenticate(user=None)
+        with self.assertNumQueries(1):
+            self.client.get('/api/products/public/')
+
+class ProductQueryPlanTests(TestCase):
+    """Guard the product hot paths against regressions to full table scans"""
+    
+    def setUp(self):
+        self.business = Business.objects.create(name="Plan Business")
+        self.editor = User.objects.create_user(
+            username="planner",
+            password="planner123",
+            business=self.business,
+            role="editor"
+        )
+        for i in range(20):
+            Product.objects.create(
+                name=f'Product {i}',
+                description='Test',
+                price=i,
+                business=self.business,
+                created_by=self.editor,
+                status='approved' if i % 2 else 'draft'
+            )
+    
+    def assertUsesIndex(self, queryset, index_name):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables always favour a seq scan, so take it off the table
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+            try:
+                plan = queryset.explain()
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET enable_seqscan = on')
+            self.assertNotIn('Seq Scan', plan)
+        else:
+            plan = queryset.explain()
+            self.assertNotRegex(plan, r'SCAN core_product(?! USING)')
+            self.assertNotIn('TEMP B-TREE', plan)
+        self.assertIn(index_name, plan)
+    
+    def test_public_listing_uses_status_index(self):
+        queryset = Product.objects.filter(status=Product.APPROVED).order_by('-created_at', '-id')[:51]
+        self.assertUsesIndex(queryset, 'product_status_created_idx')
+    
+    def test_full_listing_uses_created_index(self):
+        queryset = Product.objects.order_by('-created_at', '-id')[:51]
+        self.assertUsesIndex(queryset, 'product_created_idx')
+    
+    def test_business_listing_uses_business_index(self):
+        queryset = Product.objects.filter(business=self.business).order_by('-created_at', '-id')[:51]
+        self.assertUsesIndex(queryset, 'product_business_created_idx')
+    
+    def test_price_queries_use_price_index(self):
+        approved = Product.objects.filter(status=Product.APPROVED)
+        self.assertUsesIndex(approved.filter(price__lte=50).order_by('price'), 'product_status_price_idx')
+        self.assertUsesIndex(approved.order_by('-price')[:3], 'product_status_price_idx')
+    
+    def test_approve_query_count(self):
+        approver = User.objects.create_user(
+            username="plan-approver",
+            password="approver123",
+            business=self.business,
+            role="approver"
+        )
+        product = Product.objects.filter(status=Product.DRAFT).first()
+        client = APIClient()
+        client.force_authenticate(user=approver)
+        # Fetch the product, lock its stored row, update it, move it into the
+        # approved facet counts and log the change
+        with self.assertNumQueries(5):
+            response = client.post(f'/api/products/{product.id}/approve/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+@mock.patch.dict('os.environ', {'OPENAI_API_KEY': 'demo_mode'})
+class CatalogSnapshotTests(TestCase):
+    def setUp(self):
+        invalidate_catalog()
+        self.client = APIClient()
+        self.business = Business.objects.create(name="Snapshot Business")
+        self.editor = User.objects.create_user(
+            username="snapshotter",
+            password="snapshot123",
+            business=self.business,
+            role="editor"
+        )
+        self.product = Product.objects.create(
+            name='Desk Lamp',
+            description='Warm light',
+            price=25,
+            business=self.business,
+            created_by=self.editor,
+            status='approved'
+        )
+    
+    def test_chatbot_reuses_snapshot(self):
+        # First message builds the snapshot, later ones only save the chat message
+        with self.assertNumQueries(2):
+            self.client.post('/api/chatbot/', {'message': 'hello'})
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/chatbot/', {'message': 'hello again'})
+        self.assertIn('Desk Lamp', response.data['ai_response'])
+        self.assertIn('Snapshot Business', response.data['ai_response'])
+    
+    def test_snapshot_rebuilt_after_product_and_business_changes(self):
+        snapshot = get_catalog()
+        self.assertEqual([p.name for p in snapshot], ['Desk Lamp'])
+        
+        # The catalog moves on when the write commits
+        self.product.name = 'Floor Lamp'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+            self.assertEqual([p.name for p in get_catalog()], ['Desk Lamp'])
+        self.assertEqual([p.name for p in get_catalog()], ['Floor Lamp'])
+        
+        self.business.name = 'Renamed Business'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.business.save()
+        self.assertEqual(get_catalog().business_names, ('Renamed Business',))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertFalse(get_catalog())
+    
+    @override_settings(CHATBOT_CATALOG_MAX_AGE=1)
+    def test_snapshot_expires_without_local_invalidation(self):
+        # Stands in for a save made by another process, which this process's cache never hears about
+        invalidate_catalog()
+        get_catalog()
+        Product.objects.filter(pk=self.product.pk).update(name='Floor Lamp')
+        self.assertEqual([p.name for p in get_catalog()], ['Desk Lamp'])
+        time.sleep(1.1)
+        self.assertEqual([p.name for p in get_catalog()], ['Floor Lamp'])
+        self.assertEqual([p.name for p in find_products('floor lamp')], ['Floor Lamp'])
+
+    def test_previous_snapshot_is_served_during_a_rebuild(self):
+        snapshot = get_catalog()
+        Product.objects.filter(pk=self.product.pk).update(name='Floor Lamp')
+        invalidate_catalog()
+        # Another thread holds the rebuild lock: readers neither wait nor query
+        with mock.patch('core.catalog._lock', mock.Mock(**{'acquire.return_value': False})):
+            with self.assertNumQueries(0):
+                self.assertIs(get_catalog(), snapshot)
+                self.assertEqual([p.name for p in find_products('desk lamp')], ['Desk Lamp'])
+        self.assertEqual([p.name for p in get_catalog()], ['Floor Lamp'])
+
+class InvertedIndexTests(TestCase):
+    def test_ranks_name_matches_above_description_matches(self):
+        index = InvertedIndex()
+        index.add(1, 'Laptop Sleeve', 'Padded sleeve for any laptop')
+        index.add(2, 'Gaming Laptop', 'Fast laptop with a great screen')
+        index.add(3, 'Desk Lamp', 'Lights up your laptop desk')
+        self.assertEqual([doc_id for doc_id, score in index.search('tell me about the gaming laptop')][:1], [2])
+        self.assertEqual([doc_id for doc_id, score in index.search('info on the lamp')], [3])
+        self.assertEqual(index.search('tell me about it'), [])
+    
+    def test_remove_and_replace(self):
+        index = InvertedIndex()
+        index.add(1, 'Desk Lamp', 'Warm light')
+        index.add(1, 'Floor Lamp', 'Warm light')
+        self.assertEqual(index.search('desk'), [])
+        self.assertEqual([doc_id for doc_id, score in index.search('floor')], [1])
+        index.remove(1)
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.search('lamp'), [])
+
+class ProductIndexMaintenanceTests(TestCase):
+    def setUp(self):
+        invalidate_catalog()
+        self.business = Business.objects.create(name="Index Business")
+        self.editor = User.objects.create_user(
+            username="indexer",
+            password="indexer123",
+            business=self.business,
+            role="editor"
+        )
+    
+    def create_product(self, name, status='approved'):
+        return Product.objects.create(
+            name=name,
+            description='Test',
+            price=10,
+            business=self.business,
+            created_by=self.editor,
+            status=status
+        )
+    
+    def test_saves_are_applied_in_place(self):
+        self.create_product('Desk Lamp')
+        index = get_product_index()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            draft = self.create_product('Coffee Mug', status='draft')
+        self.assertIs(get_product_index(), index)
+        self.assertEqual(find_products('coffee mug'), [])
+        
+        draft.status = Product.APPROVED
+        with self.captureOnCommitCallbacks(execute=True):
+            draft.save()
+        self.assertIs(get_product_index(), index)
+        self.assertEqual([p.name for p in find_products('tell me about the mug')], ['Coffee Mug'])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            draft.delete()
+        self.assertIs(get_product_index(), index)
+        self.assertEqual(find_products('mug'), [])
+    
+    def test_rolled_back_saves_leave_the_index_alone(self):
+        self.create_product('Desk Lamp')
+        index = get_product_index()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.create_product('Coffee Mug')
+                raise RuntimeError
+        self.assertEqual(callbacks, [])
+        self.assertIs(get_product_index(), index)
+        self.assertEqual(find_products('mug'), [])
+
+class PriceIndexTests(TestCase):
+    def setUp(self):
+        Item = namedtuple('Item', ['id', 'price'])
+        self.index = PriceIndex([Item(i, Decimal(price)) for i, price in enumerate(['30', '5.50', '120', '30', '75'])])
+    
+    def test_range_queries(self):
+        products, total = self.index.at_most(30, limit=2)
+        self.assertEqual(total, 3)
+        self.assertEqual([p.id for p in products], [1, 0])
+        self.assertEqual(self.index.at_most(5, limit=10), ((), 0))
+        self.assertEqual(self.index.count_at_most('1000'), 5)
+    
+    def test_top_k_both_ends(self):
+        self.assertEqual([p.id for p in self.index.cheapest(2)], [1, 0])
+        self.assertEqual([p.id for p in self.index.most_expensive(2)], [2, 4])
+        self.assertEqual(len(self.index.most_expensive(10)), 5)
+        self.assertEqual(self.index.most_expensive(0), ())
+
+@override_settings(CHATBOT_MAX_LISTED_PRODUCTS=2)
+@mock.patch.dict('os.environ', {'OPENAI_API_KEY': 'sk-test'})
+@mock.patch('openai.OpenAI', new=mock.Mock(side_effect=Exception('quota exceeded')))
+class ChatbotPriceIntentTests(TestCase):
+    def setUp(self):
+        invalidate_catalog()
+        self.client = APIClient()
+        business = Business.objects.create(name="Price Business")
+        editor = User.objects.create_user(
+            username="pricer",
+            password="pricer123",
+            business=business,
+            role="editor"
+        )
+        for i, price in enumerate([5, 15, 25, 35, 500]):
+            Product.objects.create(
+                name=f'Item {i}',
+                description='Test',
+                price=price,
+                business=business,
+                created_by=editor,
+                status='approved'
+            )
+    
+    def ask(self, message):
+        return self.client.post('/api/chatbot/', {'message': message}).data['ai_response']
+    
+    def test_under_price_is_capped_with_summary(self):
+        answer = self.ask('anything under $30?')
+        self.assertIn('Item 0', answer)
+        self.assertIn('Item 1', answer)
+        self.assertNotIn('Item 2', answer)
+        self.assertIn('...and 1 more', answer)
+        self.assertIn("don't have any products under $1.0", self.ask('under $1'))
+    
+    def test_cheapest_and_most_expensive(self):
+        self.assertLess(self.ask('cheapest?').index('Item 0'), self.ask('cheapest?').index('Item 1'))
+        answer = self.ask('most expensive?')
+        self.assertTrue(answer.index('Item 4') < answer.index('Item 3') < answer.index('Item 2'))
+
+class IntentEngineTests(TestCase):
+    def reference_classify(self, message):
+        # The sequential substring checks the engine replaces
+        for intent in engine.intents:
+            if any(keyword in message for keyword in intent.keywords):
+                return intent.name
+        return 'default'
+    
+    def test_matches_sequential_keyword_checks(self):
+        messages = [
+            'what products are available?', 'anything cheaper than $20', 'something inexpensive',
+            'tell me about the store', 'whereabouts is the seller', 'most expensive listing',
+            'priciest info', 'affordable lamps', 'hello', '',
+        ]
+        for message in messages:
+            self.assertEqual(engine.classify(message).name, self.reference_classify(message), message)
+    
+    def test_overlapping_keywords_use_priority(self):
+        intents = IntentEngine()
+        intents.intent('low', ['cheap'])(lambda message, catalog: 'low')
+        intents.intent('high', ['apple'])(lambda message, catalog: 'high')
+        intents.default(lambda message, catalog: 'none')
+        # "cheapple" contains both keywords, overlapping at the "p"
+        self.assertEqual(intents.respond('Cheapple', None), ('low', 'low'))
+        self.assertEqual(intents.respond('pineapple', None), ('high', 'high'))
+        self.assertEqual(intents.respond('pear', None), ('default', 'none'))
+    
+    def test_product_info_answers_from_the_given_snapshot(self):
+        invalidate_catalog()
+        snapshot = CatalogSnapshot(1, [CatalogProduct(7, 'Coffee Mug', 'Stoneware', Decimal('9.00'), 'Mug Co')])
+        # The database catalog is empty; the reply comes from the snapshot handed in
+        intent, reply = engine.respond('Tell me about the mug', snapshot)
+        self.assertEqual(intent, 'product_info')
+        self.assertIn("Here's what I know about Coffee Mug", reply)
+
+class StubCompletionHandler(BaseHTTPRequestHandler):
+    """
+    Stands in for the OpenAI chat completions API, streaming `server.tokens`.
+    Tokens from index `server.stall_after` on wait `server.delay` seconds each.
+    """
+    
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for index, token in enumerate(self.server.tokens):
+            if index >= self.server.stall_after:
+                time.sleep(self.server.delay)
+            chunk = {
+                'id': 'chatcmpl-stub', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'stub',
+                'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+    
+    def log_message(self, format, *args):
+        pass
+
+@mock.patch.dict('os.environ', {'OPENAI_API_KEY': 'sk-test'})
+class ChatbotStreamTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubCompletionHandler)
+        cls.server.tokens = ['Hello', ' from', ' the', ' stub']
+        cls.server.delay = 0
+        cls.server.stall_after = 0
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+    
+    def setUp(self):
+        invalidate_catalog()
+        self.server.delay = 0
+        self.server.stall_after = 0
+        base_url = f'http://127.0.0.1:{self.server.server_address[1]}/v1'
+        # Far beyond how long the local stub takes, however loaded the machine; the deadline test lowers it
+        stub_settings = self.settings(OPENAI_BASE_URL=base_url, CHATBOT_LLM_TIMEOUT=30)
+        stub_settings.enable()
+        self.addCleanup(stub_settings.disable)
+    
+    async def stream(self, message):
+        response = await AsyncClient().post('/api/chatbot/stream/', {'message': message}, content_type='application/json')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        events = []
+        for block in body.strip().split('\n\n'):
+            event, data = block.split('\n')
+            events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+        return events
+    
+    async def test_streams_tokens_from_llm(self):
+        events = await self.stream('hi')
+        self.assertEqual([data['delta'] for event, data in events[:-1]], ['Hello', ' from', ' the', ' stub'])
+        event, done = events[-1]
+        self.assertEqual(event, 'done')
+        self.assertEqual(done['source'], 'llm')
+        self.assertFalse(done['truncated'])
+        self.assertEqual(done['ai_response'], 'Hello from the stub')
+        self.assertTrue(await ChatMessage.objects.filter(ai_response='Hello from the stub').aexists())
+    
+    async def test_deadline_falls_back_to_intent_engine(self):
+        self.server.delay = 2
+        with self.settings(CHATBOT_LLM_TIMEOUT=0.2):
+            events = await self.stream('what is the cheapest product?')
+        self.assertEqual(len(events), 2)
+        event, done = events[-1]
+        self.assertEqual(done['source'], 'local')
+        self.assertIn('no products available', done['ai_response'])
+    
+    async def test_deadline_mid_answer_saves_the_local_answer(self):
+        self.server.stall_after = 2
+        self.server.delay = 2
+        with self.settings(CHATBOT_LLM_TIMEOUT=1):
+            events = await self.stream('what is the cheapest product?')
+        self.assertEqual([data['delta'] for event, data in events[:2]], ['Hello', ' from'])
+        event, done = events[-1]
+        self.assertEqual((done['source'], done['truncated']), ('local', True))
+        self.assertEqual(events[-2][1]['delta'], done['ai_response'])
+        self.assertIn('no products available', done['ai_response'])
+        self.assertFalse(await ChatMessage.objects.filter(ai_response__contains='Hello from').aexists())
+    
+    async def test_rejects_empty_message(self):
+        response = await AsyncClient().post('/api/chatbot/stream/', {'message': ' '}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+class LLMContextTests(TestCase):
+    def setUp(self):
+        invalidate_catalog()
+        business = Business.objects.create(name="Context Business")
+        editor = User.objects.create_user(
+            username="contexter",
+            password="context123",
+            business=business,
+            role="editor"
+        )
+        for name in ['Desk Lamp', 'Coffee Mug', 'Gaming Laptop', 'Office Chair', 'Laptop Stand']:
+            Product.objects.create(
+                name=name,
+                description='A fine product ' * 10,
+                price=10,
+                business=business,
+                created_by=editor,
+                status='approved'
+            )
+    
+    @override_settings(CHATBOT_CONTEXT_MAX_PRODUCTS=3)
+    def test_relevant_products_first_and_capped(self):
+        names = [p.name for p in select_products('do you sell a laptop?', get_catalog())]
+        self.assertEqual(len(names), 3)
+        self.assertEqual(set(names[:2]), {'Gaming Laptop', 'Laptop Stand'})
+    
+    @override_settings(CHATBOT_CONTEXT_TOKEN_BUDGET=100)
+    def test_token_budget(self):
+        context = build_product_context('hello', get_catalog())
+        self.assertIn('Showing 2 of 5 products', context)
+    
+    def test_cached_per_catalog_version(self):
+        context = build_product_context('tell me about the mug', get_catalog())
+        self.assertIs(build_product_context('the mug, tell me about it', get_catalog()), context)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(name='Coffee Mug').first().delete()
+        self.assertNotIn('Coffee Mug', build_product_context('tell me about the mug', get_catalog()))
+    
+    def test_ranks_against_the_given_snapshot(self):
+        current = get_catalog()
+        older = CatalogSnapshot(current.version - 1, [CatalogProduct(99, 'Tea Kettle', 'Whistling', Decimal('30.00'), 'Kettle Co')])
+        # The shared index knows nothing of the kettle, and none of the current products may leak in
+        self.assertEqual([p.name for p in select_products('tell me about the kettle', older)], ['Tea Kettle'])
+
+@mock.patch.dict('os.environ', {'OPENAI_API_KEY': 'sk-test'})
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        invalidate_catalog()
+        response_cache.clear()
+        self.client = APIClient()
+        completion = mock.Mock(choices=[mock.Mock(message=mock.Mock(content='We sell lamps.'))])
+        patcher = mock.patch('core.chatbot.get_client')
+        self.llm = patcher.start().return_value.chat.completions.create
+        self.llm.return_value = completion
+        self.addCleanup(patcher.stop)
+    
+    def test_normalize_message(self):
+        self.assertEqual(normalize_message("  What's   AVAILABLE?! "), "what's available")
+        self.assertEqual(normalize_message('Under $20.50?'), 'under $20.50')
+    
+    def test_repeat_questions_are_not_rebilled(self):
+        first = self.client.post('/api/chatbot/', {'message': 'What is available?'})
+        second = self.client.post('/api/chatbot/', {'message': 'what is available'})
+        self.assertEqual(second.data['ai_response'], 'We sell lamps.')
+        self.assertEqual(first.data['ai_response'], second.data['ai_response'])
+        self.assertEqual(self.llm.call_count, 1)
+        self.assertEqual(response_cache.stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+    
+    def test_catalog_change_invalidates_answers(self):
+        self.client.post('/api/chatbot/', {'message': 'What is available?'})
+        with self.captureOnCommitCallbacks(execute=True):
+            Business.objects.create(name="New Business")
+        self.client.post('/api/chatbot/', {'message': 'What is available?'})
+        self.assertEqual(self.llm.call_count, 2)
+    
+    @override_settings(CHATBOT_RESPONSE_CACHE_TTL=0)
+    def test_disabled(self):
+        self.client.post('/api/chatbot/', {'message': 'What is available?'})
+        self.client.post('/api/chatbot/', {'message': 'What is available?'})
+        self.assertEqual(self.llm.call_count, 2)
+    
+    def test_failed_completions_are_not_cached(self):
+        self.llm.side_effect = Exception('connection reset')
+        self.client.post('/api/chatbot/', {'message': 'What is available?'})
+        self.llm.side_effect = None
+        response = self.client.post('/api/chatbot/', {'message': 'What is available?'})
+        self.assertEqual(response.data['ai_response'], 'We sell lamps.')
+
+@override_settings(CHAT_PERSISTENCE='write_behind', CHAT_WRITE_BEHIND_BATCH_SIZE=3, CHAT_WRITE_BEHIND_FLUSH_INTERVAL=3600)
+@mock.patch.dict('os.environ', {'OPENAI_API_KEY': 'demo_mode'})
+class ChatWriteBehindTests(TestCase):
+    def setUp(self):
+        invalidate_catalog()
+        chat_buffer.flush()
+        self.client = APIClient()
+    
+    def test_messages_are_batched(self):
+        for i in range(2):
+            response = self.client.post('/api/chatbot/', {'message': f'hello {i}'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIsNone(response.data['id'])
+            self.assertIsNotNone(response.data['timestamp'])
+        self.assertEqual(ChatMessage.objects.count(), 0)
+        
+        # The third message fills the batch and writes all three at once
+        with self.assertNumQueries(1):
+            self.client.post('/api/chatbot/', {'message': 'hello 2'})
+        self.assertEqual(ChatMessage.objects.count(), 3)
+    
+    def test_flush_writes_partial_batch(self):
+        self.client.post('/api/chatbot/', {'message': 'hello'})
+        self.assertEqual(chat_buffer.flush(), 1)
+        self.assertEqual(ChatMessage.objects.get().user_message, 'hello')
+        self.assertEqual(chat_buffer.flush(), 0)
+
+class PublicProductsConditionalTests(TestCase):
+    def setUp(self):
+        invalidate_catalog()
+        self.client = APIClient()
+        self.business = Business.objects.create(name="Storefront Business")
+        self.approver = User.objects.create_user(
+            username="storefront",
+            password="storefront123",
+            business=self.business,
+            role="approver"
+        )
+        self.product = Product.objects.create(
+            name='Pending Product',
+            description='Test',
+            price=10,
+            business=self.business,
+            created_by=self.approver,
+            status='pending_approval'
+        )
         Product.objects.create(
             name='Approved Product',
             description='Test',
-            price=99.99,
+            price=10,
             business=self.business,
-            created_by=self.admin,
+            created_by=self.approver,
             status='approved'
         )
+    
+    def test_revalidation_and_server_side_cache(self):
+        response = self.client.get('/api/products/public/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag, last_modified = response['ETag'], response['Last-Modified']
         
-        Product.objects.create(
-            name='Draft Product',
-            description='Test',
-            price=99.99,
+        # Revalidation and repeat reads are answered without touching the database
+        with self.assertNumQueries(0):
+            not_modified = self.client.get('/api/products/public/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(not_modified['ETag'], etag)
+            cached = self.client.get('/api/products/public/')
+            self.assertEqual(cached.content, response.content)
+            self.assertEqual(
+                self.client.get('/api/products/public/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code,
+                status.HTTP_304_NOT_MODIFIED
+            )
+        
+        # Other pages get their own ETag
+        self.assertNotEqual(self.client.get('/api/products/public/?page_size=1')['ETag'], etag)
+        
+        # Approving a product changes the listing
+        self.client.force_authenticate(user=self.approver)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/products/{self.product.id}/approve/')
+        self.client.force_authenticate(user=None)
+        response = self.client.get('/api/products/public/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['results']), 2)
+    
+    def test_renaming_the_creator_changes_the_listing(self):
+        etag = self.client.get('/api/products/public/')['ETag']
+        user = User.objects.get(pk=self.approver.pk)
+        user.last_login = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save(update_fields=['last_login'])
+            user.save()
+        self.assertEqual(self.client.get('/api/products/public/', HTTP_IF_NONE_MATCH=etag).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+        user.username = 'renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        response = self.client.get('/api/products/public/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'][0]['created_by_name'], 'renamed')
+
+class ProductBulkTests(TestCase):
+    def setUp(self):
+        invalidate_catalog()
+        self.client = APIClient()
+        self.business = Business.objects.create(name="Bulk Business")
+        self.other_business = Business.objects.create(name="Other Business")
+        self.editor = User.objects.create_user(
+            username="bulk-editor",
+            password="editor123",
+            business=self.business,
+            role="editor"
+        )
+        self.approver = User.objects.create_user(
+            username="bulk-approver",
+            password="approver123",
             business=self.business,
-            created_by=self.admin,
-            status='draft'
+            role="approver"
         )
+    
+    def test_bulk_create_reports_per_item_results(self):
+        self.client.force_authenticate(user=self.editor)
+        items = [{'name': f'Item {i}', 'description': 'Test', 'price': '9.99'} for i in range(3)]
+        items.append({'name': 'Too wordy', 'description': 'word ' * 101, 'price': '1.00'})
+        items.append({'name': 'Other business', 'description': 'Test', 'price': '5.00', 'business': self.other_business.id})
         
-        response = self.client.get('/api/products/public/')
+        response = self.client.post('/api/products/bulk/', items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual((response.data['succeeded'], response.data['failed']), (4, 1))
+        self.assertIn('description', response.data['results'][3]['errors'])
+        created = Product.objects.filter(id__in=[r['id'] for r in response.data['results'] if 'id' in r])
+        self.assertEqual(created.count(), 4)
+        self.assertEqual(set(created.values_list('business', flat=True)), {self.business.id})
+        self.assertEqual(set(created.values_list('created_by', flat=True)), {self.editor.id})
+    
+    def test_bulk_create_uses_one_insert(self):
+        self.client.force_authenticate(user=self.editor)
+        items = [{'name': f'Item {i}', 'description': 'Test', 'price': '9.99'} for i in range(50)]
+        # Savepoint, insert, release, then one insert into the change log
+        with self.assertNumQueries(4):
+            response = self.client.post('/api/products/bulk/', items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+    
+    def test_bulk_create_rolls_back_with_its_change_log(self):
+        self.client.force_authenticate(user=self.editor)
+        items = [{'name': 'Item', 'description': 'Test', 'price': '9.99'}]
+        with mock.patch('core.signals.record_bulk_changes', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            self.client.post('/api/products/bulk/', items, format='json')
+        self.assertFalse(Product.objects.exists())
+    
+    def test_only_approvers_can_bulk_set_approved(self):
+        own = Product.objects.create(name='Own', description='Test', price=1, business=self.business, created_by=self.editor)
+        self.client.force_authenticate(user=self.editor)
+        response = self.client.post('/api/products/bulk/', [
+            {'name': 'Sneaky', 'description': 'Test', 'price': '1.00', 'status': 'approved'},
+            {'name': 'Submitted', 'description': 'Test', 'price': '1.00', 'status': 'pending_approval'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertIn('status', response.data['results'][0]['errors'])
+        response = self.client.patch('/api/products/bulk/', [{'id': own.id, 'status': 'approved'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Product.objects.filter(status=Product.APPROVED).exists())
+        
+        self.client.force_authenticate(user=self.approver)
+        response = self.client.patch('/api/products/bulk/', [{'id': own.id, 'status': 'approved'}], format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['name'], 'Approved Product')
+    
+    def test_viewer_cannot_bulk_create(self):
+        viewer = User.objects.create_user(username="bulk-viewer", password="viewer123", business=self.business, role="viewer")
+        self.client.force_authenticate(user=viewer)
+        response = self.client.post('/api/products/bulk/', [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_bulk_update_is_scoped_to_visible_products(self):
+        own = Product.objects.create(name='Own', description='Test', price=1, business=self.business, created_by=self.editor)
+        foreign = Product.objects.create(name='Foreign', description='Test', price=1, business=self.other_business, created_by=self.approver)
+        self.client.force_authenticate(user=self.editor)
+        response = self.client.patch('/api/products/bulk/', [
+            {'id': own.id, 'price': '2.50'},
+            {'id': foreign.id, 'price': '2.50'},
+            {'id': own.id, 'description': 'word ' * 101},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['succeeded'], 1)
+        own.refresh_from_db()
+        foreign.refresh_from_db()
+        self.assertEqual(own.price, Decimal('2.50'))
+        self.assertEqual(foreign.price, Decimal('1'))
+    
+    def test_bulk_update_reports_malformed_ids_as_not_found(self):
+        own = Product.objects.create(name='Own', description='Test', price=1, business=self.business, created_by=self.editor)
+        self.client.force_authenticate(user=self.editor)
+        response = self.client.patch('/api/products/bulk/', [
+            {'id': [own.id], 'name': 'x'}, {'id': True, 'name': 'x'}, {'id': str(own.id), 'name': 'x'}, 'junk',
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([r['errors'] for r in response.data['results']], [{'id': ['Product not found.']}] * 4)
+        self.client.force_authenticate(user=self.approver)
+        response = self.client.post('/api/products/bulk-approve/', {'ids': [True]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_bulk_approve(self):
+        products = [
+            Product.objects.create(name=f'Pending {i}', description='Test', price=1, business=self.business,
+                                   created_by=self.editor, status='pending_approval')
+            for i in range(3)
+        ]
+        self.assertEqual(len(get_catalog()), 0)
+        
+        self.client.force_authenticate(user=self.editor)
+        response = self.client.post('/api/products/bulk-approve/', {'ids': [products[0].id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        
+        self.client.force_authenticate(user=self.approver)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/products/bulk-approve/', {'ids': [p.id for p in products] + [0]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['succeeded'], 3)
+        self.assertEqual(Product.objects.filter(status='approved').count(), 3)
+        # The catalog picks up changes made without per-product saves
+        self.assertEqual(len(get_catalog()), 3)
+    
+    def test_admin_approve_action_touches_updated_at(self):
+        product = Product.objects.create(name='Pending', description='Test', price=1, business=self.business,
+                                         created_by=self.editor, status='pending_approval')
+        Product.objects.filter(pk=product.pk).update(updated_at=timezone.now() - datetime.timedelta(days=1))
+        ProductAdmin(Product, admin.site).approve_products(None, Product.objects.filter(pk=product.pk))
+        product.refresh_from_db()
+        self.assertEqual(product.status, Product.APPROVED)
+        self.assertGreater(product.updated_at, timezone.now() - datetime.timedelta(minutes=1))
+
+class CatalogImportExportTests(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name="Import Business")
+        self.editor = User.objects.create_user(
+            username="importer",
+            password="importer123",
+            business=self.business,
+            role="editor"
+        )
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+    
+    def path(self, name, content=None):
+        path = os.path.join(self.directory.name, name)
+        if content is not None:
+            with open(path, 'w') as stream:
+                stream.write(content)
+        return path
+    
+    def run_command(self, *args, **options):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command(*args, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+    
+    def test_csv_import_validates_rows(self):
+        path = self.path('products.csv', (
+            'name,description,price,status\n'
+            'Desk Lamp,Warm light,25.00,approved\n'
+            'Coffee Mug,"Holds coffee",8,\n'
+            ',Nameless,1.00,\n'
+            f'Wordy,"{"word " * 101}",1.00,\n'
+            'Free Lunch,None,abc,\n'
+        ))
+        stdout, stderr = self.run_command('import_products', path, business=self.business.id, user='importer', batch_size=2)
+        self.assertIn('Imported 2 products (3 invalid rows skipped)', stdout)
+        self.assertIn('Line 5: Description must not exceed 100 words', stderr)
+        self.assertEqual(
+            sorted(Product.objects.values_list('name', 'status')),
+            [('Coffee Mug', 'draft'), ('Desk Lamp', 'approved')]
+        )
+    
+    def test_ndjson_round_trip(self):
+        for i in range(5):
+            Product.objects.create(name=f'Item {i}', description='Test', price=Decimal('1.50') * i,
+                                   business=self.business, created_by=self.editor, status='approved')
+        path = self.path('products.ndjson')
+        stdout, stderr = self.run_command('export_products', path, chunk_size=2)
+        self.assertIn('Exported 5 products', stderr)
+        with open(path) as stream:
+            exported = [json.loads(line) for line in stream]
+        self.assertEqual([row['price'] for row in exported], ['0.00', '1.50', '3.00', '4.50', '6.00'])
+        
+        Product.objects.all().delete()
+        stdout, stderr = self.run_command('import_products', path)
+        self.assertIn('Imported 5 products (0 invalid rows skipped)', stdout)
+        self.assertEqual(Product.objects.filter(status='approved', business=self.business).count(), 5)
+    
+    def test_unknown_business_is_reported(self):
+        path = self.path('products.ndjson', '{"name": "Lamp", "description": "Light", "price": "3", "business": 999}\n')
+        stdout, stderr = self.run_command('import_products', path, user='importer')
+        self.assertIn('business 999 does not exist', stderr)
+        self.assertFalse(Product.objects.exists())
+    
+    def test_non_text_values_are_invalid_rows(self):
+        path = self.path('products.ndjson', (
+            '{"name": 123, "price": "3"}\n'
+            '{"name": "Lamp", "description": ["Light"], "price": "3"}\n'
+            '{"name": "Lamp", "price": "3", "status": ["approved"]}\n'
+            '{"name": "Mug", "price": "8"}\n'
+        ))
+        stdout, stderr = self.run_command('import_products', path, business=self.business.id, user='importer')
+        self.assertIn('Imported 1 products (3 invalid rows skipped)', stdout)
+        self.assertIn('Line 1: name and description must be text', stderr)
+        self.assertEqual(list(Product.objects.values_list('name', flat=True)), ['Mug'])
+
+
+class LoadBenchmarkTests(TestCase):
+    def test_seed_load_creates_requested_volumes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('seed_load', businesses=2, users_per_business=4, products=30, chat_messages=12,
+                         batch_size=7, stdout=io.StringIO())
+        self.assertEqual(Business.objects.count(), 2)
+        self.assertEqual(User.objects.count(), 8)
+        self.assertEqual(Product.objects.count(), 30)
+        self.assertEqual(ChatMessage.objects.count(), 12)
+        self.assertTrue(Product.objects.first().created_by.can_create_product())
+        user = User.objects.filter(role=User.EDITOR).first()
+        response = APIClient().post('/api/login/', {'username': user.username, 'password': 'loadtest123'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(get_catalog().products), Product.objects.filter(status='approved').count())
+    
+    def test_product_approve_brings_its_own_products(self):
+        business = Business.objects.create(name='Bench Business')
+        create_bench_user('bench-editor', 'bench-password-123', User.EDITOR, business)
+        create_bench_user('bench-approver', 'bench-password-123', User.APPROVER, business)
+        runner = BenchmarkRunner(TestClientTransport(), 'bench-editor', 'bench-password-123',
+                                 'bench-approver', 'bench-password-123')
+        results = runner.run({'default': 3}, ['product_approve'], warmup=1)
+        self.assertEqual(results['product_approve']['requests'], 3)
+        # The pending products it approved were created for the run and are gone again
+        self.assertFalse(Product.objects.exists())
+    
+    def test_bench_api_leaves_real_databases_alone_by_default(self):
+        editor = User.objects.create_user(username='real-editor', password='real123', role='editor')
+        with self.assertRaisesMessage(CommandError, 'pass --allow-writes'):
+            call_command('bench_api', use_current_db=True, only=['product_approve'], username='real-editor', password='real123')
+        with self.assertRaisesMessage(CommandError, '--username and --password'):
+            call_command('bench_api', base_url='http://localhost:8000', only=['me'])
+        with self.assertRaisesMessage(CommandError, '--approver-username'):
+            call_command('bench_api', use_current_db=True, allow_writes=True, username='real-editor', password='real123')
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), ['real-editor'])
+        self.assertTrue(User.objects.get(pk=editor.pk).check_password('real123'))
+    
+    def test_percentile_interpolates(self):
+        self.assertEqual(percentile([4, 1, 3, 2], 0.5), 2.5)
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 0.95), 4.8)
+        self.assertEqual(percentile([7], 0.99), 7)
+    
+    def test_compare_fails_on_queries_and_warns_on_latency(self):
+        baseline = {'scenarios': {
+            'me': {'p95_ms': 10.0, 'queries_per_request': 1.0},
+            'chatbot': {'p95_ms': 5.0, 'queries_per_request': 1.0},
+        }}
+        results = {
+            'me': {'p95_ms': 14.0, 'queries_per_request': 1.0},
+            'chatbot': {'p95_ms': 9.0, 'queries_per_request': 2.0},
+        }
+        regressions, warnings = compare(results, baseline, tolerance=0.5)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith('chatbot: 2.0 queries'))
+        self.assertEqual(len(warnings), 1)
+        self.assertTrue(warnings[0].startswith('chatbot: p95'))
+
+
+@override_settings(REQUEST_METRICS_ENABLED=True)
+class RequestMetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        request_stats.clear()
+        self.addCleanup(request_stats.clear)
+        self.business = Business.objects.create(name='Test Business')
+        self.admin = User.objects.create_user(username='admin', password='test123', role='admin', business=self.business)
+        for i in range(3):
+            Product.objects.create(name=f'Item {i}', description='Test', price=Decimal('9.99'),
+                                   business=self.business, created_by=self.admin, status='approved')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+    
+    def test_server_timing_header_and_log_line(self):
+        with self.assertLogs('core.requests', level='INFO') as logs:
+            response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = dict(part.strip().split(';', 1) for part in response['Server-Timing'].split(','))
+        self.assertEqual(set(timing), {'db', 'render', 'total'})
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['view'], 'product-list')
+        self.assertEqual(record['status'], 200)
+        self.assertGreaterEqual(record['db_queries'], 1)
+        self.assertIn(f'desc="{record["db_queries"]} queries"', timing['db'])
+        self.assertGreater(record['render_ms'], 0)
+    
+    def test_histograms_served_to_admins(self):
+        with self.assertLogs('core.requests'):
+            for _ in range(3):
+                self.client.get('/api/products/public/')
+            response = self.client.get('/api/metrics/requests/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        public = response.data['views']['GET product-list-public']
+        self.assertEqual(public['requests'], 3)
+        self.assertEqual(public['latency_ms']['count'], 3)
+        self.assertEqual(public['latency_ms']['buckets']['+Inf'], 3)
+        self.assertEqual(public['db_queries']['count'], 3)
+    
+    def test_metrics_endpoint_requires_admin(self):
+        viewer = User.objects.create_user(username='viewer', password='test123', role='viewer', business=self.business)
+        self.client.force_authenticate(user=viewer)
+        with self.assertLogs('core.requests'):
+            self.assertEqual(self.client.get('/api/metrics/requests/').status_code, status.HTTP_403_FORBIDDEN)
+    
+    @override_settings(REQUEST_METRICS_ENABLED=False)
+    def test_header_and_log_are_opt_in_but_views_are_always_counted(self):
+        with self.assertNoLogs('core.requests'):
+            self.assertNotIn('Server-Timing', APIClient().get('/api/products/public/'))
+        public = request_stats.snapshot()['GET product-list-public']
+        self.assertEqual(public['requests'], 1)
+        self.assertEqual(public['db_queries']['count'], 1)
+
+
+class MetricsRegistryTests(TestCase):
+    def test_prometheus_text_format(self):
+        registry = Registry()
+        requests = registry.counter('demo_requests_total', 'Requests', ['route'])
+        latency = registry.histogram('demo_latency_seconds', 'Latency', buckets=(0.1, 1))
+        requests.inc(route='a"b')
+        requests.inc(2, route='a"b')
+        for value in (0.05, 0.5, 5):
+            latency.observe(value)
+        self.assertEqual(registry.render().splitlines(), [
+            '# HELP demo_latency_seconds Latency',
+            '# TYPE demo_latency_seconds histogram',
+            'demo_latency_seconds_bucket{le="0.1"} 1',
+            'demo_latency_seconds_bucket{le="1"} 2',
+            'demo_latency_seconds_bucket{le="+Inf"} 3',
+            'demo_latency_seconds_sum 5.55',
+            'demo_latency_seconds_count 3',
+            '# HELP demo_requests_total Requests',
+            '# TYPE demo_requests_total counter',
+            'demo_requests_total{route="a\\"b"} 3',
+        ])
+    
+    def test_thread_shards_are_summed(self):
+        counter = Registry().counter('demo_total', 'Demo', ['kind'])
+        threads = [threading.Thread(target=lambda: [counter.inc(kind='x') for _ in range(1000)]) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.collect(), {('x',): 8000})
+        counter.reset()
+        self.assertEqual(counter.collect(), {})
+
+@mock.patch.dict('os.environ', {'OPENAI_API_KEY': 'sk-test'})
+@override_settings(METRICS_TOKEN='scrape-secret')
+class MetricsEndpointTests(TestCase):
+    def setUp(self):
+        invalidate_catalog()
+        response_cache.clear()
+        for metric in (CHATBOT_ANSWERS, CHATBOT_INTENTS, LLM_LATENCY, LLM_REQUESTS):
+            metric.reset()
+        self.client = APIClient()
+    
+    def test_chatbot_fallbacks_are_counted(self):
+        with mock.patch('core.chatbot.get_client', side_effect=Exception('quota exceeded')), \
+                self.assertLogs('core.chatbot', level='WARNING'):
+            self.client.post('/api/chatbot/', {'message': 'What is the cheapest product?'})
+        with mock.patch('core.chatbot.get_client', side_effect=Exception('connection reset')), \
+                self.assertLogs('core.chatbot', level='WARNING'):
+            self.client.post('/api/chatbot/', {'message': 'hello'})
+        self.assertEqual(CHATBOT_INTENTS.collect(), {('cheapest',): 1})
+        self.assertEqual(LLM_REQUESTS.collect(), {('sync', 'quota'): 1, ('sync', 'error'): 1})
+        self.assertEqual(CHATBOT_ANSWERS.collect(), {('chatbot', 'local'): 1, ('chatbot', 'unavailable'): 1})
+        
+        response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('chatbot_intents_total{intent="cheapest"} 1', body)
+        self.assertIn('chatbot_llm_requests_total{mode="sync",outcome="quota"} 1', body)
+        self.assertIn('chatbot_llm_request_duration_seconds_count{mode="sync"} 2', body)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+    
+    def test_requires_token_or_admin(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(
+            self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code,
+            status.HTTP_401_UNAUTHORIZED
+        )
+        business = Business.objects.create(name='Test Business')
+        admin = User.objects.create_user(username='admin', password='test123', role='admin', business=business)
+        self.client.force_authenticate(user=admin)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, status.HTTP_200_OK)
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Test Business')
+        self.admin = User.objects.create_user(username='admin', password='test123', role='admin', business=self.business)
+        self.editor = User.objects.create_user(username='editor', password='test123', role='editor', business=self.business)
+        self.client = APIClient()
+    
+    def login(self, username):
+        response = self.client.post('/api/login/', {'username': username, 'password': 'test123'})
+        return response.data['access']
+    
+    def get_me(self, token):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/me/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return response, len(queries)
+    
+    def test_token_carries_role_and_business_claims(self):
+        payload = AccessToken(self.login('editor'))
+        self.assertEqual(payload['role'], 'editor')
+        self.assertEqual(payload['business_id'], self.business.id)
+    
+    def test_user_lookup_is_cached(self):
+        token = self.login('editor')
+        response, first = self.get_me(token)
+        self.assertEqual(response.data['username'], 'editor')
+        response, second = self.get_me(token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((first, second), (1, 0))
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Only the product page itself; neither the user nor its business is loaded
+        self.assertEqual(len(queries), 1)
+    
+    def test_cache_holds_no_password_hash(self):
+        token = self.login('editor')
+        self.get_me(token)
+        cached = cache.get(user_cache_key(self.editor.id))
+        self.assertNotIn('password', cached)
+        self.assertEqual(cached['business_name'], 'Test Business')
+        user = user_from_cache(cached)
+        self.assertEqual((user.pk, user.role, user.business.name), (self.editor.id, 'editor', 'Test Business'))
+        self.assertEqual(user.get_deferred_fields(), {'password', 'last_login', 'date_joined'})
+        # Deferred fields load on access
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('test123'))
+    
+    def test_user_update_and_delete_invalidate_cache(self):
+        editor_token = self.login('editor')
+        self.get_me(editor_token)
+        admin_token = self.login('admin')
+        response = self.client.patch(f'/api/users/{self.editor.id}/', {'first_name': 'Eddie'},
+                                     HTTP_AUTHORIZATION=f'Bearer {admin_token}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response, queries = self.get_me(editor_token)
+        self.assertEqual((response.data['first_name'], queries), ('Eddie', 1))
+        
+        self.client.delete(f'/api/users/{self.editor.id}/', HTTP_AUTHORIZATION=f'Bearer {admin_token}')
+        response, queries = self.get_me(editor_token)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_role_change_rejects_old_tokens(self):
+        token = self.login('editor')
+        self.editor.role = User.VIEWER
+        self.editor.save()
+        response, queries = self.get_me(token)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response, queries = self.get_me(self.login('editor'))
+        self.assertEqual(response.data['role'], 'viewer')
+    
+    @override_settings(AUTH_USER_CACHE_TTL=0)
+    def test_cache_can_be_disabled(self):
+        token = self.login('editor')
+        self.assertEqual([self.get_me(token)[1] for _ in range(2)], [1, 1])
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000, LOGIN_THROTTLE_IP_RATE='', LOGIN_THROTTLE_USERNAME_RATE='')
+class LoginHardeningTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.business = Business.objects.create(name='Test Business')
+        self.user = User.objects.create_user(username='editor', password='test123', role='editor', business=self.business)
+        self.client = APIClient()
+    
+    def login(self, password='test123', username='editor', ip='10.0.0.1'):
+        return self.client.post('/api/login/', {'username': username, 'password': password}, REMOTE_ADDR=ip)
+    
+    def test_password_is_rehashed_when_cost_changes(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=1200):
+            self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1200$'))
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+    
+    @override_settings(LOGIN_THROTTLE_IP_RATE='3/min')
+    def test_ip_throttle_rejects_before_hashing(self):
+        for _ in range(3):
+            self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        with mock.patch('core.views.authenticate') as authenticate:
+            response = self.login()
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        authenticate.assert_not_called()
+        self.assertEqual(self.login(ip='10.0.0.2').status_code, status.HTTP_200_OK)
+    
+    @override_settings(LOGIN_THROTTLE_IP_RATE='3/min')
+    def test_ip_throttle_ignores_spoofed_forwarded_for(self):
+        def login(forwarded):
+            return self.client.post('/api/login/', {'username': 'editor', 'password': 'test123'},
+                                    REMOTE_ADDR='10.0.0.9', HTTP_X_FORWARDED_FOR=forwarded)
+        
+        # Without trusted proxies the header is ignored
+        for i in range(3):
+            self.assertEqual(login(f'203.0.113.{i}').status_code, status.HTTP_200_OK)
+        self.assertEqual(login('203.0.113.99').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        
+        # Behind one proxy only the address it appended counts
+        cache.clear()
+        with self.settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            for i in range(3):
+                self.assertEqual(login(f'203.0.113.{i}, 198.51.100.7').status_code, status.HTTP_200_OK)
+            self.assertEqual(login('203.0.113.99, 198.51.100.7').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(login('198.51.100.8').status_code, status.HTTP_200_OK)
+    
+    @override_settings(LOGIN_THROTTLE_USERNAME_RATE='2/min')
+    def test_username_throttle_counts_failures_only(self):
+        for _ in range(3):
+            self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        for ip in ('10.0.0.1', '10.0.0.2'):
+            self.assertEqual(self.login(password='wrong', ip=ip).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.login(ip='10.0.0.3').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.login(username='EDITOR', ip='10.0.0.4').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.login(username='someone-else', ip='10.0.0.3').status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_bench_login_reports_rate(self):
+        stdout = io.StringIO()
+        call_command('bench_login', cost=[1000], duration=0.05, stdout=stdout)
+        self.assertRegex(stdout.getvalue().splitlines()[1], r'^pbkdf2\s+1000\s+[\d.]+\s+[\d.]+$')
+
+
+class ProductSparseFieldsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.business = Business.objects.create(name='Test Business')
+        self.admin = User.objects.create_user(username='admin', password='test123', role='admin', business=self.business)
+        for i in range(3):
+            Product.objects.create(name=f'Item {i}', description='A long description', price=Decimal('9.5') + i,
+                                   business=self.business, created_by=self.admin, status='approved')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+    
+    def get_results(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()['results']
+    
+    def test_fast_path_matches_serializer_output(self):
+        for query in ('', '?view=compact', '?fields=id,price,created_at&omit=created_at', '?omit=description,updated_at'):
+            with self.settings(PRODUCT_LIST_FAST_PATH=False):
+                expected = self.get_results(f'/api/products/{query}')
+            with self.settings(PRODUCT_LIST_FAST_PATH=True):
+                self.assertEqual(self.get_results(f'/api/products/{query}'), expected)
+        self.assertEqual(list(expected[0]), ['id', 'name', 'price', 'status', 'business', 'created_by',
+                                             'created_by_name', 'business_name', 'created_at'])
+    
+    def test_fields_stay_within_the_compact_view(self):
+        for fast_path in (False, True):
+            with self.settings(PRODUCT_LIST_FAST_PATH=fast_path):
+                results = self.get_results('/api/products/?view=compact&fields=name,description')
+            self.assertEqual([list(product) for product in results], [['name']] * 3)
+    
+    def test_compact_and_sparse_fields(self):
+        compact = self.get_results('/api/products/?view=compact')
+        self.assertEqual(list(compact[0]), ['id', 'name', 'price', 'status', 'business', 'business_name', 'created_at'])
+        self.assertEqual(self.get_results('/api/products/public/?fields=name,price'),
+                         [{'name': 'Item 2', 'price': '11.50'}, {'name': 'Item 1', 'price': '10.50'}, {'name': 'Item 0', 'price': '9.50'}])
+        product = Product.objects.get(name='Item 0')
+        response = self.client.get(f'/api/products/{product.id}/?omit=description,created_by_name')
+        self.assertNotIn('description', response.data)
+        self.assertEqual(response.data['name'], 'Item 0')
+    
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get('/api/products/?fields=name,secret')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['fields'], 'Unknown fields: secret')
+    
+    def test_fast_path_fetches_only_requested_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_results('/api/products/?fields=id,name')
+        sql = queries.captured_queries[-1]['sql']
+        self.assertNotIn('description', sql)
+        self.assertNotIn('core_business', sql)
+
+
+class FastJSONTests(TestCase):
+    payload = {
+        'price': Decimal('12.50'),
+        'created_at': datetime.datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+        'day': datetime.date(2024, 1, 2),
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'text': 'caf\u00e9 \u2028 line',
+        'nested': [{'a': 1, 'b': None, 'c': 1.5, 'd': True}],
+        1: 'integer key',
+    }
+    
+    def test_output_matches_drf_renderer(self):
+        self.assertEqual(ORJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+    
+    def test_falls_back_without_orjson_and_when_indenting(self):
+        indented = ORJSONRenderer().render(self.payload, 'application/json; indent=4')
+        self.assertEqual(indented, JSONRenderer().render(self.payload, 'application/json; indent=4'))
+        with mock.patch('core.renderers.orjson', None):
+            self.assertEqual(ORJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+            self.assertEqual(ORJSONParser().parse(io.BytesIO(b'{"a": [1, 2]}')), {'a': [1, 2]})
+    
+    def test_api_uses_fast_renderer_and_parser(self):
+        if not settings.API_FAST_JSON:
+            self.skipTest('API_FAST_JSON is off')
+        business = Business.objects.create(name='Test Business')
+        editor = User.objects.create_user(username='editor', password='test123', role='editor', business=business)
+        client = APIClient()
+        client.force_authenticate(user=editor)
+        with mock.patch('core.renderers.orjson.dumps', wraps=orjson.dumps) as dumps, \
+                mock.patch('core.renderers.orjson.loads', wraps=orjson.loads) as loads:
+            response = client.post('/api/products/', {'name': 'Lamp', 'description': 'Light', 'price': '19.99', 'business': business.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+        self.assertEqual(response.json()['price'], '19.99')
+        self.assertTrue(dumps.called and loads.called)
+        
+        response = client.post('/api/products/', b'{"name": ', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('JSON parse error', response.json()['detail'])
+
+
+@override_settings(CHAT_DELETE_BATCH_SIZE=2)
+class ChatHistoryTests(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Test Business')
+        self.alice = User.objects.create_user(username='alice', password='test123', role='viewer', business=self.business)
+        self.bob = User.objects.create_user(username='bob', password='test123', role='viewer', business=self.business)
+        for i in range(5):
+            ChatMessage.objects.create(user=self.alice, user_message=f'alice {i}', ai_response='ok')
+        for i in range(2):
+            ChatMessage.objects.create(user=self.bob, user_message=f'bob {i}', ai_response='ok')
+        ChatMessage.objects.create(session='visitor-1', user_message='visitor', ai_response='ok')
+        ChatMessage.objects.create(user_message='nobody', ai_response='ok')
+        self.client = APIClient()
+    
+    def history(self, url='/api/chat-history/'):
+        messages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            messages.extend(message['user_message'] for message in response.data['results'])
+            url = response.data['next']
+        return messages
+    
+    def test_history_is_scoped_and_paginated(self):
+        self.client.force_authenticate(user=self.alice)
+        response = self.client.get('/api/chat-history/?page_size=2')
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(self.history('/api/chat-history/?page_size=2'), [f'alice {i}' for i in range(4, -1, -1)])
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.history('/api/chat-history/?session=visitor-1'), ['visitor'])
+        self.assertEqual(self.history(), [])
+    
+    def test_history_uses_user_index(self):
+        plan = ChatMessage.objects.filter(user=self.alice).order_by('-timestamp', '-id')[:20].explain()
+        if connection.vendor == 'sqlite':
+            self.assertIn('chat_user_timestamp_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+    
+    def test_clear_only_deletes_own_messages_in_batches(self):
+        self.client.force_authenticate(user=self.alice)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete('/api/clear-chat-history/')
+        self.assertEqual(response.data['deleted'], 5)
+        deletes = [q for q in queries.captured_queries if q['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 3)
+        self.assertEqual(ChatMessage.objects.count(), 4)
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.delete('/api/clear-chat-history/').data['deleted'], 0)
+        self.assertEqual(self.client.delete('/api/clear-chat-history/?session=visitor-1').data['deleted'], 1)
+    
+    @mock.patch.dict('os.environ', {'OPENAI_API_KEY': 'demo_mode'})
+    def test_anonymous_chat_is_saved_to_session(self):
+        self.client.post('/api/chatbot/', {'message': 'hello there', 'session': 'visitor-2'})
+        self.assertEqual(self.history('/api/chat-history/?session=visitor-2'), ['hello there'])
+        response = self.client.post('/api/chatbot/', {'message': 'hi', 'session': 'x' * 65})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_compact_chat_history(self):
+        ChatMessage.objects.filter(user_message__in=['alice 0', 'alice 1', 'nobody']).update(
+            timestamp=timezone.now() - datetime.timedelta(days=100))
+        stdout = io.StringIO()
+        call_command('compact_chat_history', days=90, dry_run=True, stdout=stdout)
+        self.assertIn('Would delete 3 messages older than 90 days', stdout.getvalue())
+        self.assertEqual(ChatMessage.objects.count(), 9)
+        
+        with tempfile.TemporaryDirectory() as directory:
+            archive = os.path.join(directory, 'chat.ndjson')
+            call_command('compact_chat_history', days=90, max_per_user=2, archive=archive, stdout=stdout)
+            with open(archive) as stream:
+                archived = [json.loads(line)['user_message'] for line in stream]
+        self.assertIn('Deleted 3 messages older than 90 days', stdout.getvalue())
+        self.assertIn('Deleted 1 messages beyond 2 per user', stdout.getvalue())
+        self.assertEqual(sorted(archived), ['alice 0', 'alice 1', 'alice 2', 'nobody'])
+        self.assertEqual(sorted(ChatMessage.objects.values_list('user_message', flat=True)),
+                         ['alice 3', 'alice 4', 'bob 0', 'bob 1', 'visitor'])
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Test Business')
+        self.other = Business.objects.create(name='Other Business')
+        self.admin = User.objects.create_user(username='admin', password='test123', role='admin', business=self.business)
+        self.editor = User.objects.create_user(username='editor', password='test123', role='editor', business=self.other)
+        def create(name, description, price, business=self.business, status='approved'):
+            return Product.objects.create(name=name, description=description, price=Decimal(price),
+                                          business=business, created_by=self.admin, status=status)
+        self.laptop = create('Gaming Laptop', 'Fast laptop for games', '1200')
+        self.bag = create('Laptop Bag', 'Padded bag that fits a laptop', '40')
+        self.mouse = create('Wireless Mouse', 'Works with any laptop', '25', business=self.other)
+        self.draft = create('Laptop Stand', 'Aluminium stand', '30', business=self.other, status='pending')
+        self.client = APIClient()
+    
+    def search(self, query, expected_status=status.HTTP_200_OK):
+        response = self.client.get(f'/api/products/search/?{query}')
+        self.assertEqual(response.status_code, expected_status)
+        return response.json()
+    
+    def names(self, query):
+        return [product['name'] for product in self.search(query)['results']]
+    
+    def test_ranks_name_matches_first_and_hides_unapproved_from_anonymous(self):
+        names = self.names('q=laptop')
+        self.assertEqual(set(names), {'Gaming Laptop', 'Laptop Bag', 'Wireless Mouse'})
+        self.assertEqual(names[-1], 'Wireless Mouse')
+        self.assertEqual(self.names('q=laptops+for+gaming'), ['Gaming Laptop'])
+        self.assertEqual(self.names('q=keyboard'), [])
+    
+    def test_own_tokenizer(self):
+        cafe = Product.objects.create(name='Café Crème', description='Trade show coffee', price=Decimal('3'),
+                                      business=self.business, created_by=self.admin, status='approved')
+        self.assertEqual(self.names('q=café'), ['Café Crème'])
+        self.assertEqual(self.names('q=show'), ['Café Crème'])
+        self.assertEqual(self.names('q=the'), [])
+        self.assertEqual(self.names('q=!!!'), [])
+        self.assertEqual(list(search_products(Product.objects.all(), 'cafe')), [cafe])
+    
+    def test_filters(self):
+        self.assertEqual(self.names('q=laptop&max_price=50&min_price=30'), ['Laptop Bag'])
+        self.assertEqual(self.names(f'q=laptop&business={self.other.id}'), ['Wireless Mouse'])
+        errors = self.search('q=laptop&min_price=cheap&business=x', status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(errors), {'min_price', 'business'})
+        self.search('q=', status.HTTP_400_BAD_REQUEST)
+    
+    def test_authenticated_users_search_their_scope(self):
+        self.client.force_authenticate(user=self.editor)
+        self.assertEqual(set(self.names('q=laptop')), {'Wireless Mouse', 'Laptop Stand'})
+    
+    def test_list_filters_by_status_and_words(self):
+        self.client.force_authenticate(user=self.admin)
+        def listed(query, expected_status=status.HTTP_200_OK):
+            response = self.client.get(f'/api/products/?{query}')
+            self.assertEqual(response.status_code, expected_status)
+            return response.json()
+        self.assertEqual([product['name'] for product in listed('q=laptop&status=approved')['results']],
+                         ['Wireless Mouse', 'Laptop Bag', 'Gaming Laptop'])
+        first = listed('q=laptop&status=approved&page_size=2')
+        self.assertEqual(len(first['results']), 2)
+        rest = self.client.get(first['next']).json()
+        self.assertEqual([product['name'] for product in rest['results']], ['Gaming Laptop'])
+        self.assertEqual([product['name'] for product in listed('q=bag')['results']], ['Laptop Bag'])
+        self.assertIn('status', listed('status=sold', status.HTTP_400_BAD_REQUEST))
+    
+    def test_index_follows_writes_and_pages(self):
+        self.laptop.name = 'Gaming Console'
+        self.laptop.save()
+        self.bag.delete()
+        self.assertEqual(self.names('q=console'), ['Gaming Console'])
+        self.assertEqual(self.names('q=bag'), [])
+        Product.objects.bulk_create([
+            Product(name=f'Desk {i}', description='Oak desk', price=Decimal('100'), business=self.business,
+                    created_by=self.admin, status='approved') for i in range(5)
+        ])
+        first = self.search('q=desk&page_size=2')
+        self.assertEqual(len(first['results']), 2)
+        self.assertIsNone(first['previous'])
+        last = self.client.get(first['next'].replace('page=2', 'page=3')).json()
+        self.assertEqual(len(last['results']), 1)
+        self.assertIsNone(last['next'])
+        self.search('q=desk&page=0', status.HTTP_404_NOT_FOUND)
+
+class ProductFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.business = Business.objects.create(name='Acme')
+        self.other = Business.objects.create(name='Zenith')
+        self.approver = User.objects.create_user(username='approver', password='test123', role='approver', business=self.business)
+        self.client = APIClient()
+    
+    def create(self, price, business=None, status='approved'):
+        return Product.objects.create(name='Item', description='Test', price=Decimal(price), status=status,
+                                      business=business or self.business, created_by=self.approver)
+    
+    def summary(self):
+        return sorted(ProductFacet.objects.filter(count__gt=0).values_list('business_id', 'price_bucket', 'count'))
+    
+    def assertMatchesRebuild(self):
+        maintained = self.summary()
+        rebuild_facets()
+        self.assertEqual(maintained, self.summary())
+    
+    def test_single_saves_and_deletes_adjust_counts(self):
+        product = self.create('5')
+        draft = self.create('30', status='draft')
+        self.create('1500', business=self.other)
+        self.assertEqual(self.summary(), [(self.business.id, 0, 1), (self.other.id, 7, 1)])
+        product.price = Decimal('60')
+        product.save()
+        draft.status = Product.APPROVED
+        draft.save()
+        Product.objects.get(pk=draft.pk).delete()
+        self.assertEqual(self.summary(), [(self.business.id, 3, 1), (self.other.id, 7, 1)])
+        self.assertMatchesRebuild()
+    
+    def test_stale_instances_use_the_stored_row(self):
+        # Two requests holding the same draft both approve it
+        draft = self.create('5', status='draft')
+        first, second = Product.objects.get(pk=draft.pk), Product.objects.get(pk=draft.pk)
+        for product in (first, second):
+            product.status = Product.APPROVED
+            product.save()
+        self.assertEqual(self.summary(), [(self.business.id, 0, 1)])
+        # A delete through an instance loaded before the product was unapproved
+        stale = Product.objects.get(pk=draft.pk)
+        first.status = Product.DRAFT
+        first.save()
+        stale.delete()
+        self.assertEqual(self.summary(), [])
+        self.assertMatchesRebuild()
+    
+    def test_bulk_endpoints_adjust_counts(self):
+        self.client.force_authenticate(user=self.approver)
+        items = [{'name': f'Item {i}', 'description': 'Test', 'price': price, 'status': 'approved'}
+                 for i, price in enumerate(['5', '12', '12', '2000'])]
+        ids = [r['id'] for r in self.client.post('/api/products/bulk/', items, format='json').data['results']]
+        draft = self.create('40', status='draft')
+        self.client.patch('/api/products/bulk/', [{'id': ids[0], 'price': '30'}, {'id': ids[3], 'status': 'draft'}], format='json')
+        self.client.post('/api/products/bulk-approve/', {'ids': [draft.id, ids[1]]}, format='json')
+        self.assertEqual(self.summary(), [(self.business.id, 1, 2), (self.business.id, 2, 2)])
+        self.assertMatchesRebuild()
+    
+    def test_facets_endpoint(self):
+        self.create('5')
+        self.create('20')
+        for price in ('20', '20', '2'):
+            self.create(price, business=self.other)
+        self.create('99', status='draft')
+        data = self.client.get('/api/products/facets/').json()
+        self.assertEqual(data['total'], 5)
+        self.assertEqual(data['businesses'], [{'id': self.other.id, 'name': 'Zenith', 'count': 3},
+                                              {'id': self.business.id, 'name': 'Acme', 'count': 2}])
+        self.assertEqual(data['price_ranges'][:2], [{'min': None, 'max': '10.00', 'count': 2},
+                                                    {'min': '10.00', 'max': '25.00', 'count': 3}])
+        self.assertEqual(data['price_ranges'][-1], {'min': '1000.00', 'max': None, 'count': 0})
+        
+        # Cached per catalog version, so a new approval shows up at once
+        with self.assertNumQueries(0):
+            self.client.get('/api/products/facets/')
+        self.create('5000')
+        data = self.client.get(f'/api/products/facets/?business={self.business.id}').json()
+        self.assertEqual(data['total'], 3)
+        self.assertEqual(data['price_ranges'][-1]['count'], 1)
+        self.assertEqual(self.client.get('/api/products/facets/?business=x').status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_rebuild_command(self):
+        self.create('5')
+        ProductFacet.objects.all().delete()
+        call_command('rebuild_product_facets', stdout=io.StringIO())
+        self.assertEqual(self.summary(), [(self.business.id, 0, 1)])
+
+@override_settings(PRODUCT_CHANGES_DELAY=0)
+class ProductChangeFeedTests(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Acme')
+        self.other = Business.objects.create(name='Zenith')
+        self.approver = User.objects.create_user(username='approver', password='test123', role='approver', business=self.business)
+        self.editor = User.objects.create_user(username='editor', password='test123', role='editor', business=self.other)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.approver)
+    
+    def create(self, name, business=None, status='draft'):
+        return Product.objects.create(name=name, description='Test', price=Decimal('10'), status=status,
+                                      business=business or self.business, created_by=self.approver)
+    
+    def feed(self, query, expected_status=status.HTTP_200_OK):
+        response = self.client.get(f'/api/products/changes/?{query}')
+        self.assertEqual(response.status_code, expected_status)
+        return response.json()
+    
+    def test_records_changes_in_order_with_current_data(self):
+        start = self.feed('')['next']
+        product = self.create('Lamp')
+        product.name = 'Desk Lamp'
+        product.save()
+        self.client.post(f'/api/products/{product.id}/approve/')
+        gone = self.create('Chair')
+        gone_id = gone.id
+        gone.delete()
+        data = self.feed(f'since={start}')
+        self.assertEqual([(c['product'], c['action'], c['status']) for c in data['changes']], [
+            (product.id, 'created', 'draft'), (product.id, 'updated', 'draft'), (product.id, 'approved', 'approved'),
+            (gone_id, 'created', 'draft'), (gone_id, 'deleted', 'draft'),
+        ])
+        self.assertEqual(data['changes'][0]['data']['name'], 'Desk Lamp')
+        self.assertIsNone(data['changes'][-1]['data'])
+        self.assertFalse(data['has_more'])
+        self.assertEqual(self.feed(f"since={data['next']}")['changes'], [])
+    
+    def test_bulk_changes_and_paging(self):
+        self.client.force_authenticate(user=self.approver)
+        start = self.feed('')['next']
+        items = [{'name': f'Item {i}', 'description': 'Test', 'price': '5'} for i in range(3)]
+        ids = [r['id'] for r in self.client.post('/api/products/bulk/', items, format='json').data['results']]
+        self.client.patch('/api/products/bulk/', [{'id': ids[0], 'price': '6'}], format='json')
+        self.client.post('/api/products/bulk-approve/', {'ids': ids[1:]}, format='json')
+        first = self.feed(f'since={start}&limit=4')
+        self.assertTrue(first['has_more'])
+        rest = self.feed(f"since={first['next']}&limit=4")
+        self.assertFalse(rest['has_more'])
+        self.assertEqual([c['action'] for c in first['changes'] + rest['changes']],
+                         ['created'] * 3 + ['updated', 'approved', 'approved'])
+    
+    def test_scoped_to_visible_businesses(self):
+        self.create('Mine')
+        self.create('Theirs', business=self.other)
+        self.client.force_authenticate(user=self.editor)
+        self.assertEqual([c['business'] for c in self.feed('since=0')['changes']], [self.other.id])
+        self.client.force_authenticate(user=None)
+        self.feed('since=0', status.HTTP_401_UNAUTHORIZED)
+    
+    def test_invalid_and_pruned_tokens(self):
+        self.feed('since=abc&limit=0', status.HTTP_400_BAD_REQUEST)
+        for name in ('A', 'B', 'C'):
+            self.create(name)
+        ProductChange.objects.filter(id__lt=ProductChange.objects.latest('id').id).update(
+            timestamp=timezone.now() - datetime.timedelta(days=40)
+        )
+        call_command('prune_product_changes', stdout=io.StringIO())
+        self.assertEqual(ProductChange.objects.count(), 1)
+        self.feed('since=0', status.HTTP_410_GONE)
+        self.assertEqual(len(self.feed(f'since={ProductChange.objects.get().id - 1}')['changes']), 1)
+        
+        # Even when every entry is past retention the newest is kept, so old tokens stay rejected
+        ProductChange.objects.update(timestamp=timezone.now() - datetime.timedelta(days=40))
+        call_command('prune_product_changes', stdout=io.StringIO())
+        self.assertEqual(ProductChange.objects.count(), 1)
+        self.feed('since=1', status.HTTP_410_GONE)
+
+def parse_sse(body):
+    """[(event, id, data)] for the data-carrying blocks of an SSE body"""
+    events = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n') if line and not line.startswith(':'))
+        if 'data' in fields:
+            events.append((fields['event'], int(fields['id']), json.loads(fields['data'])))
+    return events
+
+@override_settings(PRODUCT_EVENTS_MAX_AGE=0, PRODUCT_EVENTS_HEARTBEAT=0.05)
+class ProductEventStreamTests(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Acme')
+        self.other = Business.objects.create(name='Zenith')
+        self.approver = User.objects.create_user(username='approver', password='test123', role='approver', business=self.business)
+        self.editor = User.objects.create_user(username='editor', password='test123', role='editor', business=self.other)
+        self.start = ProductChange.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        self.mine = Product.objects.create(name='Lamp', description='Test', price=Decimal('10'),
+                                           business=self.other, created_by=self.editor)
+        self.theirs = Product.objects.create(name='Chair', description='Test', price=Decimal('20'),
+                                             business=self.business, created_by=self.approver)
+    
+    def connect(self, user=None, **headers):
+        ticket = f'?ticket={stream_ticket_for_user(user)}' if user else ''
+        return AsyncClient().get(f'/api/products/events/{ticket}', headers=headers)
+    
+    async def test_requires_authentication(self):
+        response = await self.connect()
+        self.assertEqual(response.status_code, 401)
+        response = await AsyncClient().get('/api/products/events/?ticket=garbage')
+        self.assertEqual(response.status_code, 401)
+    
+    def test_tickets_are_single_purpose(self):
+        client = APIClient()
+        client.force_authenticate(user=self.editor)
+        response = client.post('/api/products/events/ticket/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['expires_in'], settings.PRODUCT_EVENTS_TICKET_LIFETIME)
+        ticket = response.data['ticket']
+        # A ticket is not an access token, and access tokens are not read from the URL
+        response = APIClient().get('/api/me/', HTTP_AUTHORIZATION=f'Bearer {ticket}')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = async_to_sync(AsyncClient().get)(f'/api/products/events/?token={AccessToken.for_user(self.editor)}')
+        self.assertEqual(response.status_code, 401)
+    
+    async def test_expired_tickets_are_rejected(self):
+        with self.settings(PRODUCT_EVENTS_TICKET_LIFETIME=-1):
+            response = await self.connect(self.editor)
+        self.assertEqual(response.status_code, 401)
+    
+    async def test_replays_visible_changes_after_last_event_id(self):
+        response = await self.connect(self.editor, **{'Last-Event-ID': str(self.start)})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        events = parse_sse(body)
+        self.assertEqual([(event, data['product'], data['action']) for event, pk, data in events],
+                         [('product', self.mine.id, 'created')])
+        self.assertEqual(events[0][2]['data']['name'], 'Lamp')
+        
+        # Entries after the client's id were pruned
+        await sync_to_async(ProductChange.objects.filter(product_id=self.mine.id).delete)()
+        response = await self.connect(self.approver, **{'Last-Event-ID': str(self.start)})
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(parse_sse(body), [('resync', events[0][1] + 1, {'reason': 'too_far_behind'})])
+    
+    async def test_pushes_live_changes_in_scope(self):
+        def approve_both():
+            with self.captureOnCommitCallbacks(execute=True):
+                for product in (self.theirs, self.mine):
+                    product.status = Product.APPROVED
+                    product.save()
+        
+        with self.settings(PRODUCT_EVENTS_MAX_AGE=1):
+            response = await self.connect(self.editor)
+            chunks = response.streaming_content
+            first = (await chunks.__anext__()).decode()
+            latest = await sync_to_async(ProductChange.objects.latest)('id')
+            self.assertIn(f'id: {latest.id}\n', first)
+            await sync_to_async(approve_both)()
+            # The stream ends by itself after PRODUCT_EVENTS_MAX_AGE
+            body = b''.join([chunk async for chunk in chunks]).decode()
+        self.assertIn(': keep-alive', body)
+        events = parse_sse(body)
+        self.assertEqual([(data['product'], data['action']) for event, pk, data in events], [(self.mine.id, 'approved')])
+        self.assertEqual(events[0][2]['data']['status'], 'approved')
+        self.assertFalse(broker._subscribers)
+
+class ProductEventBrokerTests(TestCase):
+    def test_scoping_and_overflow(self):
+        async def run():
+            everyone = broker.subscribe()
+            scoped = Subscription(2, asyncio.get_running_loop(), 1)
+            broker._subscribers.add(scoped)
+            try:
+                await sync_to_async(broker.dispatch, thread_sensitive=False)(
+                    [{'id': 1, 'business': 1}, {'id': 2, 'business': 2}, {'id': 3, 'business': 2}]
+                )
+                await asyncio.sleep(0)
+                self.assertEqual([(await everyone.get(1))['id'] for _ in range(3)], [1, 2, 3])
+                self.assertEqual((await scoped.get(1))['id'], 2)
+                self.assertTrue(scoped.overflowed)
+            finally:
+                broker.unsubscribe(everyone)
+                broker.unsubscribe(scoped)
+        asyncio.run(run())
@@ -0,0 +1,94 @@
+"""
+Token inverted index with BM25 ranking.
+
+Used by the chatbot to find the product a message is talking about without
+scanning the whole catalog. Documents are products; the name and description
+are indexed as one bag of words with name tokens weighted higher, so
+"tell me about the laptop" ranks "Gaming Laptop" above a product that only
+mentions laptops in its description.
+"""
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Words that carry intent rather than product identity
+STOPWORDS = frozenset([
+    'a', 'about', 'an', 'and', 'any', 'are', 'can', 'describe', 'details', 'do', 'for', 'from',
+    'have', 'i', 'in', 'info', 'is', 'it', 'me', 'more', 'my', 'of', 'on', 'or', 'please',
+    'show', 'tell', 'that', 'the', 'this', 'to', 'what', 'which', 'with', 'you', 'your',
+])
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+class InvertedIndex:
+    """BM25 index over (name, description) documents keyed by id"""
+    
+    def __init__(self, k1=1.2, b=0.75, name_weight=3):
+        self.k1 = k1
+        self.b = b
+        self.name_weight = name_weight
+        self.version = None
+        self._postings = {}
+        self._doc_lengths = {}
+        self._doc_terms = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._doc_lengths)
+    
+    def __contains__(self, doc_id):
+        return doc_id in self._doc_lengths
+    
+    def add(self, doc_id, name, description=''):
+        """Index a document, replacing any previous version of it"""
+        terms = Counter(tokenize(description))
+        for token in tokenize(name):
+            terms[token] += self.name_weight
+        length = sum(terms.values())
+        with self._lock:
+            self._remove(doc_id)
+            for token, frequency in terms.items():
+                self._postings.setdefault(token, {})[doc_id] = frequency
+            self._doc_terms[doc_id] = tuple(terms)
+            self._doc_lengths[doc_id] = length
+            self._total_length += length
+    
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+    
+    def _remove(self, doc_id):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for token in terms:
+            postings = self._postings[token]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[token]
+        self._total_length -= self._doc_lengths.pop(doc_id)
+    
+    def search(self, text, limit=5):
+        """Return up to `limit` (doc_id, score) pairs, best match first"""
+        query = set(tokenize(text))
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if not query or not doc_count:
+                return []
+            average_length = self._total_length / doc_count
+            scores = {}
+            for token in query:
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
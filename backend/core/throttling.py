@@ -0,0 +1,55 @@
+from django.conf import settings
+from rest_framework.throttling import SimpleRateThrottle
+
+class LoginIPThrottle(SimpleRateThrottle):
+    """Limit login attempts per client IP (LOGIN_THROTTLE_IP_RATE)"""
+    
+    scope = 'login_ip'
+    
+    def get_rate(self):
+        return settings.LOGIN_THROTTLE_IP_RATE or None
+    
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+class LoginFailureThrottle(SimpleRateThrottle):
+    """
+    Limit failed logins per username (LOGIN_THROTTLE_USERNAME_RATE).
+    
+    Only failures are counted, via `record_failure`, so a user who knows their
+    password is never locked out by successful logins.
+    """
+    
+    scope = 'login_username'
+    
+    def get_rate(self):
+        return settings.LOGIN_THROTTLE_USERNAME_RATE or None
+    
+    def get_cache_key(self, request, view):
+        username = str(request.data.get('username', '')).strip().lower()
+        if not username:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': username}
+    
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.now = self.timer()
+        self.history = [stamp for stamp in self.cache.get(self.key, []) if stamp > self.now - self.duration]
+        if len(self.history) >= self.num_requests:
+            return self.throttle_failure()
+        return True
+    
+    def record_failure(self, request):
+        if self.rate is None:
+            return
+        key = self.get_cache_key(request, None)
+        if key is None:
+            return
+        now = self.timer()
+        history = [stamp for stamp in self.cache.get(key, []) if stamp > now - self.duration]
+        history.insert(0, now)
+        self.cache.set(key, history, self.duration)
@@ -2,8 +2,10 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     BusinessViewSet, UserViewSet, ProductViewSet,
-    login_view, me_view, chatbot_view, chat_history_view, clear_chat_history_view
+    login_view, me_view, chatbot_view, chat_history_view, clear_chat_history_view,
+    metrics_view, request_metrics_view, product_events_ticket_view
 )
+from .async_views import chatbot_stream_view, product_events_view
 
 router = DefaultRouter()
 router.register(r'businesses', BusinessViewSet)
@@ -11,10 +13,16 @@ router.register(r'users', UserViewSet)
 router.register(r'products', ProductViewSet, basename='product')
 
 urlpatterns = [
+    # Before the router, whose product detail route would otherwise match 'events'
+    path('products/events/', product_events_view, name='product-events'),
+    path('products/events/ticket/', product_events_ticket_view, name='product-events-ticket'),
     path('', include(router.urls)),
     path('login/', login_view, name='login'),
     path('me/', me_view, name='me'),
     path('chatbot/', chatbot_view, name='chatbot'),
+    path('chatbot/stream/', chatbot_stream_view, name='chatbot-stream'),
     path('chat-history/', chat_history_view, name='chat-history'),
     path('clear-chat-history/', clear_chat_history_view, name='clear-chat-history'),
+    path('metrics/', metrics_view, name='metrics'),
+    path('metrics/requests/', request_metrics_view, name='request-metrics'),
 ]
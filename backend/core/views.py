@@ -1,15 +1,48 @@
 from rest_framework import viewsets, status
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, authentication_classes, permission_classes, throttle_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils import timezone
+from django.utils.http import http_date, quote_etag
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from .models import Business, User, Product, ChatMessage
-from .serializers import BusinessSerializer, UserSerializer, ProductSerializer, ChatMessageSerializer
-from .permissions import CanCreateProduct, CanApproveProduct, CanManageUsers
-import os
+from .models import Business, User, Product, ProductChange, ChatMessage
+from .serializers import (
+    BusinessSerializer, UserSerializer, ProductSerializer, ProductBulkSerializer, ProductListSerializer,
+    ProductRowSerializer, ChatMessageSerializer
+)
+from .authentication import CachedJWTAuthentication, MetricsTokenAuthentication, stream_ticket_for_user, tokens_for_user
+from .permissions import CanCreateProduct, CanApproveProduct, CanManageUsers, CanReadMetrics
+from .pagination import ChatHistoryCursorPagination, ProductCursorPagination, ProductSearchPagination
+from .throttling import LoginFailureThrottle, LoginIPThrottle
+from .catalog import get_catalog, get_catalog_version
+from .chat_buffer import chat_buffer, delete_chat_messages, save_chat_message
+from .changes import is_expired, latest_token, read_changes, serialize_changes
+from .chatbot import answer
+from .facets import facet_fields, get_facets
+from .llm import get_api_key
+from .metrics import CACHE_REQUESTS, CHATBOT_ANSWERS, registry
+from .request_metrics import request_stats
+from .response_cache import response_cache
+from .search import search_products
+from .signals import products_bulk_changed
+from django.conf import settings
+from decimal import Decimal, InvalidOperation
+import hashlib
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+def is_product_id(value):
+    """Whether a bulk payload value is a usable product id (JSON true/false are not)"""
+    return isinstance(value, int) and not isinstance(value, bool)
 
 @swagger_auto_schema(
     method='post',
@@ -34,23 +67,26 @@ import os
                 }
             )
         ),
-        401: 'Invalid credentials'
+        401: 'Invalid credentials',
+        429: 'Too many login attempts'
     }
 )
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([LoginIPThrottle, LoginFailureThrottle])
 def login_view(request):
     username = request.data.get('username')
     password = request.data.get('password')
     user = authenticate(username=username, password=password)
     
     if user:
-        refresh = RefreshToken.for_user(user)
+        refresh = tokens_for_user(user)
         return Response({
             'access': str(refresh.access_token),
             'refresh': str(refresh),
             'user': UserSerializer(user).data
         })
+    LoginFailureThrottle().record_failure(request)
     return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
 @swagger_auto_schema(
@@ -93,6 +129,32 @@ class UserViewSet(viewsets.ModelViewSet):
             raise PermissionError("Only admins can create users")
         serializer.save()
 
+PRODUCT_FIELD_PARAMETERS = [
+    openapi.Parameter('fields', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description='Comma-separated fields to include, e.g. id,name,price'),
+    openapi.Parameter('omit', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description='Comma-separated fields to leave out, e.g. description'),
+]
+PRODUCT_LIST_PARAMETERS = PRODUCT_FIELD_PARAMETERS + [
+    openapi.Parameter('view', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['compact'],
+                      description='compact: id, name, price, status, business, business_name, created_at'),
+]
+PRODUCT_FILTER_PARAMETERS = [
+    openapi.Parameter('status', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      enum=[value for value, label in Product.STATUS_CHOICES], description='Only products with this status'),
+    openapi.Parameter('q', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description='Only products with these words in the name or description'),
+]
+
+PRODUCT_SEARCH_PARAMETERS = [
+    openapi.Parameter('q', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                      description='Words to find in product names (ranked higher) and descriptions'),
+    openapi.Parameter('min_price', openapi.IN_QUERY, type=openapi.TYPE_NUMBER, description='Lowest price'),
+    openapi.Parameter('max_price', openapi.IN_QUERY, type=openapi.TYPE_NUMBER, description='Highest price'),
+    openapi.Parameter('business', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Business id'),
+    openapi.Parameter('page', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Page number, from 1'),
+] + PRODUCT_LIST_PARAMETERS
+
 class ProductViewSet(viewsets.ModelViewSet):
     """
     ViewSet for managing products.
@@ -101,28 +163,92 @@ class ProductViewSet(viewsets.ModelViewSet):
     - Admins and approvers can see all products
     - Other users can only see products from their business
     - Products can be approved by users with approval permissions
+    
+    List endpoints are cursor-paginated; pass `page_size` to change the page length.
+    Search results are ranked by relevance and paginated by page number.
+    Read endpoints accept `?fields=` and `?omit=` (comma-separated field names),
+    and list endpoints `?view=compact` for a summary without descriptions.
+    The list narrows to `?status=` and to products matching `?q=`, newest first.
     """
     serializer_class = ProductSerializer
+    pagination_class = ProductCursorPagination
     
     def get_queryset(self):
-        if self.action == 'list_public':
-            return Product.objects.filter(status=Product.APPROVED).order_by('-created_at')
+        # ProductSerializer reads business.name and created_by.username, so join them up front
+        products = Product.objects.select_related('business', 'created_by')
+        if self.action == 'list_public' or (self.action == 'search' and not self.request.user.is_authenticated):
+            return products.filter(status=Product.APPROVED).order_by('-created_at')
         if self.request.user.is_authenticated:
             # Admins and approvers can see all products, others see only their business products
             if self.request.user.role in ['admin', 'approver']:
-                return Product.objects.all().order_by('-created_at')
-            return Product.objects.filter(business=self.request.user.business).order_by('-created_at')
+                return products.order_by('-created_at')
+            return products.filter(business=self.request.user.business).order_by('-created_at')
         return Product.objects.none()
     
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update']:
+        if self.action in ['create', 'update', 'partial_update', 'bulk_create', 'bulk_update']:
             return [CanCreateProduct()]
-        elif self.action == 'approve':
+        elif self.action in ['approve', 'bulk_approve']:
             return [CanApproveProduct()]
-        elif self.action == 'list_public':
+        elif self.action in ['list_public', 'search', 'facets']:
             return [AllowAny()]
         return [IsAuthenticated()]
     
+    def get_output_fields(self):
+        """Return (serializer class, field names) selected by ?view=, ?fields= and ?omit="""
+        params = self.request.query_params
+        compact = self.action != 'retrieve' and params.get('view') == 'compact'
+        serializer_class = ProductListSerializer if compact else ProductSerializer
+        requested = {name: [field for field in params[name].split(',') if field] for name in ('fields', 'omit') if name in params}
+        unknown = sorted({field for names in requested.values() for field in names} - set(ProductSerializer.Meta.fields))
+        if unknown:
+            raise ValidationError({'fields': f"Unknown fields: {', '.join(unknown)}"})
+        fields = serializer_class.Meta.fields
+        if 'fields' in requested:
+            # ?fields= narrows the chosen view; it never adds fields the compact view leaves out
+            fields = [field for field in fields if field in requested['fields']]
+        return serializer_class, [field for field in fields if field not in requested.get('omit', ())]
+    
+    def get_serializer(self, *args, **kwargs):
+        if self.action == 'retrieve':
+            kwargs['fields'] = self.get_output_fields()[1]
+        return super().get_serializer(*args, **kwargs)
+    
+    def paginated_list(self, queryset):
+        """Serialize one page with the requested fields, returning (response, newest updated_at on the page)"""
+        serializer_class, fields = self.get_output_fields()
+        if settings.PRODUCT_LIST_FAST_PATH:
+            # Plain rows skip model instances and DRF's per-field machinery
+            serializer = ProductRowSerializer(fields)
+            page = self.paginate_queryset(queryset.values(*serializer.lookups()))
+            data = serializer.serialize(page)
+            updated = [row['updated_at'] for row in page]
+        else:
+            page = self.paginate_queryset(queryset)
+            data = serializer_class(page, many=True, fields=fields, context=self.get_serializer_context()).data
+            updated = [product.updated_at for product in page]
+        return self.get_paginated_response(data), max(updated, default=None)
+    
+    def list_filters(self, queryset):
+        """Apply ?status= and ?q= to the list, keeping its newest-first order for the cursor"""
+        params = self.request.query_params
+        if params.get('status'):
+            if params['status'] not in dict(Product.STATUS_CHOICES):
+                raise ValidationError({'status': f"Unknown status: {params['status']}"})
+            queryset = queryset.filter(status=params['status'])
+        if params.get('q', '').strip():
+            queryset = search_products(queryset, params['q'])
+        return queryset
+    
+    @swagger_auto_schema(manual_parameters=PRODUCT_FILTER_PARAMETERS + PRODUCT_LIST_PARAMETERS)
+    def list(self, request, *args, **kwargs):
+        response, _ = self.paginated_list(self.list_filters(self.filter_queryset(self.get_queryset())))
+        return response
+    
+    @swagger_auto_schema(manual_parameters=PRODUCT_FIELD_PARAMETERS)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user, business=self.request.user.business)
     
@@ -137,15 +263,343 @@ class ProductViewSet(viewsets.ModelViewSet):
         product.save()
         return Response(ProductSerializer(product).data)
     
+    def _bulk_items(self, request):
+        """Return the list payload of a bulk request, or an error Response"""
+        items = request.data
+        if not isinstance(items, list):
+            return Response({'error': 'Expected a list of products'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.PRODUCT_BULK_MAX_ITEMS:
+            return Response(
+                {'error': f'At most {settings.PRODUCT_BULK_MAX_ITEMS} products can be sent at once'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return items
+    
+    def _bulk_response(self, results, success_status=status.HTTP_200_OK):
+        succeeded = sum(1 for result in results if 'errors' not in result)
+        failed = len(results) - succeeded
+        if not failed:
+            response_status = success_status
+        elif succeeded:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({'succeeded': succeeded, 'failed': failed, 'results': results}, status=response_status)
+    
+    @swagger_auto_schema(
+        operation_description="Create many products in one transaction. Send a list of products; "
+                              "valid items are created even if others fail, with a result per item.",
+        request_body=ProductBulkSerializer(many=True),
+        responses={201: 'All products created', 207: 'Some products failed validation', 400: 'No products created'}
+    )
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create(self, request):
+        items = self._bulk_items(request)
+        if isinstance(items, Response):
+            return items
+        
+        results = []
+        products = []
+        for index, item in enumerate(items):
+            serializer = ProductBulkSerializer(data=item, context=self.get_serializer_context())
+            if serializer.is_valid():
+                products.append(Product(
+                    **serializer.validated_data,
+                    created_by=request.user,
+                    business=request.user.business
+                ))
+                results.append({'index': index})
+            else:
+                results.append({'index': index, 'errors': serializer.errors})
+        
+        # Products, facet counts and change log entries commit together
+        with transaction.atomic():
+            created = Product.objects.bulk_create(products, batch_size=1000)
+            if created:
+                products_bulk_changed.send(sender=Product, product_ids=[p.id for p in created],
+                                           previous={}, current={p.id: facet_fields(p) for p in created})
+        for result, product in zip((r for r in results if 'errors' not in r), created):
+            result['id'] = product.id
+        return self._bulk_response(results, success_status=status.HTTP_201_CREATED)
+    
     @swagger_auto_schema(
-        operation_description="Get list of approved products (public endpoint)",
-        responses={200: ProductSerializer(many=True)}
+        operation_description="Partially update many products. Send a list of objects with an `id` and the fields to change; "
+                              "products you cannot see are reported as not found.",
+        request_body=ProductBulkSerializer(many=True),
+        responses={200: 'All products updated', 207: 'Some products failed', 400: 'No products updated'}
+    )
+    @bulk_create.mapping.patch
+    def bulk_update(self, request):
+        items = self._bulk_items(request)
+        if isinstance(items, Response):
+            return items
+        
+        # Only real integer ids are looked up; anything else (lists, bools, strings) is not found
+        ids = [
+            item.get('id') if isinstance(item, dict) and is_product_id(item.get('id')) else None
+            for item in items
+        ]
+        # Rows stay locked until the update commits, so the facet deltas sent
+        # below are taken from what was stored, not from a concurrent writer's state
+        with transaction.atomic():
+            instances = self.get_queryset().select_for_update(of=('self',)).in_bulk([pk for pk in ids if pk is not None])
+            results = []
+            updated = {}
+            previous = {}
+            fields = {'updated_at'}
+            now = timezone.now()
+            for index, (item, pk) in enumerate(zip(items, ids)):
+                instance = instances.get(pk)
+                if instance is None:
+                    results.append({'index': index, 'errors': {'id': ['Product not found.']}})
+                    continue
+                serializer = ProductBulkSerializer(instance, data=item, partial=True, context=self.get_serializer_context())
+                if not serializer.is_valid():
+                    results.append({'index': index, 'id': instance.id, 'errors': serializer.errors})
+                    continue
+                previous.setdefault(instance.id, facet_fields(instance))
+                for field, value in serializer.validated_data.items():
+                    setattr(instance, field, value)
+                    fields.add(field)
+                instance.updated_at = now
+                updated[instance.id] = instance
+                results.append({'index': index, 'id': instance.id})
+        
+            if updated:
+                Product.objects.bulk_update(updated.values(), sorted(fields), batch_size=1000)
+                products_bulk_changed.send(sender=Product, product_ids=list(updated), previous=previous,
+                                           current={pk: facet_fields(product) for pk, product in updated.items()})
+        return self._bulk_response(results)
+    
+    @swagger_auto_schema(
+        operation_description="Approve many products with a single update",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['ids'],
+            properties={
+                'ids': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+            },
+        ),
+        responses={200: 'All products approved', 207: 'Some products not found', 400: 'No products approved'}
+    )
+    @action(detail=False, methods=['post'], url_path='bulk-approve')
+    def bulk_approve(self, request):
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not all(is_product_id(pk) for pk in ids):
+            return Response({'error': 'Expected "ids": a list of product ids'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > settings.PRODUCT_BULK_MAX_ITEMS:
+            return Response(
+                {'error': f'At most {settings.PRODUCT_BULK_MAX_ITEMS} products can be sent at once'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Only products visible to the user can be approved, as in ProductAdmin.approve_products.
+        # Rows are locked while read so the facet delta matches what is updated.
+        with transaction.atomic():
+            products = self.get_queryset().select_for_update().filter(id__in=ids)
+            previous = {pk: row for pk, *row in products.values_list('id', 'status', 'business_id', 'price')}
+            found = set(previous)
+            if found:
+                Product.objects.filter(id__in=found).update(status=Product.APPROVED, updated_at=timezone.now())
+                products_bulk_changed.send(sender=Product, product_ids=sorted(found), previous=previous,
+                                           current={pk: (Product.APPROVED, *row[1:]) for pk, row in previous.items()})
+        results = [
+            {'id': pk} if pk in found else {'id': pk, 'errors': {'id': ['Product not found.']}}
+            for pk in ids
+        ]
+        return self._bulk_response(results)
+    
+    @swagger_auto_schema(
+        operation_description="Get list of approved products (public endpoint). "
+                              "Supports conditional requests with If-None-Match / If-Modified-Since.",
+        manual_parameters=PRODUCT_LIST_PARAMETERS,
+        responses={200: ProductSerializer(many=True), 304: 'Not modified'}
     )
     @action(detail=False, methods=['get'], url_path='public')
     def list_public(self, request):
-        products = self.get_queryset()
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        # Every page of every listing is keyed by the catalog version, so any
+        # product save, approval or delete (or a creator being renamed)
+        # retires all ETags and cached pages.
+        cacheable = request.accepted_renderer.format == 'json'
+        version = get_catalog_version()
+        # Pagination links are absolute, so the host is part of the key
+        key = f'core:public-products:{version}:{request.accepted_media_type}:{request.build_absolute_uri()}'
+        etag = quote_etag(hashlib.sha1(key.encode()).hexdigest())
+        cached = cache.get(key) if cacheable else None
+        if cacheable:
+            CACHE_REQUESTS.inc(cache='public_products', result='hit' if cached else 'miss')
+        
+        headers = HttpResponse()
+        headers['ETag'] = etag
+        headers['Cache-Control'] = 'public, no-cache'
+        patch_vary_headers(headers, ['Accept'])
+        last_modified = cached[2] if cached else None
+        if last_modified:
+            headers['Last-Modified'] = http_date(last_modified)
+        conditional = get_conditional_response(request, etag=etag, last_modified=last_modified, response=headers)
+        if conditional is not headers:
+            return conditional
+        
+        if cached:
+            content, content_type, last_modified = cached
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            response, newest = self.paginated_list(self.get_queryset())
+            # The later of the newest product on the page and the last catalog change
+            last_modified = math.ceil(max(newest.timestamp() if newest else 0, version / 1e9))
+            if cacheable:
+                response.add_post_render_callback(lambda rendered: cache.set(
+                    key, (rendered.content, rendered['Content-Type'], last_modified), settings.PUBLIC_PRODUCTS_CACHE_TTL
+                ))
+        
+        for header in ('ETag', 'Cache-Control', 'Vary'):
+            response[header] = headers[header]
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def search_filters(self):
+        """Queryset filters from ?min_price=, ?max_price= and ?business="""
+        params = self.request.query_params
+        filters = {}
+        errors = {}
+        for name, lookup in (('min_price', 'price__gte'), ('max_price', 'price__lte')):
+            if params.get(name):
+                try:
+                    value = Decimal(params[name])
+                except InvalidOperation:
+                    value = None
+                if value is None or not value.is_finite():
+                    errors[name] = 'A valid number is required.'
+                else:
+                    filters[lookup] = value
+        if params.get('business'):
+            if params['business'].isdigit():
+                filters['business_id'] = int(params['business'])
+            else:
+                errors['business'] = 'A valid business id is required.'
+        if errors:
+            raise ValidationError(errors)
+        return filters
+    
+    @swagger_auto_schema(
+        operation_description="Full-text search over product names and descriptions, best matches first. "
+                              "Anonymous users search approved products; signed-in users search the products they can see.",
+        manual_parameters=PRODUCT_SEARCH_PARAMETERS,
+        responses={200: ProductSerializer(many=True), 400: 'Missing query or invalid filter', 404: 'Invalid page'}
+    )
+    @action(detail=False, methods=['get'], url_path='search', pagination_class=ProductSearchPagination)
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'This parameter is required.'})
+        products = self.get_queryset().filter(**self.search_filters())
+        products = search_products(products, query).order_by('-rank', '-created_at', '-id')
+        response, _ = self.paginated_list(products)
+        return response
+
+    @swagger_auto_schema(
+        operation_description="Facet counts for approved products: products per business and per price range. "
+                              "Pass `business` to get the price ranges of one business.",
+        manual_parameters=[
+            openapi.Parameter('business', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Business id'),
+        ],
+        responses={200: 'total, businesses [{id, name, count}], price_ranges [{min, max, count}]', 400: 'Invalid business id'}
+    )
+    @action(detail=False, methods=['get'], url_path='facets')
+    def facets(self, request):
+        business = request.query_params.get('business', '')
+        if business and not business.isdigit():
+            raise ValidationError({'business': 'A valid business id is required.'})
+        # Counts come from the ProductFacet summary; the response only changes with the catalog
+        key = f'core:product-facets:{get_catalog_version()}:{business}'
+        data = cache.get(key)
+        if data is None:
+            data = get_facets(int(business) if business else None)
+            cache.set(key, data, settings.PUBLIC_PRODUCTS_CACHE_TTL)
+        return Response(data)
+
+    @swagger_auto_schema(
+        operation_description="Product changes after a `since` token, oldest first, with each product's current "
+                              "compact fields (`data` is null once it is deleted). Keep `next` and pass it as `since` "
+                              "on the next call. Without `since`, returns the current token to start syncing from.",
+        manual_parameters=[
+            openapi.Parameter('since', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Token from a previous response'),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Maximum number of changes'),
+        ],
+        responses={200: 'changes, next, has_more', 400: 'Invalid token or limit', 410: 'Token too old, resync'}
+    )
+    @action(detail=False, methods=['get'], url_path='changes')
+    def changes(self, request):
+        params = request.query_params
+        since = params.get('since')
+        if since is None:
+            return Response({'changes': [], 'next': str(latest_token()), 'has_more': False})
+        limit = params.get('limit', str(settings.PRODUCT_CHANGES_PAGE_SIZE))
+        errors = {}
+        if not since.isdigit():
+            errors['since'] = 'Expected a token from a previous response.'
+        if not limit.isdigit() or int(limit) < 1:
+            errors['limit'] = 'A positive number is required.'
+        if errors:
+            raise ValidationError(errors)
+        since = int(since)
+        if is_expired(since):
+            return Response({'error': 'Changes after this token have been pruned; resync and start from a new token.'},
+                            status=status.HTTP_410_GONE)
+        
+        # Same visibility as the product list
+        feed = ProductChange.objects.all()
+        if request.user.role not in ['admin', 'approver']:
+            feed = feed.filter(business_id=request.user.business_id)
+        entries, has_more = read_changes(feed, since, min(int(limit), settings.PRODUCT_CHANGES_MAX_PAGE_SIZE))
+        return Response({
+            'changes': serialize_changes(entries, self.get_queryset()),
+            'next': str(entries[-1]['id'] if entries else since),
+            'has_more': has_more,
+        })
+
+@swagger_auto_schema(
+    method='post',
+    operation_description="Get a short-lived ticket for opening the product event stream (/api/products/events/?ticket=)",
+    responses={
+        200: openapi.Response(
+            description="Stream ticket",
+            schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'ticket': openapi.Schema(type=openapi.TYPE_STRING, description='Stream ticket'),
+                    'expires_in': openapi.Schema(type=openapi.TYPE_INTEGER, description='Seconds the ticket can be used to connect'),
+                }
+            )
+        )
+    }
+)
+@api_view(['POST'])
+def product_events_ticket_view(request):
+    ticket = stream_ticket_for_user(request.user)
+    return Response({'ticket': str(ticket), 'expires_in': settings.PRODUCT_EVENTS_TICKET_LIFETIME})
+
+def chat_session(request, value):
+    """Anonymous chat session id from the request ('' for logged-in users), validated"""
+    if request.user.is_authenticated or not value:
+        return ''
+    value = str(value)
+    if len(value) > 64:
+        raise ValidationError({'session': 'Session must be at most 64 characters'})
+    return value
+
+def chat_history_queryset(request, session):
+    """The requester's own messages: by user when logged in, else by anonymous session"""
+    if request.user.is_authenticated:
+        return ChatMessage.objects.filter(user=request.user)
+    if session:
+        return ChatMessage.objects.filter(user=None, session=session)
+    return ChatMessage.objects.none()
+
+CHAT_SESSION_PARAMETER = openapi.Parameter(
+    'session', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+    description='Anonymous chat session id (ignored for logged-in users)'
+)
 
 @swagger_auto_schema(
     method='post',
@@ -155,6 +609,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         required=['message'],
         properties={
             'message': openapi.Schema(type=openapi.TYPE_STRING, description='User message to the chatbot'),
+            'session': openapi.Schema(type=openapi.TYPE_STRING, description='Anonymous chat session id, up to 64 characters'),
         },
     ),
     responses={
@@ -169,172 +624,51 @@ def chatbot_view(request):
     
     if not user_message.strip():
         return Response({'error': 'Message cannot be empty'}, status=status.HTTP_400_BAD_REQUEST)
+    session = chat_session(request, request.data.get('session'))
     
     try:
         # Check if OpenAI API key is available
-        api_key = os.getenv('OPENAI_API_KEY')
+        api_key = get_api_key()
+        products = get_catalog()
         
-        if not api_key or api_key in ['your_openai_api_key_here', 'demo_mode']:
-            # Fallback response when no API key is configured
-            products = Product.objects.filter(status=Product.APPROVED)
-            
-            if products.exists():
-                product_list = "\n".join([f"• {p.name}: {p.description} - ${p.price} (by {p.business.name})" for p in products[:5]])
-                ai_response = f"Hello! I'm the marketplace assistant. Here are some of our featured products:\n\n{product_list}\n\nNote: AI features are currently limited. Please contact support for more assistance."
-            else:
-                ai_response = "Hello! Welcome to our marketplace. Currently, there are no products available, but feel free to check back later or contact our support team for assistance."
-        else:
-            # Try to use OpenAI API
-            try:
-                from openai import OpenAI
-                client = OpenAI(api_key=api_key)
-                
-                products = Product.objects.filter(status=Product.APPROVED)
-                product_data = [f"{p.name}: {p.description} - ${p.price} (by {p.business.name})" for p in products]
-                context = "Available products:\n" + "\n".join(product_data) if product_data else "No products are currently available."
-                
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": f"You are a helpful assistant for a product marketplace. {context}. Be friendly and helpful in answering questions about products."},
-                        {"role": "user", "content": user_message}
-                    ]
-                )
-                
-                ai_response = response.choices[0].message.content
-                
-            except Exception as openai_error:
-                # Handle OpenAI API errors (quota exceeded, invalid key, etc.)
-                print(f"OpenAI API error: {str(openai_error)}")
-                
-                # Provide intelligent fallback responses based on user question
-                products = Product.objects.filter(status=Product.APPROVED)
-                user_question = user_message.lower()
-                
-                if "quota" in str(openai_error).lower() or "billing" in str(openai_error).lower():
-                    # Intelligent responses based on question type
-                    if any(word in user_question for word in ["what products", "available", "show me", "list"]):
-                        if products.exists():
-                            product_list = "\n".join([f"• {p.name}: {p.description} - ${p.price} (by {p.business.name})" for p in products])
-                            ai_response = f"Hi! I'm Zuri, your AI shopping assistant. Here are all our available products:\n\n{product_list}"
-                        else:
-                            ai_response = "Hi! I'm Zuri, your AI shopping assistant. Currently, there are no products available in our marketplace."
-                    
-                    elif any(word in user_question for word in ["under", "less than", "below", "cheaper"]):
-                        # Extract price if mentioned
-                        import re
-                        price_match = re.search(r'\$?(\d+(?:\.\d+)?)', user_question)
-                        if price_match:
-                            max_price = float(price_match.group(1))
-                            affordable_products = products.filter(price__lte=max_price)
-                            if affordable_products.exists():
-                                product_list = "\n".join([f"• {p.name}: {p.description} - ${p.price} (by {p.business.name})" for p in affordable_products])
-                                ai_response = f"Here are products under ${max_price}:\n\n{product_list}"
-                            else:
-                                ai_response = f"Sorry, we don't have any products under ${max_price} at the moment."
-                        else:
-                            # Default to $50 if no price specified but "under" is mentioned
-                            affordable_products = products.filter(price__lte=50)
-                            if affordable_products.exists():
-                                product_list = "\n".join([f"• {p.name}: {p.description} - ${p.price} (by {p.business.name})" for p in affordable_products])
-                                ai_response = f"Here are products under $50:\n\n{product_list}"
-                            else:
-                                ai_response = "Sorry, we don't have any products under $50 at the moment."
-                    
-                    elif any(word in user_question for word in ["tell me about", "about", "describe", "details", "info"]):
-                        # Extract product name from question - try multiple approaches
-                        product_mentioned = None
-                        
-                        # First, try exact name matches
-                        for product in products:
-                            if product.name.lower() in user_question:
-                                product_mentioned = product
-                                break
-                        
-                        # If no exact match, try partial matches
-                        if not product_mentioned:
-                            for product in products:
-                                product_words = product.name.lower().split()
-                                if any(word in user_question for word in product_words if len(word) > 2):
-                                    product_mentioned = product
-                                    break
-                        
-                        if product_mentioned:
-                            ai_response = f"I'm Zuri! Here's what I know about {product_mentioned.name}:\n\n{product_mentioned.description}\n\nPrice: ${product_mentioned.price}\nSold by: {product_mentioned.business.name}"
-                        else:
-                            # Show all products if no specific one mentioned
-                            if products.exists():
-                                product_list = "\n".join([f"• {p.name}: {p.description} - ${p.price} (by {p.business.name})" for p in products[:3]])
-                                ai_response = f"I'm Zuri, your AI assistant! Here are some of our products:\n\n{product_list}\n\nWhich specific product would you like to know more about?"
-                            else:
-                                ai_response = "I'm Zuri! Currently, there are no products available to describe."
-                    
-                    elif any(word in user_question for word in ["expensive", "most expensive", "highest price", "priciest"]):
-                        if products.exists():
-                            expensive_products = products.order_by('-price')[:3]
-                            product_list = "\n".join([f"• {p.name}: {p.description} - ${p.price} (by {p.business.name})" for p in expensive_products])
-                            ai_response = f"Here are our most expensive products:\n\n{product_list}"
-                        else:
-                            ai_response = "Currently, there are no products available."
-                    
-                    elif any(word in user_question for word in ["cheap", "cheapest", "lowest price", "affordable"]):
-                        if products.exists():
-                            cheap_products = products.order_by('price')[:3]
-                            product_list = "\n".join([f"• {p.name}: {p.description} - ${p.price} (by {p.business.name})" for p in cheap_products])
-                            ai_response = f"Here are our most affordable products:\n\n{product_list}"
-                        else:
-                            ai_response = "Currently, there are no products available."
-                    
-                    elif any(word in user_question for word in ["business", "seller", "company", "store"]):
-                        if products.exists():
-                            businesses = set(p.business.name for p in products)
-                            business_list = "\n".join([f"• {business}" for business in businesses])
-                            ai_response = f"Here are the businesses selling on our marketplace:\n\n{business_list}"
-                        else:
-                            ai_response = "Currently, there are no businesses with products on our marketplace."
-                    
-                    else:
-                        # Generic helpful response
-                        if products.exists():
-                            product_count = products.count()
-                            sample_products = products[:2]
-                            product_list = "\n".join([f"• {p.name} - ${p.price}" for p in sample_products])
-                            ai_response = f"Hello! I'm Zuri, your AI shopping assistant. I'd be happy to help! We have {product_count} products available. Here are a couple:\n\n{product_list}\n\nYou can ask me about:\n- What products are available?\n- Which products are under $X?\n- Tell me about [product name]\n- What's the cheapest/most expensive product?"
-                        else:
-                            ai_response = "Hello! I'm Zuri, your AI shopping assistant. Welcome to our marketplace! Currently, there are no products available, but feel free to check back later."
-                else:
-                    # Other API errors
-                    if products.exists():
-                        product_list = "\n".join([f"• {p.name}: {p.description} - ${p.price} (by {p.business.name})" for p in products[:3]])
-                        ai_response = f"Hello! Here are some of our products:\n\n{product_list}\n\nFor more detailed assistance, please contact our support team."
-                    else:
-                        ai_response = "Hello! Welcome to our marketplace. Please contact our support team for assistance."
+        # Repeat questions are answered from cache; only stable answers are stored
+        cache_key = response_cache.key(user_message, products.version, settings.CHATBOT_LLM_MODEL if api_key else 'demo')
+        ai_response = response_cache.get(cache_key)
+        source = 'cache'
+        if ai_response is None:
+            ai_response, source = answer(user_message, products, api_key)
+            if source in ('llm', 'demo'):
+                response_cache.set(cache_key, ai_response)
+        CHATBOT_ANSWERS.inc(endpoint='chatbot', source=source)
         
         # Save chat message
-        chat_message = ChatMessage.objects.create(
+        chat_message = save_chat_message(
             user=request.user if request.user.is_authenticated else None,
             user_message=user_message,
-            ai_response=ai_response
+            ai_response=ai_response,
+            session=session
         )
         
         return Response(ChatMessageSerializer(chat_message).data)
         
     except Exception as e:
         # Log the error for debugging
-        print(f"Chatbot error: {str(e)}")
+        logger.exception("Chatbot error: %s", e)
+        CHATBOT_ANSWERS.inc(endpoint='chatbot', source='error')
         
         # Return a friendly fallback response
         fallback_response = "I'm sorry, I'm having trouble processing your request right now. Please try again later or contact our support team for assistance."
         
         try:
-            chat_message = ChatMessage.objects.create(
+            chat_message = save_chat_message(
                 user=request.user if request.user.is_authenticated else None,
                 user_message=user_message,
-                ai_response=fallback_response
+                ai_response=fallback_response,
+                session=session
             )
             return Response(ChatMessageSerializer(chat_message).data)
         except Exception as save_error:
-            print(f"Error saving chat message: {str(save_error)}")
+            logger.exception("Error saving chat message: %s", save_error)
             return Response({
                 'user_message': user_message,
                 'ai_response': fallback_response,
@@ -343,18 +677,22 @@ def chatbot_view(request):
 
 @swagger_auto_schema(
     method='get',
-    operation_description="Get chat history (last 20 messages)",
+    operation_description="Get the requester's chat history, newest first (cursor-paginated)",
+    manual_parameters=[CHAT_SESSION_PARAMETER],
     responses={200: ChatMessageSerializer(many=True)}
 )
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def chat_history_view(request):
-    messages = ChatMessage.objects.all().order_by('-timestamp')[:20]
-    return Response(ChatMessageSerializer(messages, many=True).data)
+    messages = chat_history_queryset(request, chat_session(request, request.query_params.get('session')))
+    paginator = ChatHistoryCursorPagination()
+    page = paginator.paginate_queryset(messages, request)
+    return paginator.get_paginated_response(ChatMessageSerializer(page, many=True).data)
 
 @swagger_auto_schema(
     method='delete',
-    operation_description="Clear all chat history",
+    operation_description="Clear the requester's chat history",
+    manual_parameters=[CHAT_SESSION_PARAMETER],
     responses={
         200: openapi.Response(description="Chat history cleared successfully"),
         500: 'Internal server error'
@@ -363,8 +701,35 @@ def chat_history_view(request):
 @api_view(['DELETE'])
 @permission_classes([AllowAny])
 def clear_chat_history_view(request):
+    messages = chat_history_queryset(request, chat_session(request, request.query_params.get('session')))
     try:
-        ChatMessage.objects.all().delete()
-        return Response({'message': 'Chat history cleared successfully'})
+        if settings.CHAT_PERSISTENCE == 'write_behind':
+            # Queued messages would otherwise be written after the clear
+            chat_buffer.flush()
+        deleted = delete_chat_messages(messages)
+        return Response({'message': 'Chat history cleared successfully', 'deleted': deleted})
     except Exception as e:
+        logger.exception("Error clearing chat history: %s", e)
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Per-view request latency, database query and render-time histograms (admin only)",
+    responses={200: openapi.Response(description="Aggregates keyed by 'METHOD view-name'")}
+)
+@api_view(['GET'])
+@authentication_classes([MetricsTokenAuthentication, CachedJWTAuthentication])
+@permission_classes([CanReadMetrics])
+def request_metrics_view(request):
+    return Response({'enabled': settings.REQUEST_METRICS_ENABLED, 'views': request_stats.snapshot()})
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Metrics in the Prometheus text format (admins, or `Authorization: Bearer <METRICS_TOKEN>`)",
+    responses={200: openapi.Response(description="Prometheus text exposition format")}
+)
+@api_view(['GET'])
+@authentication_classes([MetricsTokenAuthentication, CachedJWTAuthentication])
+@permission_classes([CanReadMetrics])
+def metrics_view(request):
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
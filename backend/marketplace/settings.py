@@ -3,6 +3,7 @@ from datetime import timedelta
 import os
 from dotenv import load_dotenv
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 # Load environment variables from .env file
 load_dotenv()
@@ -29,6 +30,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',  # Per-view metrics; headers and logs with REQUEST_METRICS_ENABLED
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Add whitenoise for static files
@@ -80,6 +82,46 @@ else:
         }
     }
 
+# Cache configuration
+# Use Redis when REDIS_URL is set so catalog versions and cached responses are
+# shared by all workers; otherwise each process has its own local memory cache.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+
+# Password hashing: 'pbkdf2' (default), 'argon2' (needs argon2-cffi) or
+# 'bcrypt' (needs bcrypt), with tunable costs (defaults are Django's). Existing
+# hashes keep working and are rehashed with the new choice on the next login.
+# Lowering the cost speeds up logins at the expense of offline cracking resistance.
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'pbkdf2')
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', '600000'))
+PASSWORD_ARGON2_TIME_COST = int(os.getenv('PASSWORD_ARGON2_TIME_COST', '2'))
+PASSWORD_ARGON2_MEMORY_COST = int(os.getenv('PASSWORD_ARGON2_MEMORY_COST', '102400'))  # KiB
+PASSWORD_ARGON2_PARALLELISM = int(os.getenv('PASSWORD_ARGON2_PARALLELISM', '8'))
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv('PASSWORD_BCRYPT_ROUNDS', '12'))
+_PASSWORD_HASHERS = {
+    'pbkdf2': 'core.hashers.TunedPBKDF2PasswordHasher',
+    'argon2': 'core.hashers.TunedArgon2PasswordHasher',
+    'bcrypt': 'core.hashers.TunedBCryptSHA256PasswordHasher',
+}
+if PASSWORD_HASHER not in _PASSWORD_HASHERS:
+    raise ImproperlyConfigured(
+        f"PASSWORD_HASHER must be one of {', '.join(_PASSWORD_HASHERS)}, not {PASSWORD_HASHER!r}"
+    )
+PASSWORD_HASHERS = [_PASSWORD_HASHERS.pop(PASSWORD_HASHER)] + list(_PASSWORD_HASHERS.values()) + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# Login throttling, checked before any password is hashed. Rates look like
+# '30/min'; leave empty to disable. The username rate counts failed logins only.
+LOGIN_THROTTLE_IP_RATE = os.getenv('LOGIN_THROTTLE_IP_RATE', '30/min')
+LOGIN_THROTTLE_USERNAME_RATE = os.getenv('LOGIN_THROTTLE_USERNAME_RATE', '5/min')
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -102,11 +144,145 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'core.User'
 
+# Render and parse API JSON with orjson (core/renderers.py); falls back to
+# DRF's stdlib encoder when orjson is not installed
+API_FAST_JSON = os.getenv('API_FAST_JSON', 'True').lower() == 'true'
+
+# NUM_PROXIES is the number of trusted reverse proxies in front of the app (1
+# on Render). Client IPs used by throttling are then read from the address the
+# last proxy appended to X-Forwarded-For; with 0 the header is ignored, so
+# clients cannot pick their own IP by sending it.
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': ('rest_framework_simplejwt.authentication.JWTAuthentication',),
+    'DEFAULT_AUTHENTICATION_CLASSES': ('core.authentication.CachedJWTAuthentication',),
     'DEFAULT_PERMISSION_CLASSES': ('rest_framework.permissions.IsAuthenticated',),
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
+}
+if API_FAST_JSON:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = (
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    )
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] = (
+        'core.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    )
+
+# Product listing page sizes (clients may request up to the max via ?page_size=)
+PRODUCT_PAGE_SIZE = int(os.getenv('PRODUCT_PAGE_SIZE', '50'))
+PRODUCT_MAX_PAGE_SIZE = int(os.getenv('PRODUCT_MAX_PAGE_SIZE', '500'))
+
+# Product search (/api/products/search/) page sizes. Results are ranked, so
+# pages are offsets; deep pages get slower and stop at the max page number.
+PRODUCT_SEARCH_PAGE_SIZE = int(os.getenv('PRODUCT_SEARCH_PAGE_SIZE', '20'))
+PRODUCT_SEARCH_MAX_PAGE_SIZE = int(os.getenv('PRODUCT_SEARCH_MAX_PAGE_SIZE', '100'))
+PRODUCT_SEARCH_MAX_PAGES = int(os.getenv('PRODUCT_SEARCH_MAX_PAGES', '50'))
+
+# Serialize product list pages from queryset.values() rows instead of model
+# instances through ProductSerializer (same output, much less per-row work)
+PRODUCT_LIST_FAST_PATH = os.getenv('PRODUCT_LIST_FAST_PATH', 'True').lower() == 'true'
+
+# Upper bounds of the price ranges reported by /api/products/facets/ (the last
+# range is open-ended). Run `python manage.py rebuild_product_facets` after
+# changing them.
+PRODUCT_FACET_PRICE_BOUNDS = [
+    bound.strip() for bound in os.getenv('PRODUCT_FACET_PRICE_BOUNDS', '10,25,50,100,250,500,1000').split(',') if bound.strip()
+]
+
+# Product change feed (/api/products/changes/): entries per response (clients
+# may ask for up to the max via ?limit=), seconds new entries are held back so
+# slower concurrent transactions commit first, and how many days of entries
+# prune_product_changes keeps (0 keeps them forever)
+PRODUCT_CHANGES_PAGE_SIZE = int(os.getenv('PRODUCT_CHANGES_PAGE_SIZE', '500'))
+PRODUCT_CHANGES_MAX_PAGE_SIZE = int(os.getenv('PRODUCT_CHANGES_MAX_PAGE_SIZE', '5000'))
+PRODUCT_CHANGES_DELAY = float(os.getenv('PRODUCT_CHANGES_DELAY', '1'))
+PRODUCT_CHANGE_RETENTION_DAYS = int(os.getenv('PRODUCT_CHANGE_RETENTION_DAYS', '30'))
+
+# Product event streams (/api/products/events/). Without a Redis URL events
+# only reach clients connected to the worker that made the change. Streams send
+# a keep-alive every HEARTBEAT seconds and close after MAX_AGE seconds (clients
+# reconnect and resume); a client more than QUEUE_SIZE events behind is told to resync.
+# Browsers connect with a stream ticket in the URL, usable for TICKET_LIFETIME seconds.
+PRODUCT_EVENTS_REDIS_URL = os.getenv('PRODUCT_EVENTS_REDIS_URL', '')
+PRODUCT_EVENTS_HEARTBEAT = float(os.getenv('PRODUCT_EVENTS_HEARTBEAT', '15'))
+PRODUCT_EVENTS_MAX_AGE = float(os.getenv('PRODUCT_EVENTS_MAX_AGE', '300'))
+PRODUCT_EVENTS_QUEUE_SIZE = int(os.getenv('PRODUCT_EVENTS_QUEUE_SIZE', '1000'))
+PRODUCT_EVENTS_TICKET_LIFETIME = int(os.getenv('PRODUCT_EVENTS_TICKET_LIFETIME', '60'))
+
+# Largest payload accepted by the bulk product endpoints
+PRODUCT_BULK_MAX_ITEMS = int(os.getenv('PRODUCT_BULK_MAX_ITEMS', '10000'))
+
+# Seconds a rendered /api/products/public/ page is kept server-side. Pages are
+# also retired as soon as the catalog changes.
+PUBLIC_PRODUCTS_CACHE_TTL = int(os.getenv('PUBLIC_PRODUCTS_CACHE_TTL', '300'))
+
+# Seconds a catalog version (and so the chatbot's catalog snapshot) is trusted
+# before it is rebuilt from the database. Without a shared cache this bounds
+# how stale a worker can be after changes made in another process; 0 keeps it
+# until the next change this process sees.
+CHATBOT_CATALOG_MAX_AGE = int(os.getenv('CHATBOT_CATALOG_MAX_AGE', '300'))
+
+# Maximum number of products the chatbot lists in a single answer
+CHATBOT_MAX_LISTED_PRODUCTS = int(os.getenv('CHATBOT_MAX_LISTED_PRODUCTS', '10'))
+
+# Language model used by the chatbot. OPENAI_BASE_URL points the client at a
+# compatible server (e.g. a local stub); the timeout is the per-request deadline
+# in seconds, after which the chatbot answers from its local intent engine.
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', '')
+CHATBOT_LLM_MODEL = os.getenv('CHATBOT_LLM_MODEL', 'gpt-3.5-turbo')
+CHATBOT_LLM_TIMEOUT = float(os.getenv('CHATBOT_LLM_TIMEOUT', '15'))
+
+# Upper bounds on the catalog excerpt included in language model prompts
+CHATBOT_CONTEXT_MAX_PRODUCTS = int(os.getenv('CHATBOT_CONTEXT_MAX_PRODUCTS', '20'))
+CHATBOT_CONTEXT_TOKEN_BUDGET = int(os.getenv('CHATBOT_CONTEXT_TOKEN_BUDGET', '1500'))
+
+# Chatbot answer cache. Leave the alias empty for a per-process LRU of
+# CHATBOT_RESPONSE_CACHE_SIZE entries, or name a CACHES alias to share answers
+# between workers. A TTL of 0 disables the cache.
+CHATBOT_RESPONSE_CACHE_TTL = int(os.getenv('CHATBOT_RESPONSE_CACHE_TTL', '300'))
+CHATBOT_RESPONSE_CACHE_SIZE = int(os.getenv('CHATBOT_RESPONSE_CACHE_SIZE', '1024'))
+CHATBOT_RESPONSE_CACHE_ALIAS = os.getenv('CHATBOT_RESPONSE_CACHE_ALIAS', '')
+
+# How chat messages are stored: 'sync' inserts each one on the request path,
+# 'write_behind' batches them in memory (see core/chat_buffer.py)
+CHAT_PERSISTENCE = os.getenv('CHAT_PERSISTENCE', 'sync')
+CHAT_WRITE_BEHIND_BATCH_SIZE = int(os.getenv('CHAT_WRITE_BEHIND_BATCH_SIZE', '100'))
+CHAT_WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv('CHAT_WRITE_BEHIND_FLUSH_INTERVAL', '1.0'))
+
+# Per-view latency, query and render timing is always aggregated for
+# /api/metrics/ (core/middleware.py). REQUEST_METRICS_ENABLED adds a
+# Server-Timing header and a JSON log line per request. Server-Timing headers
+# reveal internals to clients, so they can be switched off separately.
+REQUEST_METRICS_ENABLED = os.getenv('REQUEST_METRICS_ENABLED', 'False').lower() == 'true'
+REQUEST_METRICS_SERVER_TIMING = os.getenv('REQUEST_METRICS_SERVER_TIMING', 'True').lower() == 'true'
+
+# Bearer token that lets Prometheus scrape /api/metrics/ without a user account
+# (admins can always read it). Leave empty to require an admin login.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core': {'handlers': ['console'], 'level': os.getenv('CORE_LOG_LEVEL', 'INFO')},
+    },
 }
 
+# Seconds an authenticated user is served from the cache instead of the
+# database (0 disables). Saving or deleting the user drops it immediately.
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '60'))
+
+# Chat history page sizes, and how long messages are kept by the
+# compact_chat_history command (0 keeps them forever)
+CHAT_HISTORY_PAGE_SIZE = int(os.getenv('CHAT_HISTORY_PAGE_SIZE', '20'))
+CHAT_HISTORY_MAX_PAGE_SIZE = int(os.getenv('CHAT_HISTORY_MAX_PAGE_SIZE', '100'))
+CHAT_RETENTION_DAYS = int(os.getenv('CHAT_RETENTION_DAYS', '90'))
+# Rows deleted per statement when clearing or compacting chat history
+CHAT_DELETE_BATCH_SIZE = int(os.getenv('CHAT_DELETE_BATCH_SIZE', '1000'))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=int(os.getenv('JWT_ACCESS_TOKEN_LIFETIME', '60'))),
     'REFRESH_TOKEN_LIFETIME': timedelta(minutes=int(os.getenv('JWT_REFRESH_TOKEN_LIFETIME', '1440'))),
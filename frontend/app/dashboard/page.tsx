@@ -94,6 +94,8 @@ export default function Dashboard() {
   const [viewingDescription, setViewingDescription] = useState<any>(null);
   const [filterStatus, setFilterStatus] = useState('all');
   const [filterRole, setFilterRole] = useState('all');
+  const [nextCursor, setNextCursor] = useState<string | undefined>();
+  const [loadingMore, setLoadingMore] = useState(false);
   const router = useRouter();
 
   useEffect(() => {
@@ -104,19 +106,48 @@ export default function Dashboard() {
     }
     const parsedUser = JSON.parse(userData);
     setUser(parsedUser);
-    loadProducts();
     if (parsedUser.role === 'admin') {
       loadUsers();
       loadBusinesses();
     }
   }, []);
 
+  // Search and the status filter run on the server, so reload the first page when they change
+  useEffect(() => {
+    if (!user) return;
+    const timer = setTimeout(loadProducts, searchQuery ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [user, searchQuery, filterStatus]);
+
+  // The list is cursor-paginated: { next, previous, results }
+  const cursorOf = (url: string | null) => (url ? new URL(url).searchParams.get('cursor') ?? undefined : undefined);
+
+  const productFilters = () => ({
+    q: searchQuery.trim() || undefined,
+    status: filterStatus === 'all' ? undefined : filterStatus,
+  });
+
   const loadProducts = async () => {
     try {
-      const data = await getProducts();
-      setProducts(data);
+      const data = await getProducts(undefined, productFilters());
+      setProducts(data.results);
+      setNextCursor(cursorOf(data.next));
+    } catch (error) {
+      console.error('Error loading products:', error);
+    }
+  };
+
+  const loadMoreProducts = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const data = await getProducts(nextCursor, productFilters());
+      setProducts((loaded) => [...loaded, ...data.results]);
+      setNextCursor(cursorOf(data.next));
     } catch (error) {
       console.error('Error loading products:', error);
+    } finally {
+      setLoadingMore(false);
     }
   };
 
@@ -254,12 +285,8 @@ export default function Dashboard() {
   // Filter and search logic
   const getFilteredData = () => {
     if (activeTab === 'products') {
-      return products.filter(product => {
-        const matchesSearch = product.name.toLowerCase().includes(searchQuery.toLowerCase()) ||
-          product.description.toLowerCase().includes(searchQuery.toLowerCase());
-        const matchesFilter = filterStatus === 'all' || product.status === filterStatus;
-        return matchesSearch && matchesFilter;
-      });
+      // Already filtered by the API (see loadProducts)
+      return products;
     } else if (activeTab === 'users') {
       return users.filter(userItem => {
         const matchesSearch = userItem.username.toLowerCase().includes(searchQuery.toLowerCase()) ||
@@ -817,6 +844,13 @@ export default function Dashboard() {
                   </tbody>
                 </table>
               </div>
+              {nextCursor && (
+                <div style={{ textAlign: 'center', marginTop: '1rem' }}>
+                  <button onClick={loadMoreProducts} className="btn btn-secondary" disabled={loadingMore}>
+                    {loadingMore ? 'Loading...' : 'Load more products'}
+                  </button>
+                </div>
+              )}
 
               {/* Description Modal */}
               {viewingDescription && (
@@ -7,16 +7,22 @@ import Link from 'next/link';
 export default function Home() {
   const [products, setProducts] = useState<any[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | undefined>();
+  const [loadingMore, setLoadingMore] = useState(false);
   const [viewingProduct, setViewingProduct] = useState<any>(null);
 
   useEffect(() => {
     loadProducts();
   }, []);
 
+  // The listing is cursor-paginated: { next, previous, results }
+  const cursorOf = (url: string | null) => (url ? new URL(url).searchParams.get('cursor') ?? undefined : undefined);
+
   const loadProducts = async () => {
     try {
       const data = await getPublicProducts();
-      setProducts(data);
+      setProducts(data.results);
+      setNextCursor(cursorOf(data.next));
     } catch (error) {
       console.error('Error loading products:', error);
     } finally {
@@ -24,6 +30,20 @@ export default function Home() {
     }
   };
 
+  const loadMoreProducts = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const data = await getPublicProducts(nextCursor);
+      setProducts((loaded) => [...loaded, ...data.results]);
+      setNextCursor(cursorOf(data.next));
+    } catch (error) {
+      console.error('Error loading products:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   return (
     <div className="landing-page">
       {/* Hero Section */}
@@ -123,6 +143,13 @@ export default function Home() {
                   </div>
                 ))}
               </div>
+              {nextCursor && (
+                <div style={{ textAlign: 'center', marginTop: '2rem' }}>
+                  <button className="btn btn-outline" onClick={loadMoreProducts} disabled={loadingMore}>
+                    {loadingMore ? 'Loading...' : 'Load more products'}
+                  </button>
+                </div>
+              )}
             </div>
           )}
         </div>
@@ -4,22 +4,56 @@ import { useState, useEffect } from 'react';
 import { sendChatMessage, getChatHistory, clearChatHistory } from '@/lib/api';
 import Link from 'next/link';
 
+// Anonymous visitors' history is kept per browser under a random session id
+// (the backend ignores it for logged-in users)
+const getChatSession = () => {
+  let session = localStorage.getItem('chatSession');
+  if (!session) {
+    session = crypto.randomUUID();
+    localStorage.setItem('chatSession', session);
+  }
+  return session;
+};
+
+const cursorOf = (url: string | null) => (url ? new URL(url).searchParams.get('cursor') ?? undefined : undefined);
+
 export default function Chatbot() {
   const [messages, setMessages] = useState<any[]>([]);
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
   const [clearing, setClearing] = useState(false);
+  const [session, setSession] = useState('');
+  const [olderCursor, setOlderCursor] = useState<string | undefined>();
+  const [loadingOlder, setLoadingOlder] = useState(false);
 
   useEffect(() => {
-    loadHistory();
+    const chatSession = getChatSession();
+    setSession(chatSession);
+    loadHistory(chatSession);
   }, []);
 
-  const loadHistory = async () => {
+  // History is cursor-paginated, newest first: { next, previous, results }
+  const loadHistory = async (chatSession: string) => {
+    try {
+      const history = await getChatHistory(chatSession);
+      setMessages(history.results);
+      setOlderCursor(cursorOf(history.next));
+    } catch (error) {
+      console.error('Error loading chat history:', error);
+    }
+  };
+
+  const loadOlderMessages = async () => {
+    if (!olderCursor || loadingOlder) return;
+    setLoadingOlder(true);
     try {
-      const history = await getChatHistory();
-      setMessages(history);
+      const history = await getChatHistory(session, olderCursor);
+      setMessages((loaded) => [...loaded, ...history.results]);
+      setOlderCursor(cursorOf(history.next));
     } catch (error) {
       console.error('Error loading chat history:', error);
+    } finally {
+      setLoadingOlder(false);
     }
   };
 
@@ -31,7 +65,7 @@ export default function Chatbot() {
     setLoading(true);
 
     try {
-      const response = await sendChatMessage(userMessage);
+      const response = await sendChatMessage(userMessage, session);
       setMessages([response, ...messages]);
     } catch (error) {
       console.error('Error sending message:', error);
@@ -54,8 +88,9 @@ export default function Chatbot() {
     if (confirm('Are you sure you want to clear all chat history? This cannot be undone.')) {
       setClearing(true);
       try {
-        await clearChatHistory();
+        await clearChatHistory(session);
         setMessages([]);
+        setOlderCursor(undefined);
       } catch (error) {
         console.error('Error clearing chat history:', error);
         alert('Failed to clear chat history. Please try again.');
@@ -116,6 +151,13 @@ export default function Chatbot() {
                 </div>
               ))
             )}
+            {olderCursor && (
+              <div style={{ textAlign: 'center', marginTop: '1rem' }}>
+                <button onClick={loadOlderMessages} className="btn btn-secondary btn-sm" disabled={loadingOlder}>
+                  {loadingOlder ? 'Loading...' : 'Load older messages'}
+                </button>
+              </div>
+            )}
           </div>
 
           <div className="chat-input">